@@ -0,0 +1,53 @@
+import argparse
+import re
+import time
+from collections import Counter
+
+import pandas as pd
+
+from utils.analysis_utils import Analysis, STOPWORDS
+from .utils import generate_notes
+
+LEGACY_STOPLIST = sorted(STOPWORDS)
+
+
+def legacy_analysis(dataset):
+    # The pre-vectorization implementation: two regex passes per note and a
+    # linear stopword lookup against a list.
+    dataframe = pd.DataFrame(dataset)
+    dataframe['word_count'] = dataframe['content'].apply(
+        lambda text: len(re.findall(r'\b\w+\b', text.lower())))
+    all_words = []
+    for content in dataframe['content']:
+        words = re.findall(r'\b\w+\b', content.lower())
+        all_words.extend(word for word in words if not word.lower() in LEGACY_STOPLIST)
+    return int(dataframe['word_count'].sum()), Counter(all_words).most_common(10)
+
+
+def measure(function, dataset, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(dataset)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare legacy and single-pass note analysis.")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000, 10_000, 100_000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    print(f"{'notes':>8} {'legacy s':>10} {'single-pass s':>14} {'legacy notes/s':>15} "
+          f"{'single-pass notes/s':>20} {'speedup':>8}")
+    for size in args.sizes:
+        dataset = generate_notes(size)
+        legacy = measure(legacy_analysis, dataset, args.repeat)
+        single_pass = measure(lambda data: Analysis(data).to_dict(), dataset, args.repeat)
+        print(f"{size:>8} {legacy:>10.3f} {single_pass:>14.3f} {size / legacy:>15.0f} "
+              f"{size / single_pass:>20.0f} {legacy / single_pass:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+
+from .utils import create_benchmark_database, generate_notes, override_app_dependencies
+
+
+async def ndjson_body(notes: list[dict], chunk_size: int = 64 * 1024):
+    buffer = []
+    size = 0
+    for note in notes:
+        line = json.dumps(note) + "\n"
+        buffer.append(line)
+        size += len(line)
+        if size >= chunk_size:
+            yield "".join(buffer).encode()
+            buffer, size = [], 0
+    if buffer:
+        yield "".join(buffer).encode()
+
+
+async def run(notes: int, single_sample: int):
+    path = os.path.join(tempfile.mkdtemp(), "bulk.db")
+    engine, session_factory = await create_benchmark_database(path)
+    app = override_app_dependencies(session_factory)
+    dataset = generate_notes(notes + single_sample)
+
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        start = time.perf_counter()
+        for note in dataset[notes:]:
+            response = await client.post("/api/v1/notes/", json=note)
+            assert response.status_code == 201, response.text
+        single_elapsed = time.perf_counter() - start
+
+        start = time.perf_counter()
+        response = await client.post("/api/v1/notes/bulk", content=ndjson_body(dataset[:notes]))
+        bulk_elapsed = time.perf_counter() - start
+        report = response.json()
+
+        start = time.perf_counter()
+        exported_lines = 0
+        async with client.stream("GET", "/api/v1/notes/export") as export:
+            async for _ in export.aiter_lines():
+                exported_lines += 1
+        export_elapsed = time.perf_counter() - start
+
+    await engine.dispose()
+    single_rate = single_sample / single_elapsed
+    print(json.dumps({
+        "notes": notes,
+        "bulk_import_seconds": round(bulk_elapsed, 2),
+        "bulk_import_notes_per_second": round(report["inserted"] / bulk_elapsed),
+        "bulk_failed": report["failed"],
+        "single_post_notes_per_second": round(single_rate),
+        "single_post_projected_seconds": round(notes / single_rate, 2),
+        "export_seconds": round(export_elapsed, 2),
+        "exported_notes": exported_lines,
+    }, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time NDJSON bulk import against per-note POSTs.")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--single-sample", type=int, default=500)
+    args = parser.parse_args()
+    asyncio.run(run(args.notes, args.single_sample))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import json
+import os
+import tempfile
+import time
+
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import insert
+
+import main  # noqa: F401  registers every model on Base.metadata
+from models.notes_model import Note
+from .utils import create_benchmark_database, generate_notes, override_app_dependencies
+
+VIEWS = {
+    "full": {},
+    "summary": {"view": "summary"},
+    "fields": {"fields": "title,priority,content_length"},
+}
+
+
+async def run(notes: int, words_per_note: int, per_page: int, repeat: int):
+    path = os.path.join(tempfile.mkdtemp(), "list_view.db")
+    engine, session_factory = await create_benchmark_database(path)
+    async with session_factory() as db:
+        await db.execute(insert(Note), [
+            dict(note, user_id=1) for note in generate_notes(notes, words_per_note=words_per_note)])
+        await db.commit()
+    app = override_app_dependencies(session_factory)
+
+    report = {"notes": notes, "per_page": per_page, "views": {}}
+    async with AsyncClient(transport=ASGITransport(app=app), base_url="http://benchmark") as client:
+        for name, params in VIEWS.items():
+            best = float("inf")
+            for _ in range(repeat):
+                start = time.perf_counter()
+                response = await client.get("/api/v1/notes/", params=params | {"per_page": per_page})
+                best = min(best, time.perf_counter() - start)
+                assert response.status_code == 200, response.text
+            report["views"][name] = {
+                "response_bytes": len(response.content),
+                "page_ms": round(best * 1000, 2),
+            }
+    await engine.dispose()
+    print(json.dumps(report, indent=2))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare list page size and latency by view.")
+    parser.add_argument("--notes", type=int, default=1_000)
+    parser.add_argument("--words-per-note", type=int, default=2_000)
+    parser.add_argument("--per-page", type=int, default=100)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(run(args.notes, args.words_per_note, args.per_page, args.repeat))
+
+
+if __name__ == "__main__":
+    main()
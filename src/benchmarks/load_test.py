@@ -0,0 +1,257 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from .utils import free_port, generate_notes
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASSWORD = "Benchmark@2025"
+DEFAULT_WEIGHTS = {
+    "login": 1,
+    "create_note": 2,
+    "get_note": 4,
+    "list_notes": 4,
+    "update_note": 2,
+    "delete_note": 1,
+    "history": 2,
+    "summarize": 1,
+    "analysis": 1,
+}
+
+
+def parse_weights(value: str) -> dict[str, int]:
+    weights = {}
+    for item in value.split(","):
+        name, _, weight = item.partition("=")
+        if name not in DEFAULT_WEIGHTS:
+            raise argparse.ArgumentTypeError(f"unknown scenario: {name}")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def start_server(database_url: str, workers: int, openai_latency_ms: float, timeout: float = 60.0):
+    port = free_port()
+    environment = dict(
+        os.environ,
+        SQLALCHEMY_DATABASE_URI=database_url,
+        DATABASE_ECHO="False",
+        DATABASE_SCHEMA_MODE="create",
+        LOAD_TEST_OPENAI_LATENCY_MS=str(openai_latency_ms),
+    )
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "benchmarks.load_test_app:app", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning"],
+        cwd=SRC_DIR, env=environment)
+    base_url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if server.poll() is not None:
+            raise RuntimeError(f"server exited with code {server.returncode}")
+        try:
+            if httpx.get(f"{base_url}/healthy", timeout=1.0).status_code == 200:
+                return server, base_url
+        except httpx.TransportError:
+            time.sleep(0.1)
+    server.terminate()
+    raise RuntimeError(f"server did not become healthy within {timeout} seconds")
+
+
+class VirtualUser:
+    def __init__(self, email: str, token: str, note_ids: list[int], prefix: str):
+        self.email = email
+        self.token = token
+        self.note_ids = note_ids
+        self.prefix = prefix
+        self.created = 0
+
+    @property
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.token}"}
+
+
+async def login(client: httpx.AsyncClient, email: str) -> httpx.Response:
+    return await client.post("/api/v1/authentication/login", json={"email": email, "password": PASSWORD})
+
+
+async def seed_user(client: httpx.AsyncClient, run_id: str, index: int, notes: int) -> tuple[str, str, list[int]]:
+    email = f"load{run_id}u{index}@example.com"
+    response = await client.post("/api/v1/authentication/registration", json={
+        "username": f"loadtest-{run_id}-{index}", "email": email, "password": PASSWORD})
+    response.raise_for_status()
+    token = (await login(client, email)).json()["access_token"]
+    headers = {"Authorization": f"Bearer {token}"}
+    lines = [
+        json.dumps(dict(note, title=f"{run_id}-{index} {note['title']}"))
+        for note in generate_notes(notes, seed=index)
+    ]
+    response = await client.post("/api/v1/notes/bulk", content="\n".join(lines).encode(), headers=headers)
+    response.raise_for_status()
+    note_ids, cursor = [], None
+    while True:
+        params = {"fields": "id", "pagination": "cursor", "per_page": 100}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await client.get("/api/v1/notes/", params=params, headers=headers)).json()
+        note_ids.extend(note["id"] for note in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            return email, token, note_ids
+
+
+async def run_scenario(name: str, client: httpx.AsyncClient, user: VirtualUser, generator: random.Random):
+    # Returns None when the virtual user has nothing to act on for this scenario.
+    if name == "login":
+        return await login(client, user.email)
+    if name == "create_note":
+        user.created += 1
+        return await client.post("/api/v1/notes/", headers=user.headers, json={
+            "title": f"{user.prefix} created {user.created}",
+            "content": " ".join(generator.choices(("alpha", "beta", "gamma", "delta"), k=40)),
+            "priority": generator.randint(0, 100)})
+    if not user.note_ids:
+        return None
+    note_id = generator.choice(user.note_ids)
+    if name == "get_note":
+        return await client.get(f"/api/v1/notes/{note_id}", headers=user.headers)
+    if name == "list_notes":
+        return await client.get("/api/v1/notes/", headers=user.headers, params={"view": "summary", "per_page": 20})
+    if name == "update_note":
+        note = (await client.get(f"/api/v1/notes/{note_id}", headers=user.headers)).json()
+        note["content"] += f" Revision {generator.randint(0, 10 ** 6)}."
+        return await client.put(f"/api/v1/notes/{note_id}", headers=user.headers, json=note)
+    if name == "delete_note":
+        user.note_ids.remove(note_id)
+        return await client.delete(f"/api/v1/notes/{note_id}", headers=user.headers)
+    if name == "history":
+        return await client.get(f"/api/v1/notes/{note_id}/history", headers=user.headers)
+    if name == "summarize":
+        return await client.post(f"/api/v1/notes/{note_id}/summarization", headers=user.headers)
+    return await client.get("/api/v1/analysis/notes", headers=user.headers)
+
+
+async def worker(client, user: VirtualUser, weights: dict[str, int], deadline: float, seed: int, results):
+    generator = random.Random(seed)
+    names, scenario_weights = list(weights), list(weights.values())
+    while time.perf_counter() < deadline:
+        name = generator.choices(names, scenario_weights)[0]
+        start = time.perf_counter()
+        try:
+            response = await run_scenario(name, client, user, generator)
+        except httpx.HTTPError:
+            results[name]["errors"] += 1
+            continue
+        if response is None:
+            continue
+        results[name]["latencies"].append(time.perf_counter() - start)
+        if response.status_code >= 400:
+            results[name]["errors"] += 1
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+def summarize(results, elapsed: float) -> dict:
+    scenarios = {}
+    for name, result in sorted(results.items()):
+        latencies = sorted(result["latencies"])
+        if not latencies:
+            continue
+        scenarios[name] = {
+            "requests": len(latencies),
+            "errors": result["errors"],
+            "rps": round(len(latencies) / elapsed, 2),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p90_ms": round(percentile(latencies, 0.90) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "max_ms": round(latencies[-1] * 1000, 2),
+        }
+    total = sum(scenario["requests"] for scenario in scenarios.values())
+    return {
+        "requests": total,
+        "errors": sum(scenario["errors"] for scenario in scenarios.values()),
+        "rps": round(total / elapsed, 2),
+        "scenarios": scenarios,
+    }
+
+
+async def run(args) -> dict:
+    database_url = args.database_url or f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'load.db')}"
+    run_id = f"{int(time.time())}{random.Random(args.seed).randint(100, 999)}"
+    server, base_url = start_server(database_url, args.workers, args.openai_latency_ms)
+    try:
+        limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+        async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+            seeded = [await seed_user(client, run_id, index, args.notes_per_user) for index in range(args.users)]
+            virtual_users = []
+            for index in range(args.concurrency):
+                email, token, note_ids = seeded[index % args.users]
+                # Partition each user's notes between its workers so updates and deletes never collide.
+                share = note_ids[index // args.users::max(1, -(-args.concurrency // args.users))]
+                virtual_users.append(VirtualUser(email, token, list(share), f"{run_id}-w{index}"))
+
+            results = defaultdict(lambda: {"latencies": [], "errors": 0})
+            start = time.perf_counter()
+            deadline = start + args.duration
+            await asyncio.gather(*(
+                worker(client, user, args.scenarios, deadline, args.seed + index, results)
+                for index, user in enumerate(virtual_users)))
+            elapsed = time.perf_counter() - start
+    finally:
+        server.terminate()
+        server.wait()
+
+    return {
+        "config": {
+            "database": database_url.split("://", 1)[0],
+            "users": args.users,
+            "notes_per_user": args.notes_per_user,
+            "concurrency": args.concurrency,
+            "duration_seconds": args.duration,
+            "server_workers": args.workers,
+            "openai_latency_ms": args.openai_latency_ms,
+            "scenarios": args.scenarios,
+            "seed": args.seed,
+        },
+        "elapsed_seconds": round(elapsed, 2),
+        **summarize(results, elapsed),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the API under uvicorn and report RPS and latency percentiles.")
+    parser.add_argument("--database-url", help="defaults to a fresh SQLite file; pass a postgresql+asyncpg URL "
+                                               "to run against a local Postgres")
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--workers", type=int, default=1, help="uvicorn worker processes")
+    parser.add_argument("--openai-latency-ms", type=float, default=800.0)
+    parser.add_argument("--request-timeout", type=float, default=60.0)
+    parser.add_argument("--scenarios", type=parse_weights, default=DEFAULT_WEIGHTS,
+                        help="comma separated name=weight pairs, e.g. get_note=4,list_notes=2")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+
+    report = asyncio.run(run(args))
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as report_file:
+            report_file.write(output + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,29 @@
+import asyncio
+import random
+from types import SimpleNamespace
+
+from decouple import config
+
+import external_services.openai_service as openai_service
+from main import app  # noqa: F401  served by uvicorn in benchmarks.load_test
+
+OPENAI_LATENCY_MS = config('LOAD_TEST_OPENAI_LATENCY_MS', default=800.0, cast=float)
+OPENAI_JITTER_MS = config('LOAD_TEST_OPENAI_JITTER_MS', default=200.0, cast=float)
+
+
+class LatencyInjectingOpenAIClient:
+    def __init__(self, latency_ms: float, jitter_ms: float):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        delay = max(0.0, self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        await asyncio.sleep(delay)
+        content = kwargs["messages"][-1]["content"]
+        message = SimpleNamespace(content=" ".join(content.split()[:20]))
+        usage = SimpleNamespace(prompt_tokens=len(content.split()), completion_tokens=20)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+
+
+openai_service.client = LatencyInjectingOpenAIClient(OPENAI_LATENCY_MS, OPENAI_JITTER_MS)
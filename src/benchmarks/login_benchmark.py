@@ -0,0 +1,55 @@
+import argparse
+import asyncio
+import time
+
+from utils.authentication_utils import bcrypt_context, password_executor, verify_password
+
+PASSWORD = "Panel@2004"
+
+
+async def heartbeat(stop: asyncio.Event, interval: float = 0.01) -> float:
+    worst_lag = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst_lag = max(worst_lag, time.perf_counter() - start - interval)
+    return worst_lag
+
+
+async def verify_inline(password: str, hashed_password: str):
+    return bcrypt_context.verify_and_update(password, hashed_password)
+
+
+async def run_logins(verify, hashed_password: str, logins: int, concurrency: int):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def login():
+        async with semaphore:
+            await verify(PASSWORD, hashed_password)
+
+    stop = asyncio.Event()
+    heartbeat_task = asyncio.create_task(heartbeat(stop))
+    start = time.perf_counter()
+    await asyncio.gather(*[login() for _ in range(logins)])
+    elapsed = time.perf_counter() - start
+    stop.set()
+    return elapsed, await heartbeat_task
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Measure login password verification throughput.")
+    parser.add_argument("--logins", type=int, default=64)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+    password_executor.max_pending = max(password_executor.max_pending, args.concurrency)
+
+    hashed_password = bcrypt_context.hash(PASSWORD)
+    print(f"{'mode':>10} {'logins/s':>10} {'worst loop lag ms':>18}")
+    for mode, verify in (("inline", verify_inline), ("executor", verify_password)):
+        elapsed, lag = await run_logins(verify, hashed_password, args.logins, args.concurrency)
+        print(f"{mode:>10} {args.logins / elapsed:>10.1f} {lag * 1000:>18.1f}")
+    password_executor.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,86 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+import main  # noqa: F401  registers every model on Base.metadata
+from database import Base
+from models.note_revision_model import NoteRevision
+from models.notes_model import Note
+from routers.notes import get_my_notes, get_note_history
+from utils.authentication_utils import Principal
+from utils.pagination_utils import encode_cursor
+from utils.versioning_utils import UPDATE, encode_snapshot
+from .utils import generate_notes
+
+USER = Principal(id=1, email="benchmark@example.com")
+NOTE_ID = 1
+
+
+async def seed(session_factory, notes: int):
+    async with session_factory() as db:
+        rows = [dict(note, user_id=USER.id) for note in generate_notes(notes, words_per_note=20)]
+        await db.execute(insert(Note), rows)
+        payload = encode_snapshot(rows[0]["content"])
+        await db.execute(insert(NoteRevision), [
+            {"note_id": NOTE_ID, "version": version, "user_id": USER.id, "operation_type": UPDATE,
+             "title": rows[0]["title"], "priority": rows[0]["priority"], "is_latest": version == notes,
+             "is_snapshot": True, "payload": payload}
+            for version in range(1, notes + 1)
+        ])
+        await db.commit()
+
+
+async def timed(call, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        await call()
+        best = min(best, time.perf_counter() - start)
+    return best * 1000
+
+
+async def main_benchmark(notes: int, per_page: int, repeat: int):
+    path = os.path.join(tempfile.mkdtemp(), "pagination.db")
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    await seed(session_factory, notes)
+
+    print(f"{'page':>8} {'notes offset ms':>16} {'notes cursor ms':>16} "
+          f"{'history offset ms':>18} {'history cursor ms':>18}")
+    page = 1
+    while (page - 1) * per_page < notes:
+        last_position = (page - 1) * per_page
+        notes_cursor = encode_cursor({"id": last_position})
+        history_cursor = encode_cursor({"id": NOTE_ID, "version": last_position})
+        async with session_factory() as db:
+            results = [
+                await timed(lambda: get_my_notes(db, USER, page, per_page, "offset", None, "full", None), repeat),
+                await timed(lambda: get_my_notes(db, USER, page, per_page, "cursor", notes_cursor, "full", None), repeat),
+                await timed(lambda: get_note_history(
+                    db, USER, NOTE_ID, page, per_page, "offset", None), repeat),
+                await timed(lambda: get_note_history(
+                    db, USER, NOTE_ID, page, per_page, "cursor", history_cursor), repeat),
+            ]
+        print(f"{page:>8} {results[0]:>16.2f} {results[1]:>16.2f} {results[2]:>18.2f} {results[3]:>18.2f}")
+        page *= 10
+    await engine.dispose()
+
+
+def run():
+    parser = argparse.ArgumentParser(description="Compare offset and cursor page latency by depth.")
+    parser.add_argument("--notes", type=int, default=100_000)
+    parser.add_argument("--per-page", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    asyncio.run(main_benchmark(args.notes, args.per_page, args.repeat))
+
+
+if __name__ == "__main__":
+    run()
@@ -0,0 +1,63 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from .utils import free_port
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def time_to_healthy(database_url: str, timeout: float) -> float:
+    port = free_port()
+    environment = dict(os.environ, SQLALCHEMY_DATABASE_URI=database_url, DATABASE_ECHO="False")
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=SRC_DIR, env=environment)
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"server exited with code {server.returncode}")
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/healthy", timeout=0.5).status_code == 200:
+                    return time.perf_counter() - start
+            except httpx.TransportError:
+                time.sleep(0.01)
+        raise RuntimeError(f"server did not become healthy within {timeout} seconds")
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure process start to first /healthy response.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=3.0,
+                        help="fail when the median startup time exceeds this threshold")
+    parser.add_argument("--timeout", type=float, default=30.0)
+    args = parser.parse_args()
+
+    database_url = f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'startup.db')}"
+    # The first boot creates the schema; the measured boots only check it.
+    time_to_healthy(database_url, args.timeout)
+    samples = [time_to_healthy(database_url, args.timeout) for _ in range(args.runs)]
+    median = statistics.median(samples)
+    print(json.dumps({
+        "runs": args.runs,
+        "median_seconds": round(median, 3),
+        "max_seconds": round(max(samples), 3),
+        "threshold_seconds": args.max_seconds,
+    }, indent=2))
+    if median > args.max_seconds:
+        sys.exit(f"startup regression: median {median:.3f}s exceeds {args.max_seconds}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+import random
+import socket
+
+VOCABULARY = (
+    "project meeting budget review deadline client report design draft idea "
+    "garden recipe travel book movie workout health family friend weekend "
+    "the and of to in is that for it with as was on be at by this have from "
+    "or one had not but what all were when we there can an your which their"
+).split()
+
+
+def generate_notes(amount: int, words_per_note: int = 40, seed: int = 42) -> list[dict]:
+    generator = random.Random(seed)
+    return [
+        {
+            "title": f"Benchmark note {index}",
+            "content": " ".join(generator.choices(VOCABULARY, k=generator.randint(
+                words_per_note // 2, words_per_note * 2))),
+            "priority": generator.randint(0, 100),
+        }
+        for index in range(amount)
+    ]
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def create_benchmark_database(path: str):
+    from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+    import main  # noqa: F401  registers every model on Base.metadata
+    from database import Base
+
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    return engine, async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+
+def override_app_dependencies(session_factory, user_id: int = 1, email: str = "benchmark@example.com"):
+    from database import get_db, get_session_factory
+    from main import app
+    from utils.authentication_utils import Principal, get_current_user
+
+    async def get_benchmark_db():
+        async with session_factory() as db:
+            yield db
+
+    app.dependency_overrides[get_db] = get_benchmark_db
+    app.dependency_overrides[get_session_factory] = lambda: session_factory
+    app.dependency_overrides[get_current_user] = lambda: Principal(id=user_id, email=email)
+    return app
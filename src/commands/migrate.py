@@ -0,0 +1,125 @@
+import argparse
+import asyncio
+import fcntl
+import logging
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+from alembic import command
+from alembic.config import Config
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.pool import NullPool
+
+from database import SQLALCHEMY_DATABASE_URL, Base, SchemaNotReadyError, find_missing_tables, init_db
+from models.user_model import User
+from models.notes_model import Note
+from models.note_revision_model import NoteRevision
+from models.term_frequency_model import UserTerm
+from models.summary_model import SummaryCacheEntry
+from models.corpus_version_model import UserCorpusVersion
+from models import search_model
+
+logger = logging.getLogger(__name__)
+
+SRC_DIR = Path(__file__).resolve().parent.parent
+# Arbitrary but fixed, so every replica contends for the same advisory lock.
+MIGRATION_LOCK_KEY = 7_310_451_802
+BASELINE_TABLES = {"users", "notes", "notes_version", "transaction"}
+BASELINE_REVISION = "0001"
+
+
+def alembic_config(url: str) -> Config:
+    config = Config(str(SRC_DIR / "alembic.ini"))
+    config.set_main_option("script_location", str(SRC_DIR / "migrations"))
+    config.set_main_option("sqlalchemy.url", url.replace("%", "%%"))
+    config.attributes["configure_logger"] = False
+    return config
+
+
+def lock_file_path(url: str) -> Path | None:
+    database = make_url(url).database
+    if not database or database == ":memory:":
+        return None
+    return Path(f"{database}.migrate.lock")
+
+
+@asynccontextmanager
+async def schema_lock(engine, url: str):
+    # Postgres replicas may run on different hosts, so they serialize on an
+    # advisory lock; SQLite databases are local files and use a file lock.
+    if engine.dialect.name == "postgresql":
+        async with engine.connect() as connection:
+            await connection.execute(text("SELECT pg_advisory_lock(:key)"), {"key": MIGRATION_LOCK_KEY})
+            try:
+                yield
+            finally:
+                await connection.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": MIGRATION_LOCK_KEY})
+        return
+    path = lock_file_path(url)
+    if path is None:
+        yield
+        return
+    with open(path, "a") as lock_file:
+        await asyncio.to_thread(fcntl.flock, lock_file.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+
+
+def inspect_schema(connection) -> tuple[bool, set[str], list[str]]:
+    inspector = inspect(connection)
+    return (inspector.has_table("alembic_version"), set(inspector.get_table_names()),
+            find_missing_tables(connection))
+
+
+async def upgrade_schema(engine, url: str, revision: str):
+    async with engine.connect() as connection:
+        versioned, tables, missing_tables = await connection.run_sync(inspect_schema)
+    config = alembic_config(url)
+    if not versioned and tables == BASELINE_TABLES:
+        # Created by `create_all` with SQLAlchemy-Continuum versioning, which
+        # is what the first revision describes; later ones convert its history.
+        logger.warning("Schema predates migrations; stamping it as %s before upgrading", BASELINE_REVISION)
+        await asyncio.to_thread(command.stamp, config, BASELINE_REVISION)
+    elif not versioned and not missing_tables:
+        # Created by `create_all` before migrations were run on startup.
+        logger.warning("Schema exists without an Alembic version; stamping it as head")
+        await asyncio.to_thread(command.stamp, config, "head")
+        return
+    elif not versioned and len(missing_tables) < len(Base.metadata.tables):
+        raise SchemaNotReadyError(
+            f"Database has tables but no Alembic version and is missing: {', '.join(missing_tables)}")
+    # env.py runs its own event loop, so Alembic gets a thread of its own.
+    await asyncio.to_thread(command.upgrade, config, revision)
+
+
+async def prepare_schema(url: str = SQLALCHEMY_DATABASE_URL, mode: str = "migrate", revision: str = "head"):
+    # Runs once per deployment step (not per worker): "migrate" applies Alembic
+    # migrations, "create"/"check" defer to init_db, "skip" does nothing.
+    if mode == "skip":
+        return
+    engine = create_async_engine(url, poolclass=NullPool)
+    try:
+        async with schema_lock(engine, url):
+            if mode == "migrate":
+                await upgrade_schema(engine, url, revision)
+            else:
+                await init_db(engine, mode=mode)
+    finally:
+        await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bring the database schema up to date under a lock.")
+    parser.add_argument("--mode", choices=("migrate", "create", "check", "skip"), default="migrate")
+    parser.add_argument("--revision", default="head")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(prepare_schema(SQLALCHEMY_DATABASE_URL, args.mode, args.revision))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+import argparse
+import asyncio
+
+from sqlalchemy import select
+
+from database import async_session
+from models.user_model import User
+from models.notes_model import Note
+from models.term_frequency_model import UserTerm
+from utils.term_frequency_utils import rebuild_user_terms
+
+
+async def rebuild_term_frequencies(session_factory, user_ids=None):
+    async with session_factory() as db:
+        if user_ids is None:
+            result = await db.execute(select(User.id).order_by(User.id))
+            user_ids = result.scalars().all()
+    for user_id in user_ids:
+        async with session_factory() as db:
+            await rebuild_user_terms(db, user_id)
+            await db.commit()
+    return len(user_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Rebuild the per-user term frequency table from note contents.")
+    parser.add_argument("--user-id", type=int, action="append", dest="user_ids",
+                        help="Rebuild only this user (can be repeated).")
+    args = parser.parse_args()
+    rebuilt = asyncio.run(rebuild_term_frequencies(async_session, args.user_ids))
+    print(f"Rebuilt term frequencies for {rebuilt} user(s)")
+
+
+if __name__ == "__main__":
+    main()
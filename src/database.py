@@ -1,27 +1,350 @@
+import itertools
+import logging
+import re
+import time
+from contextlib import asynccontextmanager
 from typing import Annotated
 
-from decouple import config
+from decouple import Csv, config
 from fastapi import Depends
+from sqlalchemy import event, exc, inspect
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql import functions
+
+from utils.cache_backends import CacheBackend, CacheError, MemoryCacheBackend, create_cache_backend
+
+logger = logging.getLogger(__name__)
 
 SQLALCHEMY_DATABASE_URL = config('SQLALCHEMY_DATABASE_URI')
+DATABASE_PROFILE = config('DATABASE_PROFILE', default='dev')
+SCHEMA_MODE = config('DATABASE_SCHEMA_MODE', default='check' if DATABASE_PROFILE == 'prod' else 'create')
+POOL_WAIT_WARNING_MS = config('DATABASE_POOL_WAIT_WARNING_MS', default=100, cast=float)
+REPLICA_URLS = config('DATABASE_REPLICA_URLS', default='', cast=Csv())
+REPLICA_STICKY_SECONDS = config('DATABASE_REPLICA_STICKY_SECONDS', default=5.0, cast=float)
+REPLICA_RETRY_SECONDS = config('DATABASE_REPLICA_RETRY_SECONDS', default=30.0, cast=float)
+# memory:// is per worker; point it at the analysis cache's sqlite or redis
+# store so a write served by one worker is seen by reads on every other.
+REPLICA_STICKY_URL = config('DATABASE_REPLICA_STICKY_URL', default='memory://?maxsize=100000')
+
+# Raised while checking out a connection, i.e. before any query ran.
+CONNECTION_ERRORS = (exc.DBAPIError, exc.TimeoutError, OSError)
+
+ENGINE_PROFILES = {
+    "dev": {
+        "echo": True,
+        "pool_size": 5,
+        "max_overflow": 10,
+        "pool_timeout": 30,
+        "pool_recycle": -1,
+        "pool_pre_ping": False,
+    },
+    "test": {"echo": False, "poolclass": StaticPool},
+    "prod": {
+        "echo": False,
+        "pool_size": 10,
+        "max_overflow": 20,
+        "pool_timeout": 30,
+        "pool_recycle": 1800,
+        "pool_pre_ping": True,
+    },
+}
+
+POOL_SETTINGS = (
+    ("pool_size", "DATABASE_POOL_SIZE", int),
+    ("max_overflow", "DATABASE_MAX_OVERFLOW", int),
+    ("pool_timeout", "DATABASE_POOL_TIMEOUT", float),
+    ("pool_recycle", "DATABASE_POOL_RECYCLE", int),
+    ("pool_pre_ping", "DATABASE_POOL_PRE_PING", bool),
+)
+
+
+@compiles(functions.now, "sqlite")
+def sqlite_now(element, compiler, **kw):
+    # CURRENT_TIMESTAMP only has second resolution, too coarse for updated_at
+    # to tell consecutive edits apart when it is used as a cache validator.
+    return "STRFTIME('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def create_database_engine(url: str = None, profile: str = None):
+    url = make_url(url or SQLALCHEMY_DATABASE_URL)
+    profile = profile or DATABASE_PROFILE
+    if profile not in ENGINE_PROFILES:
+        raise ValueError(f"Unknown database profile: {profile}")
+    options = dict(ENGINE_PROFILES[profile])
+    options["echo"] = config('DATABASE_ECHO', default=options["echo"], cast=bool)
+    for option, setting, cast in POOL_SETTINGS:
+        if option in options:
+            options[option] = config(setting, default=options[option], cast=cast)
+    connect_args = {}
+    if url.get_backend_name() == "sqlite":
+        connect_args["check_same_thread"] = False
+    if url.get_driver_name() == "asyncpg":
+        connect_args["statement_cache_size"] = config('DATABASE_STATEMENT_CACHE_SIZE', default=100, cast=int)
+    return create_async_engine(url, connect_args=connect_args, **options)
+
+
+class PoolMetrics:
+    def __init__(self, warn_after_ms: float = POOL_WAIT_WARNING_MS):
+        self.warn_after_ms = warn_after_ms
+        self.waits = 0
+        self.slow_waits = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record_wait(self, seconds: float):
+        self.waits += 1
+        self.total_wait += seconds
+        self.max_wait = max(self.max_wait, seconds)
+        if seconds * 1000 >= self.warn_after_ms:
+            self.slow_waits += 1
+            logger.warning("Request waited %.1f ms for a database connection", seconds * 1000)
+
+    def stats(self, engine) -> dict:
+        pool = engine.sync_engine.pool
+        return {
+            "pool": type(pool).__name__,
+            "size": pool.size() if hasattr(pool, "size") else None,
+            "checked_out": pool.checkedout() if hasattr(pool, "checkedout") else None,
+            "checked_in": pool.checkedin() if hasattr(pool, "checkedin") else None,
+            "overflow": pool.overflow() if hasattr(pool, "overflow") else None,
+            "waits": self.waits,
+            "slow_waits": self.slow_waits,
+            "average_wait_ms": round(self.total_wait / self.waits * 1000, 3) if self.waits else 0.0,
+            "max_wait_ms": round(self.max_wait * 1000, 3),
+        }
+
 
-engine = create_async_engine(SQLALCHEMY_DATABASE_URL, echo=True)
+engine = create_database_engine()
 Base = declarative_base()
 async_session = sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+pool_metrics = PoolMetrics()
+
+
+POOL_WAIT_KEY = "pool_wait_started"
+
+
+@event.listens_for(Session, "after_transaction_create")
+def start_pool_wait(session, transaction):
+    # The root transaction begins right before its connection is checked out.
+    if transaction.parent is None and session.info.get(POOL_WAIT_KEY) is True:
+        session.info[POOL_WAIT_KEY] = time.perf_counter()
+
+
+@event.listens_for(Session, "after_begin")
+def record_pool_wait(session, transaction, connection):
+    started = session.info.get(POOL_WAIT_KEY)
+    if isinstance(started, float):
+        session.info[POOL_WAIT_KEY] = False
+        pool_metrics.record_wait(time.perf_counter() - started)
+
+
+@asynccontextmanager
+async def open_session(session_factory):
+    async with session_factory() as db:
+        # Timed on first use, so a handler that returns without touching the
+        # database (e.g. a 304) never checks out a connection.
+        db.info[POOL_WAIT_KEY] = True
+        yield db
 
 
 async def get_db() -> AsyncSession:
-    async with async_session() as db:
+    async with open_session(async_session) as db:
         yield db
 
 
-async def init_db():
-    async with engine.begin() as conn:
+def get_session_factory() -> sessionmaker:
+    return async_session
+
+
+class Replica:
+    def __init__(self, name: str, session_factory: sessionmaker):
+        self.name = name
+        self.session_factory = session_factory
+        self.reads = 0
+        self.failures = 0
+        self.down_until = 0.0
+        self.last_error = None
+
+    @property
+    def healthy(self) -> bool:
+        return self.down_until <= time.monotonic()
+
+
+class ReplicaRouter:
+    # Reads go to a healthy replica in turn, except for users who wrote within
+    # the sticky window, who read from the primary so they see their writes.
+    # A replica that cannot hand out a connection is skipped until its retry
+    # time passes; when none is left reads fall back to the primary.
+    def __init__(self, replicas: list[Replica], sticky_backend: CacheBackend,
+                 sticky_seconds: float = REPLICA_STICKY_SECONDS, retry_seconds: float = REPLICA_RETRY_SECONDS):
+        self.replicas = replicas
+        self.sticky_backend = sticky_backend
+        self.sticky_seconds = sticky_seconds
+        self.retry_seconds = retry_seconds
+        self.turns = itertools.count()
+        self.primary_reads = 0
+        self.sticky_reads = 0
+        self.fallback_reads = 0
+
+    @staticmethod
+    def sticky_key(user_id: int) -> str:
+        return f"replica-sticky:{user_id}"
+
+    async def mark_written(self, user_id: int):
+        if not self.replicas or self.sticky_seconds <= 0:
+            return
+        try:
+            await self.sticky_backend.set(self.sticky_key(user_id), b"1", ttl=self.sticky_seconds)
+        except CacheError as error:
+            logger.warning("Could not record a write for user %s: %s", user_id, error)
+
+    async def recently_wrote(self, user_id: int) -> bool:
+        if self.sticky_seconds <= 0:
+            return False
+        try:
+            return await self.sticky_backend.get(self.sticky_key(user_id)) is not None
+        except CacheError as error:
+            # Without the marker a replica might miss the user's own write.
+            logger.warning("Could not look up recent writes for user %s: %s", user_id, error)
+            return True
+
+    def candidates(self) -> list[Replica]:
+        start = next(self.turns) % len(self.replicas)
+        rotated = self.replicas[start:] + self.replicas[:start]
+        return [replica for replica in rotated if replica.healthy]
+
+    def mark_down(self, replica: Replica, error: Exception):
+        replica.failures += 1
+        replica.down_until = time.monotonic() + self.retry_seconds
+        replica.last_error = str(error)
+        logger.warning("Replica %s is unavailable for %.0f s: %s", replica.name, self.retry_seconds, error)
+
+    @asynccontextmanager
+    async def read_session(self, primary_factory: sessionmaker, user_id: int):
+        if self.replicas:
+            if await self.recently_wrote(user_id):
+                self.sticky_reads += 1
+            else:
+                for replica in self.candidates():
+                    db = replica.session_factory()
+                    started = time.perf_counter()
+                    try:
+                        await db.connection()
+                    except CONNECTION_ERRORS as error:
+                        await db.close()
+                        self.mark_down(replica, error)
+                        continue
+                    pool_metrics.record_wait(time.perf_counter() - started)
+                    replica.reads += 1
+                    async with db:
+                        yield db
+                    return
+                self.fallback_reads += 1
+        self.primary_reads += 1
+        async with open_session(primary_factory) as db:
+            yield db
+
+    def check_workers(self, workers: int):
+        # Markers kept in memory are only seen by the worker that wrote them,
+        # so the other workers would send that user's reads to a stale replica.
+        shared = not isinstance(self.sticky_backend, MemoryCacheBackend)
+        if workers > 1 and self.replicas and self.sticky_seconds > 0 and not shared:
+            raise ValueError(
+                "DATABASE_REPLICA_STICKY_URL must be a sqlite:/// or redis:// URL shared by all "
+                f"{workers} workers; memory:// keeps write markers per worker")
+
+    def stats(self) -> dict:
+        return {
+            "replicas": [
+                {
+                    "name": replica.name,
+                    "healthy": replica.healthy,
+                    "reads": replica.reads,
+                    "failures": replica.failures,
+                    "last_error": replica.last_error,
+                }
+                for replica in self.replicas
+            ],
+            "primary_reads": self.primary_reads,
+            "sticky_reads": self.sticky_reads,
+            "fallback_reads": self.fallback_reads,
+            "sticky_seconds": self.sticky_seconds,
+        }
+
+
+def create_replica_router(urls: list[str] = REPLICA_URLS, sticky_url: str = REPLICA_STICKY_URL) -> ReplicaRouter:
+    replicas = [
+        Replica(
+            make_url(url).render_as_string(hide_password=True),
+            sessionmaker(create_database_engine(url), expire_on_commit=False, class_=AsyncSession))
+        for url in urls
+    ]
+    return ReplicaRouter(replicas, create_cache_backend(sticky_url, prefix='notes-app:'))
+
+
+replica_router = create_replica_router()
+
+
+def get_replica_router() -> ReplicaRouter:
+    return replica_router
+
+
+def dialect_insert(db, model):
+    dialect = postgresql if db.get_bind().dialect.name == 'postgresql' else sqlite
+    return dialect.insert(model)
+
+
+def is_unique_violation(error) -> bool:
+    original = getattr(error, "orig", error)
+    if getattr(original, "sqlstate", None) == "23505" or getattr(original, "pgcode", None) == "23505":
+        return True
+    return "UNIQUE constraint failed" in str(original)
+
+
+def unique_violation_columns(error) -> set[str]:
+    # SQLite: "UNIQUE constraint failed: users.email"; Postgres: "Key (email)=(...) already exists."
+    message = str(getattr(error, "orig", error))
+    sqlite_match = re.search(r"UNIQUE constraint failed: ([\w., ]+)", message)
+    if sqlite_match:
+        return {column.strip().rsplit(".", 1)[-1] for column in sqlite_match.group(1).split(",")}
+    postgres_match = re.search(r"Key \(([^)]+)\)=", message)
+    if postgres_match:
+        return {column.strip() for column in postgres_match.group(1).split(",")}
+    return set()
+
+
+class SchemaNotReadyError(RuntimeError):
+    pass
+
+
+def find_missing_tables(connection) -> list[str]:
+    existing_tables = set(inspect(connection).get_table_names())
+    return [table.name for table in Base.metadata.sorted_tables if table.name not in existing_tables]
+
+
+async def init_db(bind=None, mode: str = None):
+    # "check" only verifies the schema (it is owned by Alembic), "create" runs
+    # DDL when tables are missing, "skip" does nothing.
+    mode = mode or SCHEMA_MODE
+    if mode == "skip":
+        return
+    async with (bind or engine).begin() as conn:
+        missing_tables = await conn.run_sync(find_missing_tables)
+        if not missing_tables:
+            return
+        if mode == "check":
+            raise SchemaNotReadyError(
+                f"Database schema is missing tables: {', '.join(missing_tables)}. Run `alembic upgrade head`.")
         await conn.run_sync(Base.metadata.create_all)
 
 
 db_dependency = Annotated[AsyncSession, Depends(get_db)]
+session_factory_dependency = Annotated[sessionmaker, Depends(get_session_factory)]
+replica_router_dependency = Annotated[ReplicaRouter, Depends(get_replica_router)]
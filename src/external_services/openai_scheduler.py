@@ -0,0 +1,249 @@
+import asyncio
+import heapq
+import itertools
+import time
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+
+from decouple import config
+
+DEFAULT_PRIORITY = 50
+
+
+class SchedulerQueueFullError(Exception):
+    pass
+
+
+@dataclass(frozen=True)
+class RequestContext:
+    user_id: int | None = None
+    priority: int = DEFAULT_PRIORITY
+
+
+# Set by whoever starts a summarization (queue job, streaming endpoint) so the
+# OpenAI calls it makes, including concurrent chunk calls, are scheduled for
+# the right user and note priority.
+current_request_context: ContextVar[RequestContext] = ContextVar(
+    "current_request_context", default=RequestContext())
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float, clock=time.monotonic):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.clock = clock
+        self.level = per_minute
+        self.updated = clock()
+
+    @property
+    def unlimited(self) -> bool:
+        return self.capacity <= 0
+
+    def refill(self):
+        now = self.clock()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        # Requests larger than the bucket only have to wait for a full bucket.
+        if self.unlimited:
+            return 0.0
+        self.refill()
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.rate)
+
+    def consume(self, amount: float):
+        if not self.unlimited:
+            self.refill()
+            self.level -= min(amount, self.capacity)
+
+    def refund(self, amount: float):
+        if not self.unlimited:
+            self.refill()
+            self.level = min(self.capacity, self.level + amount)
+
+
+@dataclass(order=True)
+class ScheduledRequest:
+    sort_key: tuple
+    user_id: int | None = field(compare=False)
+    priority: int = field(compare=False)
+    tokens: int = field(compare=False)
+    future: asyncio.Future = field(compare=False)
+
+
+class UserQueue:
+    __slots__ = ("requests", "finish")
+
+    def __init__(self):
+        self.requests: list[ScheduledRequest] = []
+        self.finish = 0.0
+
+
+class Slot:
+    __slots__ = ("reserved_tokens", "used_tokens")
+
+    def __init__(self, reserved_tokens: int):
+        self.reserved_tokens = reserved_tokens
+        self.used_tokens: int | None = None
+
+
+class OpenAIScheduler:
+    # Within a user, requests run in note priority order. Across users, each
+    # dispatch advances that user's virtual clock by 1 / weight, so a user with
+    # hundreds of queued notes gets the same share as a user with one.
+    def __init__(self, max_in_flight: int = 8, requests_per_minute: float = 0, tokens_per_minute: float = 0,
+                 max_queue_size: int = 1000, user_weights: dict[int, float] | None = None,
+                 clock=time.monotonic):
+        self.max_in_flight = max_in_flight
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_queue_size = max_queue_size
+        self.user_weights = user_weights or {}
+        self.clock = clock
+        self.rejected = 0
+        self.dispatched = 0
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._reset()
+
+    def _reset(self):
+        self.request_bucket = TokenBucket(self.requests_per_minute, self.clock)
+        self.token_bucket = TokenBucket(self.tokens_per_minute, self.clock)
+        self.users: dict[int | None, UserQueue] = {}
+        self.queued = 0
+        self.in_flight = 0
+        self.virtual_time = 0.0
+        self._sequence = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    def _bind_to_running_loop(self):
+        # Same reasoning as the summarization queue: futures from a previous
+        # event loop can never be resolved on the current one.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._reset()
+
+    def is_full(self) -> bool:
+        return self.queued >= self.max_queue_size
+
+    @asynccontextmanager
+    async def slot(self, tokens: int):
+        context = current_request_context.get()
+        await self.acquire(context.user_id, context.priority, tokens)
+        slot = Slot(tokens)
+        try:
+            yield slot
+        finally:
+            self.release(slot)
+
+    async def acquire(self, user_id: int | None, priority: int, tokens: int):
+        self._bind_to_running_loop()
+        if self.is_full():
+            self.rejected += 1
+            raise SchedulerQueueFullError("OpenAI request queue is full, try again later.")
+        user_queue = self.users.get(user_id)
+        if user_queue is None:
+            user_queue = self.users[user_id] = UserQueue()
+        request = ScheduledRequest(
+            sort_key=(-priority, next(self._sequence)), user_id=user_id, priority=priority,
+            tokens=tokens, future=self._loop.create_future())
+        heapq.heappush(user_queue.requests, request)
+        self.queued += 1
+        self._dispatch()
+        try:
+            await request.future
+        except asyncio.CancelledError:
+            if request.future.done() and not request.future.cancelled():
+                # Granted just as the caller was cancelled: hand the slot back.
+                self.release(Slot(tokens))
+            else:
+                self._discard(request)
+            raise
+
+    def release(self, slot: Slot):
+        self.in_flight -= 1
+        if slot.used_tokens is not None and slot.used_tokens < slot.reserved_tokens:
+            self.token_bucket.refund(slot.reserved_tokens - slot.used_tokens)
+        elif slot.used_tokens is not None:
+            self.token_bucket.consume(slot.used_tokens - slot.reserved_tokens)
+        self._dispatch()
+
+    def _discard(self, request: ScheduledRequest):
+        user_queue = self.users.get(request.user_id)
+        if user_queue is not None and request in user_queue.requests:
+            user_queue.requests.remove(request)
+            heapq.heapify(user_queue.requests)
+            self.queued -= 1
+            self._drop_idle(request.user_id)
+
+    def _drop_idle(self, user_id):
+        user_queue = self.users[user_id]
+        if not user_queue.requests and user_queue.finish <= self.virtual_time:
+            del self.users[user_id]
+
+    def _next_user(self):
+        best, best_key = None, None
+        for user_id, user_queue in list(self.users.items()):
+            if not user_queue.requests:
+                self._drop_idle(user_id)
+                continue
+            head = user_queue.requests[0]
+            key = (max(user_queue.finish, self.virtual_time),) + head.sort_key
+            if best_key is None or key < best_key:
+                best, best_key = user_id, key
+        return best, best_key
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self.queued and self.in_flight < self.max_in_flight:
+            user_id, key = self._next_user()
+            user_queue = self.users[user_id]
+            request = user_queue.requests[0]
+            wait = max(self.request_bucket.wait_time(1), self.token_bucket.wait_time(request.tokens))
+            if wait > 0:
+                self._timer = self._loop.call_later(wait, self._dispatch)
+                return
+            heapq.heappop(user_queue.requests)
+            self.queued -= 1
+            self.request_bucket.consume(1)
+            self.token_bucket.consume(request.tokens)
+            self.virtual_time = key[0]
+            user_queue.finish = key[0] + 1.0 / self.user_weights.get(user_id, 1.0)
+            self._drop_idle(user_id)
+            self.in_flight += 1
+            self.dispatched += 1
+            request.future.set_result(None)
+
+    def stats(self) -> dict:
+        return {
+            "queued": self.queued,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "max_queue_size": self.max_queue_size,
+            "dispatched": self.dispatched,
+            "rejected": self.rejected,
+            "queued_users": sum(1 for user_queue in self.users.values() if user_queue.requests),
+            "requests_available": None if self.request_bucket.unlimited else round(self.request_bucket.level, 2),
+            "tokens_available": None if self.token_bucket.unlimited else round(self.token_bucket.level, 2),
+        }
+
+
+def parse_user_weights(value: str) -> dict[int, float]:
+    weights = {}
+    for item in filter(None, value.split(",")):
+        user_id, _, weight = item.partition(":")
+        weights[int(user_id)] = float(weight)
+    return weights
+
+
+openai_scheduler = OpenAIScheduler(
+    max_in_flight=config('OPENAI_MAX_IN_FLIGHT', default=8, cast=int),
+    requests_per_minute=config('OPENAI_REQUESTS_PER_MINUTE', default=500, cast=float),
+    tokens_per_minute=config('OPENAI_TOKENS_PER_MINUTE', default=30000, cast=float),
+    max_queue_size=config('OPENAI_QUEUE_SIZE', default=1000, cast=int),
+    user_weights=config('OPENAI_USER_WEIGHTS', default="", cast=parse_user_weights),
+)
@@ -1,23 +1,113 @@
+import hashlib
+import re
+import time
+from typing import AsyncIterator
+
 from openai import AsyncOpenAI
 from decouple import config
 
+from external_services.openai_scheduler import openai_scheduler
+from utils.metrics_utils import record_openai_call
+from utils.text_utils import estimate_tokens
+
 OPENAI_API_KEY = config('OPENAI_API_KEY')
+SUMMARIZATION_MODEL = "gpt-4o"
+SUMMARIZATION_PROMPT = ("You are a helpful assistant who summarizes note content, "
+                        "providing only the essential information.")
+CHUNK_PROMPT = ("You are a helpful assistant who summarizes one section of a longer note, "
+                "keeping the facts that matter for the note as a whole.")
+REDUCE_PROMPT = ("You are a helpful assistant who combines summaries of consecutive sections of a note "
+                 "into one summary, providing only the essential information.")
+CHUNK_TOKEN_LIMIT = config('SUMMARIZATION_CHUNK_TOKENS', default=3000, cast=int)
+CHUNK_CONCURRENCY = config('SUMMARIZATION_CHUNK_CONCURRENCY', default=4, cast=int)
+# Reserved against the tokens-per-minute budget for each reply until the real usage is known.
+COMPLETION_TOKEN_ESTIMATE = config('SUMMARIZATION_COMPLETION_TOKEN_ESTIMATE', default=500, cast=int)
 
 client = AsyncOpenAI(api_key=OPENAI_API_KEY)
 
 
-async def make_summarization(note_content: str) -> str:
+def estimate_request_tokens(messages: list[dict]) -> int:
+    return sum(estimate_tokens(message["content"]) for message in messages) + COMPLETION_TOKEN_ESTIMATE
+
+
+def normalize_content(note_content: str) -> str:
+    return re.sub(r'\s+', ' ', note_content).strip()
+
+
+def summarization_key(note_content: str, prompt: str = SUMMARIZATION_PROMPT) -> str:
+    payload = "\0".join((SUMMARIZATION_MODEL, prompt, normalize_content(note_content)))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+async def request_completion(prompt: str, content: str) -> str:
     messages = [{"role": "system",
-                 "content": "You are a helpful assistant who summarizes note content, "
-                            "providing only the essential information."},
+                 "content": prompt},
                 {"role": "user",
-                 "content": note_content}]
+                 "content": content}]
 
-    completion = await client.chat.completions.create(
-        model="gpt-4o",
-        messages=messages,
-        temperature=0.0,
-    )
+    async with openai_scheduler.slot(estimate_request_tokens(messages)) as slot:
+        started = time.perf_counter()
+        try:
+            completion = await client.chat.completions.create(
+                model=SUMMARIZATION_MODEL,
+                messages=messages,
+                temperature=0.0,
+            )
+        except Exception as error:
+            record_openai_call(SUMMARIZATION_MODEL, time.perf_counter() - started, error=error)
+            raise
+        slot.used_tokens = getattr(getattr(completion, "usage", None), "total_tokens", None)
+    record_openai_call(SUMMARIZATION_MODEL, time.perf_counter() - started, getattr(completion, "usage", None))
     reply = completion.choices[0].message.content
 
     return reply
+
+
+async def make_summarization(note_content: str) -> str:
+    return await request_completion(SUMMARIZATION_PROMPT, note_content)
+
+
+async def summarize_chunk(chunk: str) -> str:
+    return await request_completion(CHUNK_PROMPT, chunk)
+
+
+async def combine_summaries(partial_summaries: list[str]) -> str:
+    return await request_completion(REDUCE_PROMPT, join_summaries(partial_summaries))
+
+
+def join_summaries(partial_summaries: list[str]) -> str:
+    return "\n\n".join(partial_summaries)
+
+
+async def stream_summarization(note_content: str, prompt: str = SUMMARIZATION_PROMPT) -> AsyncIterator[str]:
+    messages = [{"role": "system",
+                 "content": prompt},
+                {"role": "user",
+                 "content": note_content}]
+
+    parts = []
+    async with openai_scheduler.slot(estimate_request_tokens(messages)) as slot:
+        started = time.perf_counter()
+        stream = None
+        try:
+            stream = await client.chat.completions.create(
+                model=SUMMARIZATION_MODEL,
+                messages=messages,
+                temperature=0.0,
+                stream=True,
+            )
+            async for chunk in stream:
+                if chunk.choices and chunk.choices[0].delta.content:
+                    parts.append(chunk.choices[0].delta.content)
+                    yield chunk.choices[0].delta.content
+        except Exception as error:
+            record_openai_call(SUMMARIZATION_MODEL, time.perf_counter() - started, error=error)
+            raise
+        finally:
+            # Closing the stream drops the upstream HTTP response, which is how a
+            # cancelled consumer (e.g. a disconnected client) stops generation.
+            if stream is not None:
+                await stream.close()
+            # Streams carry no usage, so settle the token budget on an estimate.
+            slot.used_tokens = estimate_tokens(prompt + note_content + "".join(parts))
+    record_openai_call(SUMMARIZATION_MODEL, time.perf_counter() - started)
@@ -0,0 +1,131 @@
+import asyncio
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from decouple import config
+from sqlalchemy import update
+
+from external_services import openai_service
+from external_services.openai_scheduler import DEFAULT_PRIORITY, RequestContext, current_request_context
+from external_services.summary_cache import summary_cache
+from models.notes_model import Note
+
+PENDING = "pending"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+SUPERSEDED = "superseded"
+
+
+@dataclass
+class SummarizationJob:
+    id: str
+    note_id: int
+    user_id: int
+    status: str = PENDING
+    summarization: str | None = None
+    error: str | None = None
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "note_id": self.note_id,
+            "status": self.status,
+            "summarization": self.summarization,
+            "error": self.error,
+        }
+
+
+class SummarizationQueue:
+    def __init__(self, max_concurrency: int = 4, max_retained_jobs: int = 10000):
+        self.max_concurrency = max_concurrency
+        self.max_retained_jobs = max_retained_jobs
+        self.jobs: OrderedDict[str, SummarizationJob] = OrderedDict()
+        self.inflight: dict[tuple[int, str], SummarizationJob] = {}
+        self._tasks: set[asyncio.Task] = set()
+        self._semaphore: asyncio.Semaphore | None = None
+        self._loop: asyncio.AbstractEventLoop | None = None
+
+    def _bind_to_running_loop(self):
+        # Jobs are plain tasks on the serving loop; a new loop (e.g. a fresh
+        # test event loop) cannot await work scheduled on the previous one.
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+            self.inflight.clear()
+            self._tasks.clear()
+
+    def submit(self, note_id: int, user_id: int, content: str, session_factory,
+               priority: int = DEFAULT_PRIORITY, replicas=None) -> SummarizationJob:
+        self._bind_to_running_loop()
+        # Keyed on the content as well, so a request made after an edit does
+        # not join a job that is still summarizing the previous content.
+        inflight_key = (note_id, openai_service.summarization_key(content))
+        existing_job = self.inflight.get(inflight_key)
+        if existing_job:
+            return existing_job
+        job = SummarizationJob(id=uuid.uuid4().hex, note_id=note_id, user_id=user_id)
+        self.jobs[job.id] = job
+        while len(self.jobs) > self.max_retained_jobs:
+            self.jobs.popitem(last=False)
+        self.inflight[inflight_key] = job
+        task = self._loop.create_task(self._run(job, inflight_key, content, session_factory, priority, replicas))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job
+
+    def get(self, job_id: str, user_id: int) -> SummarizationJob | None:
+        job = self.jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def join(self):
+        while self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _run(self, job: SummarizationJob, inflight_key: tuple[int, str], content: str, session_factory,
+                   priority: int, replicas=None):
+        # OpenAI calls are throttled and ordered by the shared scheduler; the
+        # semaphore only bounds how many jobs write results back at once.
+        current_request_context.set(RequestContext(user_id=job.user_id, priority=priority))
+        try:
+            job.status = RUNNING
+            summarization = await summary_cache.summarize(content, session_factory)
+            if not summarization:
+                raise ValueError("Failed to generate a summarization for the note.")
+            async with self._semaphore:
+                async with session_factory() as db:
+                    saved = await save_summarization(db, job.note_id, job.user_id, content, summarization)
+                    await db.commit()
+                if saved and replicas is not None:
+                    await replicas.mark_written(job.user_id)
+            job.summarization = summarization
+            if saved:
+                job.status = COMPLETED
+            else:
+                job.status = SUPERSEDED
+                job.error = "Note was edited or deleted while it was being summarized"
+        except Exception as error:
+            job.status = FAILED
+            job.error = str(error)
+        finally:
+            if self.inflight.get(inflight_key) is job:
+                del self.inflight[inflight_key]
+
+
+async def save_summarization(db, note_id: int, user_id: int, content: str, summarization: str) -> bool:
+    # Only writes when the note still holds the summarized content; an edit
+    # made meanwhile wins and the note stays unsummarized.
+    result = await db.execute(
+        update(Note)
+        .where(Note.id == note_id, Note.user_id == user_id, Note.content == content)
+        .values(summarization=summarization)
+    )
+    return result.rowcount > 0
+
+
+summarization_queue = SummarizationQueue(
+    max_concurrency=config('SUMMARIZATION_WORKERS', default=4, cast=int))
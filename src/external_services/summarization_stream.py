@@ -0,0 +1,74 @@
+import json
+from typing import AsyncIterator
+
+from external_services import openai_service
+from external_services.openai_scheduler import DEFAULT_PRIORITY, RequestContext, current_request_context
+from external_services.summarization_queue import save_summarization
+from external_services.summary_cache import summary_cache
+
+SUPERSEDED_DETAIL = "Note was edited or deleted while it was being summarized"
+
+
+def format_event(event: str, data) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def replay_summarization(summarization: str, saved: bool = True) -> AsyncIterator[str]:
+    yield format_event("summary", summarization)
+    if saved:
+        yield format_event("done", {"summarization": summarization, "cached": True})
+    else:
+        yield format_event("superseded", {"detail": SUPERSEDED_DETAIL})
+
+
+async def stream_note_summarization(note_id: int, user_id: int, content: str, session_factory,
+                                    priority: int = DEFAULT_PRIORITY, replicas=None) -> AsyncIterator[str]:
+    # Runs inside the response's own task, so the context does not leak.
+    current_request_context.set(RequestContext(user_id=user_id, priority=priority))
+    key = openai_service.summarization_key(content)
+    async with session_factory() as db:
+        cached = await summary_cache.lookup(key, db)
+        if cached is not None:
+            saved = await save_summarization(db, note_id, user_id, content, cached)
+            await db.commit()
+    if cached is not None:
+        if saved and replicas is not None:
+            await replicas.mark_written(user_id)
+        async for event in replay_summarization(cached, saved):
+            yield event
+        return
+
+    summary_cache.misses += 1
+    parts = []
+    try:
+        prompt, request_content = await summary_cache.prepare_request(content, session_factory)
+    except Exception as error:
+        yield format_event("error", {"detail": str(error) or type(error).__name__})
+        return
+    tokens = openai_service.stream_summarization(request_content, prompt)
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield format_event("token", token)
+    except Exception as error:
+        yield format_event("error", {"detail": str(error) or type(error).__name__})
+        return
+    finally:
+        # A client disconnect cancels this generator mid-stream; closing the
+        # token iterator closes the upstream completion as well.
+        await tokens.aclose()
+
+    summarization = "".join(parts)
+    if not summarization:
+        yield format_event("error", {"detail": "Failed to generate a summarization for the note."})
+        return
+    async with session_factory() as db:
+        await summary_cache.store(key, summarization, db)
+        saved = await save_summarization(db, note_id, user_id, content, summarization)
+        await db.commit()
+    if saved and replicas is not None:
+        await replicas.mark_written(user_id)
+    if saved:
+        yield format_event("done", {"summarization": summarization, "cached": False})
+    else:
+        yield format_event("superseded", {"detail": SUPERSEDED_DETAIL})
@@ -0,0 +1,144 @@
+import asyncio
+
+from decouple import config
+from sqlalchemy import select
+
+from database import dialect_insert
+from external_services import openai_service
+from models.summary_model import SummaryCacheEntry
+from utils.cache_utils import LRUCache
+from utils.text_utils import estimate_tokens, split_into_chunks
+
+
+class SummaryCache:
+    def __init__(self, maxsize: int = 1024, ttl: float | None = 3600.0):
+        self.memory = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.memory_hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def lookup(self, key: str, db) -> str | None:
+        summarization = self.memory.get(key)
+        if summarization is not None:
+            self.memory_hits += 1
+            return summarization
+        result = await db.execute(
+            select(SummaryCacheEntry.summarization).where(SummaryCacheEntry.content_hash == key))
+        summarization = result.scalar_one_or_none()
+        if summarization is not None:
+            self.persistent_hits += 1
+            self.memory.set(key, summarization)
+        return summarization
+
+    async def store(self, key: str, summarization: str, db):
+        statement = dialect_insert(db, SummaryCacheEntry).values(
+            content_hash=key,
+            summarization=summarization,
+            model=openai_service.SUMMARIZATION_MODEL,
+        ).on_conflict_do_nothing(index_elements=[SummaryCacheEntry.content_hash])
+        await db.execute(statement)
+        self.memory.set(key, summarization)
+
+    async def summarize(self, note_content: str, session_factory) -> str | None:
+        key = openai_service.summarization_key(note_content)
+        async with session_factory() as db:
+            summarization = await self.lookup(key, db)
+        if summarization is not None:
+            return summarization
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            return await asyncio.shield(inflight)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            prompt, content = await self.prepare_request(note_content, session_factory)
+            summarization = await openai_service.request_completion(prompt, content)
+            if summarization:
+                async with session_factory() as db:
+                    await self.store(key, summarization, db)
+                    await db.commit()
+            future.set_result(summarization)
+            return summarization
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def prepare_request(self, note_content: str, session_factory) -> tuple[str, str]:
+        # Returns the prompt and content for the final summarization call. Long
+        # notes are summarized chunk by chunk first (the map step) and the final
+        # call combines the partial summaries (the reduce step).
+        limit = openai_service.CHUNK_TOKEN_LIMIT
+        chunks = split_into_chunks(note_content, limit)
+        if len(chunks) <= 1:
+            return openai_service.SUMMARIZATION_PROMPT, note_content
+        partials = await self.summarize_chunks(chunks, session_factory)
+        while len(partials) > 1 and estimate_tokens(openai_service.join_summaries(partials)) > limit:
+            groups = split_into_chunks(openai_service.join_summaries(partials), limit)
+            if len(groups) >= len(partials):
+                break
+            partials = await gather_limited(openai_service.combine_summaries([group]) for group in groups)
+        return openai_service.REDUCE_PROMPT, openai_service.join_summaries(partials)
+
+    async def summarize_chunks(self, chunks: list[str], session_factory) -> list[str]:
+        # Partial summaries are cached by chunk hash, so editing one paragraph of
+        # a long note only re-summarizes the chunk that contains it.
+        keys = [openai_service.summarization_key(chunk, openai_service.CHUNK_PROMPT) for chunk in chunks]
+        partials = [self.memory.get(key) for key in keys]
+        missing = {key for key, partial in zip(keys, partials) if partial is None}
+        if missing:
+            async with session_factory() as db:
+                result = await db.execute(
+                    select(SummaryCacheEntry.content_hash, SummaryCacheEntry.summarization)
+                    .where(SummaryCacheEntry.content_hash.in_(missing)))
+                stored = dict(result.all())
+            for key, summarization in stored.items():
+                self.memory.set(key, summarization)
+            partials = [partial if partial is not None else stored.get(key) for key, partial in zip(keys, partials)]
+
+        pending = {}
+        for chunk, key, partial in zip(chunks, keys, partials):
+            if partial is None and key not in pending:
+                pending[key] = chunk
+        if pending:
+            summaries = await gather_limited(openai_service.summarize_chunk(chunk) for chunk in pending.values())
+            generated = dict(zip(pending, summaries))
+            async with session_factory() as db:
+                for key, summarization in generated.items():
+                    if summarization:
+                        await self.store(key, summarization, db)
+                await db.commit()
+            partials = [partial if partial is not None else generated[key] or "" for key, partial in zip(keys, partials)]
+        return partials
+
+    def stats(self) -> dict:
+        return {
+            "memory_hits": self.memory_hits,
+            "persistent_hits": self.persistent_hits,
+            "misses": self.misses,
+            "memory_size": len(self.memory),
+            "memory_maxsize": self.memory.maxsize,
+        }
+
+
+async def gather_limited(coroutines, limit: int | None = None) -> list:
+    semaphore = asyncio.Semaphore(limit or openai_service.CHUNK_CONCURRENCY)
+
+    async def run(coroutine):
+        async with semaphore:
+            return await coroutine
+
+    return await asyncio.gather(*(run(coroutine) for coroutine in coroutines))
+
+
+summary_cache = SummaryCache(
+    maxsize=config('SUMMARY_CACHE_SIZE', default=1024, cast=int),
+    ttl=config('SUMMARY_CACHE_TTL_SECONDS', default=3600.0, cast=float),
+)
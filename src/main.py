@@ -1,9 +1,16 @@
 from fastapi import FastAPI
 
 from database import init_db
-from routers import auth, notes, analysis
+from utils.authentication_utils import password_executor
+from routers import auth, notes, analysis, admin, metrics
+from utils.metrics_utils import METRICS_ENABLED, MetricsMiddleware, instrument_engines
 from models.user_model import User
 from models.notes_model import Note
+from models.note_revision_model import NoteRevision
+from models.term_frequency_model import UserTerm
+from models.summary_model import SummaryCacheEntry
+from models.corpus_version_model import UserCorpusVersion
+from models import search_model
 
 app = FastAPI()
 
@@ -18,7 +25,19 @@ async def on_startup():
     await init_db()
 
 
+@app.on_event("shutdown")
+async def on_shutdown():
+    analysis.analysis_executor.shutdown(wait=False)
+    password_executor.shutdown(wait=False)
+
+
 app.include_router(auth.router)
 app.include_router(notes.router)
 
 app.include_router(analysis.router)
+app.include_router(admin.router)
+
+if METRICS_ENABLED:
+    instrument_engines()
+    app.add_middleware(MetricsMiddleware)
+    app.include_router(metrics.router)
@@ -9,6 +9,11 @@ from alembic import context
 from database import SQLALCHEMY_DATABASE_URL
 from models.user_model import User
 from models.notes_model import Note
+from models.note_revision_model import NoteRevision
+from models.term_frequency_model import UserTerm
+from models.summary_model import SummaryCacheEntry
+from models.corpus_version_model import UserCorpusVersion
+from models import search_model
 
 import models
 
@@ -18,15 +23,27 @@ config = context.config
 
 # Interpret the config file for Python logging.
 # This line sets up loggers basically.
-
-fileConfig(config.config_file_name)
+# Callers that already configured logging (e.g. server.py) opt out, since
+# fileConfig would otherwise disable every logger created before it ran.
+if config.attributes.get('configure_logger', True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
 
 # add your model's MetaData object here
 # for 'autogenerate' support
 # from myapp import mymodel
 # target_metadata = mymodel.Base.metadata
 target_metadata = Base.metadata
-config.set_main_option('sqlalchemy.url', SQLALCHEMY_DATABASE_URL)
+if not config.get_main_option('sqlalchemy.url'):
+    config.set_main_option('sqlalchemy.url', SQLALCHEMY_DATABASE_URL.replace('%', '%%'))
+
+
+def include_object(object, name, type_, reflected, compare_to):
+    # Full-text search structures are managed by raw DDL in models.search_model.
+    if type_ == "table" and name.startswith("notes_fts"):
+        return False
+    if name in ("search_vector", "ix_notes_search_vector"):
+        return False
+    return True
 
 
 # other values from the config, defined by the needs of env.py,
@@ -51,6 +68,7 @@ def run_migrations_offline() -> None:
     context.configure(
         url=url,
         target_metadata=target_metadata,
+        include_object=include_object,
         literal_binds=True,
         dialect_opts={"paramstyle": "named"},
     )
@@ -60,7 +78,11 @@ def run_migrations_offline() -> None:
 
 
 def do_run_migrations(connection: Connection) -> None:
-    context.configure(connection=connection, target_metadata=target_metadata)
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        include_object=include_object,
+    )
 
     with context.begin_transaction():
         context.run_migrations()
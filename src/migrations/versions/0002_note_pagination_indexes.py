@@ -0,0 +1,34 @@
+"""note pagination indexes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2025-03-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_index('ix_notes_user_id_id', 'notes', ['user_id', 'id'], unique=False)
+    op.create_index(
+        'ix_notes_version_id_user_id_transaction_id',
+        'notes_version',
+        ['id', 'user_id', 'transaction_id'],
+        unique=False)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_notes_version_id_user_id_transaction_id', table_name='notes_version')
+    op.drop_index('ix_notes_user_id_id', table_name='notes')
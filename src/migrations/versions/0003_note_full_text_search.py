@@ -0,0 +1,42 @@
+"""note full text search
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2025-03-19 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.search_model import POSTGRES_SEARCH_DDL, SQLITE_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        for statement in POSTGRES_SEARCH_DDL:
+            op.execute(statement)
+    else:
+        for statement in SQLITE_SEARCH_DDL:
+            op.execute(statement)
+        op.execute("INSERT INTO notes_fts(notes_fts) VALUES ('rebuild')")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute("DROP INDEX IF EXISTS ix_notes_search_vector")
+        op.drop_column('notes', 'search_vector')
+    else:
+        for trigger in ('notes_fts_insert', 'notes_fts_delete', 'notes_fts_update'):
+            op.execute(f"DROP TRIGGER IF EXISTS {trigger}")
+        op.execute("DROP TABLE IF EXISTS notes_fts")
@@ -0,0 +1,192 @@
+"""note revisions
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2025-03-20 12:00:00.000000
+
+"""
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.versioning_utils import SNAPSHOT_INTERVAL, apply_delta, encode_delta, encode_snapshot, read_snapshot
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+note_revisions = sa.table(
+    'note_revisions',
+    sa.column('note_id', sa.Integer()),
+    sa.column('version', sa.Integer()),
+    sa.column('user_id', sa.Integer()),
+    sa.column('operation_type', sa.SmallInteger()),
+    sa.column('title', sa.String()),
+    sa.column('priority', sa.Integer()),
+    sa.column('is_latest', sa.Boolean()),
+    sa.column('is_snapshot', sa.Boolean()),
+    sa.column('payload', sa.LargeBinary()),
+    sa.column('created_at', sa.DateTime()),
+)
+
+notes_version = sa.table(
+    'notes_version',
+    sa.column('id', sa.Integer()),
+    sa.column('title', sa.String()),
+    sa.column('content', sa.TEXT()),
+    sa.column('priority', sa.Integer()),
+    sa.column('user_id', sa.Integer()),
+    sa.column('created_at', sa.DateTime()),
+    sa.column('updated_at', sa.DateTime()),
+    sa.column('transaction_id', sa.BigInteger()),
+    sa.column('end_transaction_id', sa.BigInteger()),
+    sa.column('operation_type', sa.SmallInteger()),
+)
+
+transaction = sa.table(
+    'transaction',
+    sa.column('id', sa.BigInteger()),
+    sa.column('issued_at', sa.DateTime()),
+)
+
+
+def insert_in_batches(table, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        op.bulk_insert(table, rows[start:start + BATCH_SIZE])
+
+
+def convert_versions(versions) -> list[dict]:
+    # Newest first: the latest version stays a snapshot, older ones become
+    # reverse deltas unless they fall on the snapshot interval.
+    revisions = []
+    newer_content = None
+    for number, version in reversed(list(enumerate(versions, start=1))):
+        is_snapshot = newer_content is None or number % SNAPSHOT_INTERVAL == 0
+        revisions.append({
+            'note_id': version.id,
+            'version': number,
+            'user_id': version.user_id,
+            'operation_type': version.operation_type,
+            'title': version.title,
+            'priority': version.priority,
+            'is_latest': newer_content is None,
+            'is_snapshot': is_snapshot,
+            'payload': encode_snapshot(version.content) if is_snapshot else encode_delta(
+                newer_content, version.content),
+            'created_at': version.issued_at or version.updated_at,
+        })
+        newer_content = version.content
+    return revisions
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.create_table('note_revisions',
+    sa.Column('note_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('version', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('operation_type', sa.SmallInteger(), nullable=False),
+    sa.Column('title', sa.String(), nullable=False),
+    sa.Column('priority', sa.Integer(), nullable=False),
+    sa.Column('is_latest', sa.Boolean(), nullable=False),
+    sa.Column('is_snapshot', sa.Boolean(), nullable=False),
+    sa.Column('payload', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+    sa.PrimaryKeyConstraint('note_id', 'version')
+    )
+
+    versions = op.get_bind().execute(
+        sa.select(notes_version.c.id, notes_version.c.user_id, notes_version.c.operation_type,
+                  notes_version.c.title, notes_version.c.priority, notes_version.c.content,
+                  notes_version.c.updated_at, transaction.c.issued_at)
+        .select_from(notes_version.outerjoin(transaction, transaction.c.id == notes_version.c.transaction_id))
+        .order_by(notes_version.c.id, notes_version.c.transaction_id)
+    )
+    revisions = []
+    for _, note_versions in groupby(versions, key=lambda version: version.id):
+        revisions.extend(convert_versions(list(note_versions)))
+        if len(revisions) >= BATCH_SIZE:
+            insert_in_batches(note_revisions, revisions)
+            revisions = []
+    insert_in_batches(note_revisions, revisions)
+
+    op.drop_table('notes_version')
+    op.drop_table('transaction')
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(sa.schema.DropSequence(sa.Sequence('transaction_id_seq')))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute(sa.schema.CreateSequence(sa.Sequence('transaction_id_seq')))
+    op.create_table('transaction',
+    sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+    sa.Column('remote_addr', sa.String(length=50), nullable=True),
+    sa.Column('issued_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('notes_version',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('title', sa.String(), autoincrement=False, nullable=True),
+    sa.Column('content', sa.TEXT(), autoincrement=False, nullable=True),
+    sa.Column('priority', sa.Integer(), autoincrement=False, nullable=True),
+    sa.Column('user_id', sa.Integer(), autoincrement=False, nullable=True),
+    sa.Column('summarization', sa.Text(), autoincrement=False, nullable=True),
+    sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), autoincrement=False, nullable=True),
+    sa.Column('updated_at', sa.DateTime(), server_default=sa.func.now(), autoincrement=False, nullable=True),
+    sa.Column('transaction_id', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('end_transaction_id', sa.BigInteger(), nullable=True),
+    sa.Column('operation_type', sa.SmallInteger(), nullable=False),
+    sa.PrimaryKeyConstraint('id', 'transaction_id')
+    )
+    op.create_index(op.f('ix_notes_version_end_transaction_id'), 'notes_version', ['end_transaction_id'], unique=False)
+    op.create_index(op.f('ix_notes_version_id'), 'notes_version', ['id'], unique=False)
+    op.create_index(op.f('ix_notes_version_operation_type'), 'notes_version', ['operation_type'], unique=False)
+    op.create_index(op.f('ix_notes_version_transaction_id'), 'notes_version', ['transaction_id'], unique=False)
+    op.create_index(
+        'ix_notes_version_id_user_id_transaction_id',
+        'notes_version',
+        ['id', 'user_id', 'transaction_id'],
+        unique=False)
+
+    revisions = op.get_bind().execute(
+        sa.select(note_revisions).order_by(note_revisions.c.note_id, note_revisions.c.version.desc())
+    )
+    transactions, versions = [], []
+    transaction_id = 0
+    for _, note_revisions_desc in groupby(revisions, key=lambda revision: revision.note_id):
+        note_revisions_desc = list(note_revisions_desc)
+        first_transaction_id = transaction_id + 1
+        transaction_id += len(note_revisions_desc)
+        content = None
+        for offset, revision in enumerate(note_revisions_desc):
+            content = read_snapshot(revision.payload) if revision.is_snapshot else apply_delta(
+                content, revision.payload)
+            version_transaction_id = first_transaction_id + revision.version - 1
+            transactions.append({'id': version_transaction_id, 'issued_at': revision.created_at})
+            versions.append({
+                'id': revision.note_id,
+                'title': revision.title,
+                'content': content,
+                'priority': revision.priority,
+                'user_id': revision.user_id,
+                'created_at': revision.created_at,
+                'updated_at': revision.created_at,
+                'transaction_id': version_transaction_id,
+                'end_transaction_id': None if offset == 0 else version_transaction_id + 1,
+                'operation_type': revision.operation_type,
+            })
+    insert_in_batches(transaction, transactions)
+    insert_in_batches(notes_version, versions)
+    if op.get_bind().dialect.name == 'postgresql' and transaction_id:
+        op.execute(f"SELECT setval('transaction_id_seq', {transaction_id})")
+
+    op.drop_table('note_revisions')
@@ -0,0 +1,55 @@
+"""notes autoincrement
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2025-03-23 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from models.search_model import SQLITE_SEARCH_DDL
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def rebuild_notes(autoincrement: bool) -> None:
+    # SQLite can only add AUTOINCREMENT by recreating the table; dropping the
+    # old table drops its full text search triggers, so they are recreated.
+    with op.batch_alter_table('notes', recreate='always',
+                              table_kwargs={'sqlite_autoincrement': autoincrement}):
+        pass
+    for statement in SQLITE_SEARCH_DDL[1:]:
+        op.execute(statement)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Postgres sequences never hand out an id twice; only SQLite reuses the
+    # ids of deleted rows, which collides with their note_revisions.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_notes(autoincrement=True)
+    # Ids of notes deleted before this migration still have revisions, so the
+    # sequence starts above both tables.
+    bind = op.get_bind()
+    highest_id = bind.execute(sa.text(
+        "SELECT MAX(id) FROM (SELECT MAX(id) AS id FROM notes UNION ALL SELECT MAX(note_id) FROM note_revisions)"
+    )).scalar()
+    op.execute("DELETE FROM sqlite_sequence WHERE name = 'notes'")
+    if highest_id is not None:
+        bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('notes', :seq)"), {"seq": highest_id})
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    rebuild_notes(autoincrement=False)
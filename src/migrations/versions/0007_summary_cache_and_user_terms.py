@@ -0,0 +1,80 @@
+"""summary cache and user terms
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2025-03-24 12:00:00.000000
+
+"""
+from collections import Counter
+from itertools import groupby
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from utils.term_frequency_utils import count_terms
+
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+BATCH_SIZE = 1000
+
+user_terms = sa.table(
+    'user_terms',
+    sa.column('user_id', sa.Integer()),
+    sa.column('term', sa.String()),
+    sa.column('count', sa.Integer()),
+)
+
+notes = sa.table(
+    'notes',
+    sa.column('user_id', sa.Integer()),
+    sa.column('content', sa.TEXT()),
+)
+
+
+def backfill_user_terms() -> None:
+    rows = op.get_bind().execute(
+        sa.select(notes.c.user_id, notes.c.content).order_by(notes.c.user_id))
+    for user_id, user_notes in groupby(rows, key=lambda note: note.user_id):
+        terms = Counter()
+        for note in user_notes:
+            terms.update(count_terms(note.content))
+        changes = [{'user_id': user_id, 'term': term, 'count': count} for term, count in terms.items()]
+        for start in range(0, len(changes), BATCH_SIZE):
+            op.bulk_insert(user_terms, changes[start:start + BATCH_SIZE])
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Databases migrated before these tables moved out of 0001 already have them.
+    existing_tables = set(sa.inspect(op.get_bind()).get_table_names())
+    if 'summary_cache' not in existing_tables:
+        op.create_table('summary_cache',
+        sa.Column('content_hash', sa.String(length=64), nullable=False),
+        sa.Column('summarization', sa.Text(), nullable=False),
+        sa.Column('model', sa.String(), nullable=False),
+        sa.Column('created_at', sa.DateTime(), server_default=sa.func.now(), nullable=True),
+        sa.PrimaryKeyConstraint('content_hash')
+        )
+    if 'user_terms' not in existing_tables:
+        op.create_table('user_terms',
+        sa.Column('user_id', sa.Integer(), nullable=False),
+        sa.Column('term', sa.String(), nullable=False),
+        sa.Column('count', sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+        sa.PrimaryKeyConstraint('user_id', 'term')
+        )
+        op.create_index('ix_user_terms_user_id_count', 'user_terms', ['user_id', 'count'], unique=False)
+        backfill_user_terms()
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_user_terms_user_id_count', table_name='user_terms')
+    op.drop_table('user_terms')
+    op.drop_table('summary_cache')
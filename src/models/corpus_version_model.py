@@ -0,0 +1,15 @@
+import sqlalchemy as sa
+from sqlalchemy.sql import func
+
+from database import Base
+
+
+class UserCorpusVersion(Base):
+    __tablename__ = 'user_corpus_versions'
+
+    user_id = sa.Column(
+        sa.Integer,
+        sa.ForeignKey('users.id'),
+        primary_key=True)
+    version = sa.Column(sa.Integer, nullable=False, default=0)
+    updated_at = sa.Column(sa.DateTime, server_default=func.now())
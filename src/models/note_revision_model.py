@@ -0,0 +1,21 @@
+import sqlalchemy as sa
+from sqlalchemy.sql import func
+
+from database import Base
+
+
+class NoteRevision(Base):
+    __tablename__ = 'note_revisions'
+
+    note_id = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    version = sa.Column(sa.Integer, primary_key=True, autoincrement=False)
+    user_id = sa.Column(sa.Integer, nullable=False)
+    operation_type = sa.Column(sa.SmallInteger, nullable=False)
+    title = sa.Column(sa.String, nullable=False)
+    priority = sa.Column(sa.Integer, nullable=False)
+    # The latest revision of a note is always a full snapshot; older ones are
+    # reverse deltas against the next version unless kept as periodic snapshots.
+    is_latest = sa.Column(sa.Boolean, nullable=False, default=True)
+    is_snapshot = sa.Column(sa.Boolean, nullable=False, default=True)
+    payload = sa.Column(sa.LargeBinary, nullable=False)
+    created_at = sa.Column(sa.DateTime, server_default=func.now())
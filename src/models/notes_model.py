@@ -1,16 +1,17 @@
 import sqlalchemy as sa
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
-from sqlalchemy_continuum import make_versioned
 
 from database import Base
 
-make_versioned(user_cls=None)
-
 
 class Note(Base):
-    __versioned__ = {}
     __tablename__ = 'notes'
+    __table_args__ = (
+        sa.Index('ix_notes_user_id_id', 'user_id', 'id'),
+        # revisions are keyed by note id, so SQLite must never hand out a deleted id again
+        {'sqlite_autoincrement': True},
+    )
 
     id = sa.Column(sa.Integer, primary_key=True, index=True)
     title = sa.Column(sa.String, nullable=False, unique=True)
@@ -27,6 +28,3 @@ class Note(Base):
         sa.DateTime,
         server_default=func.now(),
         onupdate=func.now())
-
-
-sa.orm.configure_mappers()
@@ -0,0 +1,35 @@
+import sqlalchemy as sa
+
+from models.notes_model import Note
+
+POSTGRES_SEARCH_DDL = (
+    "ALTER TABLE notes ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS ("
+    "setweight(to_tsvector('english', coalesce(title, '')), 'A') || "
+    "setweight(to_tsvector('english', coalesce(content, '')), 'B')) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_notes_search_vector ON notes USING GIN (search_vector)",
+)
+
+SQLITE_SEARCH_DDL = (
+    "CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5("
+    "title, content, content='notes', content_rowid='id', tokenize='porter unicode61')",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_insert AFTER INSERT ON notes BEGIN "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_delete AFTER DELETE ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); END",
+    "CREATE TRIGGER IF NOT EXISTS notes_fts_update AFTER UPDATE OF title, content ON notes BEGIN "
+    "INSERT INTO notes_fts(notes_fts, rowid, title, content) "
+    "VALUES ('delete', old.id, old.title, old.content); "
+    "INSERT INTO notes_fts(rowid, title, content) VALUES (new.id, new.title, new.content); END",
+)
+
+SQLITE_DROP_SEARCH_DDL = (
+    "DROP TABLE IF EXISTS notes_fts",
+)
+
+for statement in POSTGRES_SEARCH_DDL:
+    sa.event.listen(Note.__table__, "after_create", sa.DDL(statement).execute_if(dialect="postgresql"))
+for statement in SQLITE_SEARCH_DDL:
+    sa.event.listen(Note.__table__, "after_create", sa.DDL(statement).execute_if(dialect="sqlite"))
+for statement in SQLITE_DROP_SEARCH_DDL:
+    sa.event.listen(Note.__table__, "before_drop", sa.DDL(statement).execute_if(dialect="sqlite"))
@@ -0,0 +1,13 @@
+import sqlalchemy as sa
+from sqlalchemy.sql import func
+
+from database import Base
+
+
+class SummaryCacheEntry(Base):
+    __tablename__ = 'summary_cache'
+
+    content_hash = sa.Column(sa.String(64), primary_key=True)
+    summarization = sa.Column(sa.Text, nullable=False)
+    model = sa.Column(sa.String, nullable=False)
+    created_at = sa.Column(sa.DateTime, server_default=func.now())
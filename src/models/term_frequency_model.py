@@ -0,0 +1,17 @@
+import sqlalchemy as sa
+
+from database import Base
+
+
+class UserTerm(Base):
+    __tablename__ = 'user_terms'
+    __table_args__ = (
+        sa.Index('ix_user_terms_user_id_count', 'user_id', 'count'),
+    )
+
+    user_id = sa.Column(
+        sa.Integer,
+        sa.ForeignKey('users.id'),
+        primary_key=True)
+    term = sa.Column(sa.String, primary_key=True)
+    count = sa.Column(sa.Integer, nullable=False, default=0)
@@ -0,0 +1,34 @@
+from fastapi import APIRouter, Depends, status
+
+from database import engine, pool_metrics, replica_router_dependency
+from external_services.openai_scheduler import openai_scheduler
+from external_services.summary_cache import summary_cache
+from utils.authentication_utils import require_admin
+from .analysis import analysis_cache
+
+router = APIRouter(prefix="/api/v1/admin", tags=["admin"], dependencies=[Depends(require_admin)])
+
+
+@router.get("/summarization-cache", status_code=status.HTTP_200_OK)
+async def get_summarization_cache_stats():
+    return summary_cache.stats()
+
+
+@router.get("/database-pool", status_code=status.HTTP_200_OK)
+async def get_database_pool_stats():
+    return pool_metrics.stats(engine)
+
+
+@router.get("/database-replicas", status_code=status.HTTP_200_OK)
+async def get_database_replica_stats(replicas: replica_router_dependency):
+    return replicas.stats()
+
+
+@router.get("/openai-scheduler", status_code=status.HTTP_200_OK)
+async def get_openai_scheduler_stats():
+    return openai_scheduler.stats()
+
+
+@router.get("/analysis-cache", status_code=status.HTTP_200_OK)
+async def get_analysis_cache_stats():
+    return analysis_cache.stats()
@@ -1,22 +1,101 @@
-from fastapi import APIRouter
-from database import db_dependency
-from .auth import user_dependency
+import asyncio
+from typing import Literal
+
+from decouple import config
+from fastapi import APIRouter, HTTPException, Query, Request, Response, status
+from .auth import read_db_dependency, user_dependency
 from sqlalchemy import select
 from models.notes_model import Note
-from utils.analysis_utils import Analysis
-from schemas.note_schema import NoteSchema
+from utils.cache_backends import SharedResultCache, create_cache_backend
+from utils.conditional_utils import check_conditional, make_etag
+from utils.corpus_version_utils import get_corpus_version
+from utils.executor_utils import BoundedExecutor, ExecutorSaturatedError
+from utils.term_frequency_utils import get_most_common_terms
+from utils.text_utils import MOST_COMMON_WORD_AMOUNT
+
+ANALYSIS_CHUNK_SIZE = config('ANALYSIS_CHUNK_SIZE', default=500, cast=int)
+
+analysis_executor = BoundedExecutor(
+    kind=config('ANALYSIS_EXECUTOR', default='process'),
+    max_workers=config('ANALYSIS_EXECUTOR_WORKERS', default=2, cast=int),
+    max_pending=config('ANALYSIS_QUEUE_SIZE', default=8, cast=int),
+    timeout=config('ANALYSIS_TIMEOUT_SECONDS', default=30.0, cast=float),
+)
+
+# memory:// keeps results per worker; sqlite:///path or redis://host:port/db
+# share them between workers.
+analysis_cache = SharedResultCache(
+    create_cache_backend(config('ANALYSIS_CACHE_URL', default='memory://'), prefix='notes-app:'),
+    namespace='analysis',
+    ttl=config('ANALYSIS_CACHE_TTL_SECONDS', default=3600.0, cast=float),
+    lock_ttl=config('ANALYSIS_CACHE_LOCK_SECONDS', default=30.0, cast=float),
+)
 
 router = APIRouter(prefix="/api/v1/analysis", tags=["analysis"])
 
 
 @router.get("/notes")
-async def create_analysis(db: db_dependency, user: user_dependency):
-    current_user_id = int(user.get("id"))
-    all_notes_results = await db.execute(select(Note).where(Note.user_id == current_user_id))
-    notes_results = all_notes_results.scalars().all()
-    result_list = [
-        NoteSchema(title=note.title, content=note.content, priority=note.priority).dict()
-        for note in notes_results
-    ]
-    analysis = Analysis(dataset=result_list)
-    return analysis.to_dict()
+async def create_analysis(
+    db: read_db_dependency,
+    user: user_dependency,
+    request: Request,
+    response: Response,
+    mode: Literal["full", "stream"] = Query("full")
+):
+    current_user_id = user.id
+    # Both modes rank common words from the user_terms store and break ties in
+    # note order, so their payloads are identical and they can share a
+    # validator and a cache entry. The corpus version is bumped by every note
+    # write, so a stale result is never served and a 304 skips the analysis.
+    corpus_version, last_modified = await get_corpus_version(db, current_user_id)
+    check_conditional(request, response, make_etag("analysis", current_user_id, corpus_version), last_modified)
+
+    async def compute():
+        if mode == "stream":
+            return await stream_analysis(db, current_user_id)
+        return await full_analysis(db, current_user_id)
+
+    try:
+        return await analysis_cache.get_or_compute(f"{current_user_id}:{corpus_version}", compute)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Analysis capacity is exhausted, try again later",
+            headers={"Retry-After": "5"})
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Analysis took too long to complete")
+
+
+async def full_analysis(db, user_id: int) -> dict:
+    # pandas and numpy are imported on first use so workers that never serve
+    # analysis do not pay for them at boot.
+    from utils.analysis_utils import build_analysis
+
+    notes_results = await db.execute(
+        select(Note.title, Note.content).where(Note.user_id == user_id).order_by(Note.id))
+    dataset = [{"title": title, "content": content} for title, content in notes_results.all()]
+    common_words = await get_most_common_terms(
+        db, user_id, MOST_COMMON_WORD_AMOUNT)
+    return await analysis_executor.run(build_analysis, dataset, common_words)
+
+
+async def stream_analysis(db, user_id: int) -> dict:
+    from utils.analysis_utils import AnalysisAccumulator, analyse_chunk
+
+    # Terms come from the user_terms store, as in full mode, so chunks skip
+    # collecting them and both modes rank ties the same way.
+    accumulator = AnalysisAccumulator(collect_terms=False)
+    result = await db.stream(
+        select(Note.title, Note.content)
+        .where(Note.user_id == user_id)
+        .order_by(Note.id)
+        .execution_options(yield_per=ANALYSIS_CHUNK_SIZE)
+    )
+    async with analysis_executor.reserve() as reservation:
+        async for rows in result.partitions():
+            partial = await reservation.run(analyse_chunk, [tuple(row) for row in rows], False)
+            accumulator.merge(partial)
+    common_words = await get_most_common_terms(db, user_id, MOST_COMMON_WORD_AMOUNT)
+    return accumulator.to_dict(common_words)
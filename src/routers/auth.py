@@ -3,15 +3,15 @@ from typing import Annotated
 
 from fastapi import APIRouter, status, HTTPException, Depends
 from fastapi.responses import JSONResponse
-from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from database import db_dependency
+from database import (db_dependency, is_unique_violation, replica_router_dependency, session_factory_dependency,
+                      unique_violation_columns)
 from models.user_model import User
 from schemas.user_request_schema import UserRequestSchema, UserResponseSchema, LoginRequestSchema
-from utils.authentication_utils import authenticate_user, create_jwt_token, get_current_user
-
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from utils.authentication_utils import Principal, authenticate_user, create_jwt_token, get_current_user, hash_password
 
 router = APIRouter(prefix="/api/v1/authentication", tags=["auth"])
 
@@ -21,20 +21,28 @@ router = APIRouter(prefix="/api/v1/authentication", tags=["auth"])
              response_model=UserResponseSchema)
 async def registration(db: db_dependency, request: UserRequestSchema):
     user_data = request.model_dump()
-    result = await db.execute(select(User).where(User.email == user_data["email"]))
-    user = result.scalar_one_or_none()
-    if user:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="User with such email already exists")
-    user_data['hashed_password'] = bcrypt_context.encrypt(
-        user_data['password'])
+    user_data['hashed_password'] = await hash_password(user_data['password'])
     user_data.pop('password', None)
-    user_object = User(**user_data)
-    db.add(user_object)
-    await db.commit()
-    await db.refresh(user_object)
-    return user_object
+    try:
+        result = await db.execute(
+            insert(User).values(**user_data)
+            .returning(User.username, User.email, User.created_at, User.updated_at)
+        )
+        user = result.mappings().one()
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        if not is_unique_violation(error):
+            raise
+        columns = unique_violation_columns(error)
+        if "email" in columns:
+            detail = "User with such email already exists"
+        elif "username" in columns:
+            detail = "User with such username already exists"
+        else:
+            detail = "User already exists"
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=detail)
+    return user
 
 
 @router.post("/login", status_code=status.HTTP_200_OK)
@@ -52,4 +60,13 @@ async def login(db: db_dependency, request: LoginRequestSchema):
     return response
 
 
-user_dependency = Annotated[dict, Depends(get_current_user)]
+user_dependency = Annotated[Principal, Depends(get_current_user)]
+
+
+async def get_read_db(
+        user: user_dependency, session_factory: session_factory_dependency, replicas: replica_router_dependency):
+    async with replicas.read_session(session_factory, user.id) as db:
+        yield db
+
+
+read_db_dependency = Annotated[AsyncSession, Depends(get_read_db)]
@@ -0,0 +1,11 @@
+from fastapi import APIRouter, status
+from fastapi.responses import PlainTextResponse
+
+from utils.metrics_utils import registry
+
+router = APIRouter(tags=["metrics"])
+
+
+@router.get("/metrics", status_code=status.HTTP_200_OK, response_class=PlainTextResponse)
+async def get_metrics():
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
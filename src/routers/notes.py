@@ -1,176 +1,437 @@
-from fastapi import APIRouter, status, HTTPException, Path, Query
-from fastapi.responses import JSONResponse
-from sqlalchemy import select
-from sqlalchemy_continuum import version_class
+from typing import Literal
 
-from database import db_dependency
-from external_services.openai_service import make_summarization
+from decouple import config
+from fastapi import APIRouter, status, HTTPException, Path, Query, Request, Response
+from fastapi.responses import JSONResponse, ORJSONResponse, StreamingResponse
+from sqlalchemy import case, delete, insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from database import (db_dependency, is_unique_violation, replica_router_dependency, session_factory_dependency,
+                      unique_violation_columns)
+from external_services.openai_scheduler import openai_scheduler
+from external_services.summarization_queue import summarization_queue
+from external_services.summarization_stream import replay_summarization, stream_note_summarization
+from models.note_revision_model import NoteRevision
 from models.notes_model import Note
-from models.user_model import User
-from schemas.note_schema import NoteSchema, NoteResponseSchema
-from .auth import user_dependency
+from schemas.note_schema import (NoteSchema, NoteResponseSchema, NotePageSchema, NoteRevisionPageSchema,
+                                 NoteRevisionSchema, NoteSearchPageSchema, NoteSearchResultSchema,
+                                 SummarizationBatchSchema)
+from utils.conditional_utils import (check_conditional, has_preconditions, latest_note_version, make_etag,
+                                     note_collection_validators, note_etag, query_fingerprint, with_validators)
+from utils.corpus_version_utils import bump_corpus_version
+from utils.note_import_utils import export_notes, import_notes
+from utils.pagination_utils import decode_cursor, encode_cursor
+from utils.projection_utils import note_columns, resolve_note_fields
+from utils.search_utils import search_notes
+from utils.term_frequency_utils import rebuild_user_terms, update_user_terms
+from utils.versioning_utils import (DELETE, INSERT, UPDATE, diff_contents, rebuild_note_contents,
+                                    record_note_versions)
+from .auth import read_db_dependency, user_dependency
+
+BULK_BATCH_SIZE = config('NOTES_BULK_BATCH_SIZE', default=500, cast=int)
+SCHEDULER_RETRY_AFTER_SECONDS = config('SUMMARIZATION_RETRY_AFTER_SECONDS', default=5, cast=int)
 
 router = APIRouter(prefix="/api/v1/notes", tags=["notes"])
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=NoteSchema)
-async def create_note(db: db_dependency, user: user_dependency, note: NoteSchema):
+async def create_note(db: db_dependency, user: user_dependency, replicas: replica_router_dependency,
+                      note: NoteSchema):
     note_request_dict = note.model_dump()
-    title = note_request_dict["title"]
-    result = await db.execute(select(Note).where(Note.title == title))
-    existed_note = result.scalar_one_or_none()
-    if existed_note:
+    try:
+        result = await db.execute(
+            insert(Note).values(**note_request_dict, user_id=user.id).returning(*Note.__table__.c)
+        )
+        created_note = result.mappings().one()
+        await record_note_versions(db, [created_note], INSERT)
+        await update_user_terms(db, user.id, None, created_note["content"])
+        await bump_corpus_version(db, user.id)
+        await db.commit()
+    except IntegrityError as error:
+        await db.rollback()
+        if "title" in unique_violation_columns(error):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Note already exists")
+        # e.g. history left behind by a deleted note whose id was handed out again
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail="Note already exists")
-    user_result = await db.execute(select(User).where(User.id == int(user.get("id"))))
-    note_owner = user_result.scalar_one_or_none()
-    note_object = Note(**note_request_dict)
-    note_object.user_id = int(user.get('id'))
-    note_object.user = note_owner
-    db.add(note_object)
-    await db.commit()
-    await db.refresh(note_object)
-    return note_object
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Note conflicts with existing data")
+    await replicas.mark_written(user.id)
+    return created_note
 
-@router.get("/", status_code=status.HTTP_200_OK, response_model=list[NoteResponseSchema])
+@router.post("/bulk", status_code=status.HTTP_200_OK)
+async def import_notes_bulk(
+        db: db_dependency, user: user_dependency, replicas: replica_router_dependency, request: Request):
+    try:
+        return await import_notes(db, user.id, request.stream(), batch_size=BULK_BATCH_SIZE)
+    finally:
+        # Batches are committed as they go, so a failed import may still have written.
+        await replicas.mark_written(user.id)
+
+@router.get("/export", status_code=status.HTTP_200_OK)
+async def export_my_notes(user: user_dependency, session_factory: session_factory_dependency):
+    return StreamingResponse(
+        export_notes(session_factory, user.id, chunk_size=BULK_BATCH_SIZE),
+        media_type="application/x-ndjson")
+
+@router.get("/", status_code=status.HTTP_200_OK,
+            response_model=list[NoteResponseSchema] | NotePageSchema)
 async def get_my_notes(
-    db: db_dependency,
+    db: read_db_dependency,
     user: user_dependency,
+    request: Request,
+    response: Response,
     page: int = Query(1, gt=0),
-    per_page: int = Query(10, gt=0)
+    per_page: int = Query(10, gt=0),
+    pagination: Literal["offset", "cursor"] = Query("offset"),
+    cursor: str | None = Query(None),
+    view: Literal["full", "summary"] = Query("full"),
+    fields: str | None = Query(None)
 ):
-    current_user_id = int(user.get("id"))
-    notes_result = await db.execute(
-        select(Note)
-        .where(Note.user_id == current_user_id)
-        .limit(per_page)
-        .offset((page - 1) * per_page)
-    )
-    notes = notes_result.scalars().all()
-    return [
-        NoteResponseSchema(
-            id=note.id,
-            user_email=user.get('sub'),
-            title=note.title,
-            priority=note.priority,
-            content=note.content
-        ) for note in notes
-    ]
+    current_user_id = user.id
+    projection = resolve_note_fields(view, fields)
+    state, last_modified = await note_collection_validators(db, current_user_id)
+    check_conditional(
+        request, response, make_etag("notes", current_user_id, state, query_fingerprint(request)), last_modified)
+    query = select(Note) if projection is None else select(*note_columns(projection))
+    query = query.where(Note.user_id == current_user_id).order_by(Note.id)
+
+    async def fetch(statement):
+        result = await db.execute(statement)
+        return result.scalars().all() if projection is None else result.mappings().all()
+
+    def render(notes):
+        if projection is None:
+            return build_note_responses(notes, user.email)
+        return [dict(note) for note in notes]
+
+    if cursor is None and pagination == "offset":
+        notes = await fetch(query.limit(per_page).offset((page - 1) * per_page))
+        return render(notes) if projection is None else with_validators(ORJSONResponse(render(notes)), response)
+    if cursor is not None:
+        position = decode_cursor(cursor, id=int)
+        query = query.where(Note.id > position["id"])
+    notes = await fetch(query.limit(per_page + 1))
+    next_cursor = None
+    if len(notes) > per_page:
+        notes = notes[:per_page]
+        next_cursor = encode_cursor({"id": notes[-1]["id"] if projection else notes[-1].id})
+    if projection is not None:
+        return with_validators(ORJSONResponse({"items": render(notes), "next_cursor": next_cursor}), response)
+    return NotePageSchema(items=render(notes), next_cursor=next_cursor)
+
+@router.get("/search", status_code=status.HTTP_200_OK, response_model=NoteSearchPageSchema)
+async def search_my_notes(
+    db: db_dependency,
+    user: user_dependency,
+    q: str = Query(..., min_length=1, max_length=200),
+    per_page: int = Query(10, gt=0, le=100),
+    cursor: str | None = Query(None)
+):
+    after_score = after_id = None
+    if cursor is not None:
+        position = decode_cursor(cursor, score=float, id=int)
+        after_score, after_id = position["score"], position["id"]
+    results = await search_notes(db, user.id, q, per_page + 1, after_score, after_id)
+    next_cursor = None
+    if len(results) > per_page:
+        results = results[:per_page]
+        next_cursor = encode_cursor({"score": results[-1].score, "id": results[-1].id})
+    return NoteSearchPageSchema(
+        items=[NoteSearchResultSchema.model_validate(result, from_attributes=True) for result in results],
+        next_cursor=next_cursor)
 
 @router.get("/{note_id}", status_code=status.HTTP_200_OK, response_model=NoteSchema)
 async def get_note(
-    db: db_dependency,
+    db: read_db_dependency,
     user: user_dependency,
+    request: Request,
+    response: Response,
     note_id: int = Path(..., gt=0)
 ):
-    result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == int(user.get("id")))
-    )
-    existed_note = result.scalar_one_or_none()
-    if not existed_note:
+    version = latest_note_version()
+    conditions = (Note.id == note_id, Note.user_id == user.id)
+    if has_preconditions(request):
+        # Revalidation reads two indexed columns; the note itself is only
+        # loaded when the client's copy is stale.
+        validators = (await db.execute(select(Note.updated_at, version).where(*conditions))).one_or_none()
+        if validators is not None:
+            check_conditional(request, response, note_etag(note_id, *validators), validators.updated_at)
+    result = await db.execute(select(Note, version).where(*conditions))
+    row = result.one_or_none()
+    if not row:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note with such id does not exist")
+    existed_note, latest_version = row
+    check_conditional(
+        request, response, note_etag(note_id, existed_note.updated_at, latest_version), existed_note.updated_at)
     return existed_note
 
 @router.put("/{note_id}", status_code=status.HTTP_200_OK, response_model=NoteSchema)
 async def update_note(
     db: db_dependency,
     user: user_dependency,
+    replicas: replica_router_dependency,
     note: NoteSchema,
     note_id: int = Path(..., gt=0)
 ):
     note_request_dict = note.model_dump()
-    result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == int(user.get("id")))
-    )
-    existed_note = result.scalar_one_or_none()
-    if not existed_note:
+    try:
+        result = await db.execute(
+            update(Note)
+            .where(Note.id == note_id, Note.user_id == user.id)
+            .values(
+                **note_request_dict,
+                summarization=case(
+                    (Note.content == note_request_dict["content"], Note.summarization), else_=None))
+            .returning(*Note.__table__.c)
+        )
+    except IntegrityError as error:
+        await db.rollback()
+        if not is_unique_violation(error):
+            raise
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Note already exists")
+    updated_note = result.mappings().one_or_none()
+    if not updated_note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note does not exist")
-    for key, value in note_request_dict.items():
-        setattr(existed_note, key, value)
+    previous_contents = await record_note_versions(db, [updated_note], UPDATE)
+    if note_id in previous_contents:
+        await update_user_terms(db, user.id, previous_contents[note_id], updated_note["content"])
+    else:
+        await rebuild_user_terms(db, user.id)
+    await bump_corpus_version(db, user.id)
     await db.commit()
-    await db.refresh(existed_note)
-    return existed_note
+    await replicas.mark_written(user.id)
+    return updated_note
 
 @router.delete("/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_note(
     db: db_dependency,
     user: user_dependency,
+    replicas: replica_router_dependency,
     note_id: int = Path(..., gt=0)
 ):
     result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == int(user.get("id")))
+        delete(Note)
+        .where(Note.id == note_id, Note.user_id == user.id)
+        .returning(*Note.__table__.c)
     )
-    existed_note = result.scalar_one_or_none()
-    if not existed_note:
+    deleted_note = result.mappings().one_or_none()
+    if not deleted_note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note with such id does not exist")
-    await db.delete(existed_note)
+    await record_note_versions(db, [deleted_note], DELETE)
+    await update_user_terms(db, user.id, deleted_note["content"], None)
+    await bump_corpus_version(db, user.id)
     await db.commit()
+    await replicas.mark_written(user.id)
 
-@router.get("/{note_id}/history", status_code=status.HTTP_200_OK, response_model=list[NoteResponseSchema])
+@router.get("/{note_id}/history", status_code=status.HTTP_200_OK,
+            response_model=list[NoteRevisionSchema] | NoteRevisionPageSchema)
 async def get_note_history(
-    db: db_dependency,
+    db: read_db_dependency,
     user: user_dependency,
     note_id: int = Path(..., gt=0),
     page: int = Query(1, gt=0),
-    per_page: int = Query(10, gt=0)
+    per_page: int = Query(10, gt=0),
+    pagination: Literal["offset", "cursor"] = Query("offset"),
+    cursor: str | None = Query(None)
 ):
-    current_user_id = int(user.get("id"))
-    NoteVersion = version_class(Note)
-    notes_history_result = await db.execute(
-        select(NoteVersion)
-        .where(NoteVersion.id == note_id, NoteVersion.user_id == current_user_id)
-        .limit(per_page)
-        .offset((page - 1) * per_page)
+    current_user_id = user.id
+    query = (
+        select(NoteRevision.version, NoteRevision.title, NoteRevision.priority,
+               NoteRevision.is_snapshot, NoteRevision.payload)
+        .where(NoteRevision.note_id == note_id, NoteRevision.user_id == current_user_id)
+        .order_by(NoteRevision.version)
     )
-    notes_history = notes_history_result.scalars().all()
-    return [
-        NoteResponseSchema(
-            id=note.id,
-            user_email=user.get('sub'),
-            title=note.title,
-            priority=note.priority,
-            content=note.content
-        ) for note in notes_history
-    ]
+    if cursor is None and pagination == "offset":
+        revisions_result = await db.execute(query.limit(per_page).offset((page - 1) * per_page))
+        return await build_revision_responses(db, note_id, revisions_result.all(), user.email)
+    if cursor is not None:
+        position = decode_cursor(cursor, id=int, version=int)
+        if position["id"] != note_id:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Invalid pagination cursor")
+        query = query.where(NoteRevision.version > position["version"])
+    revisions_result = await db.execute(query.limit(per_page + 1))
+    revisions = revisions_result.all()
+    next_cursor = None
+    if len(revisions) > per_page:
+        revisions = revisions[:per_page]
+        next_cursor = encode_cursor({"id": note_id, "version": revisions[-1].version})
+    return NoteRevisionPageSchema(
+        items=await build_revision_responses(db, note_id, revisions, user.email), next_cursor=next_cursor)
+
+@router.get("/{note_id}/history/{version}/diff", status_code=status.HTTP_200_OK)
+async def get_note_version_diff(
+    db: db_dependency,
+    user: user_dependency,
+    note_id: int = Path(..., gt=0),
+    version: int = Path(..., gt=0)
+):
+    revisions_result = await db.execute(
+        select(NoteRevision.version, NoteRevision.title, NoteRevision.priority,
+               NoteRevision.is_snapshot, NoteRevision.payload)
+        .where(NoteRevision.note_id == note_id,
+               NoteRevision.user_id == user.id,
+               NoteRevision.version.in_([version - 1, version]))
+        .order_by(NoteRevision.version)
+    )
+    revisions = {revision.version: revision for revision in revisions_result.all()}
+    if version not in revisions:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note version does not exist")
+    contents = await rebuild_note_contents(db, note_id, list(revisions.values()))
+    current, previous = revisions[version], revisions.get(version - 1)
+    changed_fields = {
+        field: {"from": getattr(previous, field) if previous else None, "to": getattr(current, field)}
+        for field in ("title", "priority")
+        if previous is None or getattr(previous, field) != getattr(current, field)
+    }
+    return {
+        "id": note_id,
+        "version": version,
+        "previous_version": previous.version if previous else None,
+        "changed_fields": changed_fields,
+        "changes": diff_contents(contents.get(version - 1, ""), contents[version]),
+    }
 
-@router.post("/{note_id}/summarization", status_code=status.HTTP_201_CREATED)
+@router.post("/{note_id}/summarization", status_code=status.HTTP_202_ACCEPTED)
 async def summarize_note(
     db: db_dependency,
     user: user_dependency,
+    session_factory: session_factory_dependency,
+    replicas: replica_router_dependency,
     note_id: int = Path(..., gt=0)
 ):
-    current_user_id = int(user.get("id"))
+    current_user_id = user.id
     note_result = await db.execute(
-        select(Note).where(Note.id == note_id, Note.user_id == current_user_id)
+        select(Note.content, Note.summarization, Note.priority)
+        .where(Note.id == note_id, Note.user_id == current_user_id)
     )
-    note = note_result.scalar_one_or_none()
+    note = note_result.one_or_none()
     if not note:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Note with such id does not exist")
-    note_summarization = note.summarization
-    if note_summarization:
+    if note.summarization:
         return JSONResponse(
-            content={"summarization": note_summarization},
+            content={"summarization": note.summarization},
             status_code=status.HTTP_200_OK
         )
-    note_content = note.content
-    summarization = await make_summarization(note_content=note_content)
-    if not summarization:
-        raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail="Failed to generate a summarization for the note."
-        )
-    note.summarization = summarization
-    await db.commit()
-    await db.refresh(note)
+    ensure_scheduler_capacity()
+    job = summarization_queue.submit(
+                note_id, current_user_id, note.content, session_factory, note.priority, replicas)
     return JSONResponse(
-        content={"summarization": note.summarization},
-        status_code=status.HTTP_201_CREATED
+        content=job.to_dict(),
+        status_code=status.HTTP_202_ACCEPTED,
+        headers={"Location": f"{router.prefix}/summarization/jobs/{job.id}"}
+    )
+
+@router.get("/{note_id}/summarization/stream", status_code=status.HTTP_200_OK)
+async def stream_note_summarization_events(
+    db: db_dependency,
+    user: user_dependency,
+    session_factory: session_factory_dependency,
+    replicas: replica_router_dependency,
+    note_id: int = Path(..., gt=0)
+):
+    note_result = await db.execute(
+        select(Note.content, Note.summarization, Note.priority)
+        .where(Note.id == note_id, Note.user_id == user.id)
+    )
+    note = note_result.one_or_none()
+    if not note:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note with such id does not exist")
+    if note.summarization:
+        events = replay_summarization(note.summarization)
+    else:
+        ensure_scheduler_capacity()
+        events = stream_note_summarization(
+            note_id, user.id, note.content, session_factory, note.priority, replicas)
+    return StreamingResponse(
+        events,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@router.post("/summarization/batch", status_code=status.HTTP_202_ACCEPTED)
+async def summarize_notes(
+    db: db_dependency,
+    user: user_dependency,
+    session_factory: session_factory_dependency,
+    replicas: replica_router_dependency,
+    batch: SummarizationBatchSchema
+):
+    current_user_id = user.id
+    notes_result = await db.execute(
+        select(Note.id, Note.content, Note.summarization, Note.priority)
+        .where(Note.id.in_(batch.note_ids), Note.user_id == current_user_id)
     )
+    notes = {note.id: note for note in notes_result.all()}
+    if any(not note.summarization for note in notes.values()):
+        ensure_scheduler_capacity()
+    jobs, summarized, missing = [], [], []
+    for note_id in dict.fromkeys(batch.note_ids):
+        note = notes.get(note_id)
+        if note is None:
+            missing.append(note_id)
+        elif note.summarization:
+            summarized.append({"note_id": note_id, "summarization": note.summarization})
+        else:
+            job = summarization_queue.submit(
+                note_id, current_user_id, note.content, session_factory, note.priority, replicas)
+            jobs.append(job.to_dict())
+    return {"jobs": jobs, "summarized": summarized, "missing": missing}
+
+@router.get("/summarization/jobs/{job_id}", status_code=status.HTTP_200_OK)
+async def get_summarization_job(user: user_dependency, job_id: str):
+    job = summarization_queue.get(job_id, user.id)
+    if not job:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Summarization job with such id does not exist")
+    return job.to_dict()
+
+
+def ensure_scheduler_capacity():
+    if openai_scheduler.is_full():
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Summarization queue is full, try again later",
+            headers={"Retry-After": str(SCHEDULER_RETRY_AFTER_SECONDS)})
+
+
+def build_note_responses(notes, user_email: str) -> list[NoteResponseSchema]:
+    return [
+        NoteResponseSchema(
+            id=note.id,
+            user_email=user_email,
+            title=note.title,
+            priority=note.priority,
+            content=note.content
+        ) for note in notes
+    ]
+
+
+async def build_revision_responses(db, note_id: int, revisions, user_email: str) -> list[NoteRevisionSchema]:
+    contents = await rebuild_note_contents(db, note_id, revisions)
+    return [
+        NoteRevisionSchema(
+            id=note_id,
+            version=revision.version,
+            user_email=user_email,
+            title=revision.title,
+            priority=revision.priority,
+            content=contents[revision.version]
+        ) for revision in revisions
+    ]
@@ -16,3 +16,34 @@ class NoteResponseSchema(BaseModel):
 
     class Config:
         orm_mode = True
+
+
+class NoteRevisionSchema(NoteResponseSchema):
+    version: int = Field(gt=0)
+
+
+class SummarizationBatchSchema(BaseModel):
+    note_ids: list[int] = Field(min_length=1, max_length=100)
+
+
+class NotePageSchema(BaseModel):
+    items: list[NoteResponseSchema]
+    next_cursor: str | None = None
+
+
+class NoteRevisionPageSchema(BaseModel):
+    items: list[NoteRevisionSchema]
+    next_cursor: str | None = None
+
+
+class NoteSearchResultSchema(BaseModel):
+    id: int
+    title: str
+    priority: int
+    snippet: str
+    score: float
+
+
+class NoteSearchPageSchema(BaseModel):
+    items: list[NoteSearchResultSchema]
+    next_cursor: str | None = None
@@ -0,0 +1,155 @@
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import socket
+import sys
+import time
+
+from decouple import config
+
+logger = logging.getLogger("server")
+
+WORKER_RESTART_DELAY = 1.0
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Serve the API from several pre-forked uvicorn workers sharing one socket.")
+    parser.add_argument("--host", default=config('SERVER_HOST', default='0.0.0.0'))
+    parser.add_argument("--port", type=int, default=config('SERVER_PORT', default=8000, cast=int))
+    parser.add_argument("--workers", type=int,
+                        default=config('WEB_CONCURRENCY', default=os.cpu_count() or 1, cast=int))
+    parser.add_argument("--schema", choices=("migrate", "create", "check", "skip"),
+                        default=config('SERVER_SCHEMA_MODE', default='migrate'),
+                        help="schema work done once, under a lock, before workers start")
+    parser.add_argument("--graceful-timeout", type=float,
+                        default=config('SERVER_GRACEFUL_TIMEOUT', default=30.0, cast=float),
+                        help="seconds workers get to finish in-flight requests after SIGTERM")
+    parser.add_argument("--log-level", default=config('SERVER_LOG_LEVEL', default='info'))
+    return parser.parse_args()
+
+
+def bind_socket(host: str, port: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(2048)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(app, sock: socket.socket, args):
+    import uvicorn
+
+    # uvicorn installs its own handlers while serving and re-raises the signal
+    # afterwards; ignoring it then lets the worker exit with status 0.
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    server = uvicorn.Server(uvicorn.Config(
+        app, log_level=args.log_level, timeout_graceful_shutdown=args.graceful_timeout))
+    asyncio.run(server.serve(sockets=[sock]))
+    return 0 if server.started else 1
+
+
+class Arbiter:
+    def __init__(self, app, sock: socket.socket, args):
+        self.app = app
+        self.sock = sock
+        self.args = args
+        self.workers: dict[int, float] = {}
+        self.stopping = False
+
+    def spawn(self):
+        pid = os.fork()
+        if pid == 0:
+            code = 1
+            try:
+                code = run_worker(self.app, self.sock, self.args)
+            except BaseException:
+                logger.exception("Worker %s crashed", os.getpid())
+            finally:
+                os._exit(code)
+        self.workers[pid] = time.monotonic()
+        logger.info("Started worker %s", pid)
+
+    def stop(self, signum, frame):
+        if self.stopping:
+            return
+        self.stopping = True
+        logger.info("Received %s, draining %s worker(s)", signal.Signals(signum).name, len(self.workers))
+        for pid in self.workers:
+            self.signal_worker(pid, signal.SIGTERM)
+
+    @staticmethod
+    def signal_worker(pid: int, signum: int):
+        try:
+            os.kill(pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        for _ in range(self.args.workers):
+            self.spawn()
+        deadline = None
+        while self.workers:
+            if self.stopping and deadline is None:
+                deadline = time.monotonic() + self.args.graceful_timeout + 5.0
+            if deadline is not None and time.monotonic() > deadline:
+                logger.warning("Workers did not drain in time, killing %s", list(self.workers))
+                for pid in self.workers:
+                    self.signal_worker(pid, signal.SIGKILL)
+                deadline = float("inf")
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                break
+            if pid == 0:
+                time.sleep(0.1)
+                continue
+            started = self.workers.pop(pid, None)
+            if started is None:
+                continue
+            code = os.waitstatus_to_exitcode(status)
+            if self.stopping:
+                logger.info("Worker %s exited with %s", pid, code)
+                continue
+            logger.warning("Worker %s exited unexpectedly with %s, restarting", pid, code)
+            if time.monotonic() - started < WORKER_RESTART_DELAY:
+                # Avoid a hot crash loop when a worker cannot start at all.
+                time.sleep(WORKER_RESTART_DELAY)
+            self.spawn()
+        return 0
+
+
+def main():
+    args = parse_args()
+    logging.basicConfig(level=args.log_level.upper(), format="%(asctime)s [%(process)d] %(levelname)s %(message)s")
+    # The arbiter owns schema work; workers only verify the result on startup,
+    # so they never race each other running DDL.
+    os.environ["DATABASE_SCHEMA_MODE"] = "skip" if args.schema == "skip" else "check"
+
+    from commands.migrate import prepare_schema
+    asyncio.run(prepare_schema(mode=args.schema))
+
+    # Preloaded once in the arbiter so forked workers share the imported code.
+    from main import app
+    from database import replica_router
+
+    try:
+        replica_router.check_workers(args.workers)
+    except ValueError as error:
+        logger.error("%s", error)
+        return 1
+
+    sock = bind_socket(args.host, args.port)
+    logger.info("Listening on %s:%s with %s worker(s)", args.host, args.port, args.workers)
+    return Arbiter(app, sock, args).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
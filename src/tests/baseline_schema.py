@@ -0,0 +1,68 @@
+"""Builds a database the way the app did before migrations: `create_all`
+with SQLAlchemy-Continuum versioning notes. Run in its own process, since
+Continuum's mapper hooks are global.
+
+    python -m tests.baseline_schema sqlite:///path/to/baseline.db
+"""
+import sys
+
+import sqlalchemy as sa
+from sqlalchemy.orm import Session, declarative_base, relationship
+from sqlalchemy.sql import func
+from sqlalchemy_continuum import make_versioned
+
+Base = declarative_base()
+make_versioned(user_cls=None)
+
+
+class User(Base):
+    __tablename__ = 'users'
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True)
+    username = sa.Column(sa.String, nullable=False)
+    email = sa.Column(sa.String, nullable=False, unique=True)
+    hashed_password = sa.Column(sa.String, nullable=False)
+    notes = relationship("Note", back_populates="user")
+    created_at = sa.Column(sa.DateTime)
+    updated_at = sa.Column(sa.DateTime)
+
+
+class Note(Base):
+    __versioned__ = {}
+    __tablename__ = 'notes'
+
+    id = sa.Column(sa.Integer, primary_key=True, index=True)
+    title = sa.Column(sa.String, nullable=False, unique=True)
+    content = sa.Column(sa.TEXT, nullable=False)
+    priority = sa.Column(sa.Integer, nullable=False)
+    user_id = sa.Column(sa.Integer, sa.ForeignKey('users.id'), nullable=False)
+    summarization = sa.Column(sa.Text, nullable=True, default=None)
+    user = relationship('User', back_populates="notes")
+    created_at = sa.Column(sa.DateTime, server_default=func.now())
+    updated_at = sa.Column(sa.DateTime, server_default=func.now(), onupdate=func.now())
+
+
+sa.orm.configure_mappers()
+
+
+def build(url: str):
+    engine = sa.create_engine(url)
+    Base.metadata.create_all(engine)
+    with Session(engine) as db:
+        db.add(User(id=1, username="baseline", email="test@gmail.com", hashed_password="hashed"))
+        db.commit()
+        kept = Note(title="Groceries", content="Buy tomatoes.", priority=1, user_id=1)
+        removed = Note(title="Old idea", content="Nothing to keep.", priority=2, user_id=1)
+        db.add_all([kept, removed])
+        db.commit()
+        kept.content = "Buy tomatoes and basil."
+        db.commit()
+        kept.title, kept.priority = "Grocery list", 3
+        db.commit()
+        db.delete(removed)
+        db.commit()
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    build(sys.argv[1])
@@ -0,0 +1,182 @@
+import asyncio
+import json
+import threading
+import time
+from collections import Counter
+
+import pytest
+from sqlalchemy import select
+
+from commands.rebuild_term_frequencies import rebuild_term_frequencies
+from models.notes_model import Note
+from models.term_frequency_model import UserTerm
+from routers.analysis import analysis_cache
+from utils.analysis_utils import Analysis
+from utils.executor_utils import BoundedExecutor, ExecutorSaturatedError
+from utils.text_utils import extract_terms
+from .utils import TestingSession, async_client, clear_notes, count_statements, create_test_db
+
+NOTES = [
+    {"title": "Gardening plans", "content": "Plant tomatoes and basil. Water the tomatoes daily.", "priority": 3},
+    {"title": "Shopping list", "content": "Buy basil, garlic and tomatoes for the sauce.", "priority": 5},
+    {"title": "Reading notes", "content": "The garden chapter covers basil pruning and soil.", "priority": 1},
+]
+
+
+async def stored_terms(user_id):
+    async with TestingSession() as db:
+        result = await db.execute(
+            select(UserTerm.term, UserTerm.count).where(UserTerm.user_id == user_id))
+        return dict(result.all())
+
+
+async def recomputed_terms(user_id):
+    async with TestingSession() as db:
+        result = await db.execute(select(Note.content).where(Note.user_id == user_id))
+        return dict(Counter(term for content in result.scalars() for term in extract_terms(content)))
+
+
+@pytest.mark.asyncio
+async def test_incremental_terms_match_full_recomputation(async_client, clear_notes):
+    for note in NOTES:
+        response = await async_client.post("/api/v1/notes/", json=note)
+        assert response.status_code == 201
+    async with TestingSession() as db:
+        result = await db.execute(select(Note.id).order_by(Note.id))
+        note_ids = result.scalars().all()
+
+    updated = {"title": "Gardening plans", "content": "Plant garlic instead. Garlic needs sun.", "priority": 3}
+    response = await async_client.put(f"/api/v1/notes/{note_ids[0]}", json=updated)
+    assert response.status_code == 200
+    response = await async_client.delete(f"/api/v1/notes/{note_ids[1]}")
+    assert response.status_code == 204
+
+    expected = await recomputed_terms(1)
+    assert await stored_terms(1) == expected
+    assert expected["garlic"] == 2
+
+
+@pytest.mark.asyncio
+async def test_analysis_common_words_read_from_term_store(async_client, clear_notes):
+    for note in NOTES:
+        await async_client.post("/api/v1/notes/", json=note)
+    response = await async_client.get("/api/v1/analysis/notes")
+    assert response.status_code == 200
+    common_words = response.json()["common_words"]
+    assert common_words[0] == ["basil", 3]
+    assert common_words[1] == ["tomatoes", 3]
+
+
+@pytest.mark.asyncio
+async def test_rebuild_term_frequencies(async_client, clear_notes):
+    for note in NOTES:
+        await async_client.post("/api/v1/notes/", json=note)
+    expected = await stored_terms(1)
+    async with TestingSession() as db:
+        await db.execute(UserTerm.__table__.delete())
+        await db.commit()
+
+    await rebuild_term_frequencies(TestingSession, user_ids=[1])
+    assert await stored_terms(1) == expected
+
+
+def test_analysis_counts_words_and_terms_in_one_pass():
+    analysis = Analysis(dataset=NOTES)
+    result = analysis.to_dict()
+    assert result["total_word_count"] == 24
+    assert result["average_word_note_length"] == 8.0
+    assert result["common_words"][:2] == [("basil", 3), ("tomatoes", 3)]
+    assert "the" not in analysis.term_frequencies
+
+
+@pytest.mark.asyncio
+async def test_stream_analysis_matches_full_analysis(async_client, clear_notes, monkeypatch):
+    monkeypatch.setattr("routers.analysis.ANALYSIS_CHUNK_SIZE", 2)
+    for note in NOTES:
+        await async_client.post("/api/v1/notes/", json=note)
+    streamed = await async_client.get("/api/v1/analysis/notes?mode=stream")
+    assert streamed.status_code == 200
+    assert streamed.json() == json.loads(json.dumps(Analysis(dataset=NOTES).to_dict()))
+    await analysis_cache.backend.clear()
+    with count_statements() as statements:
+        full = await async_client.get("/api/v1/analysis/notes")
+    # Ties in the top 3 notes are broken by row order, which both modes fix by id.
+    assert any(statement.startswith("SELECT notes.title, notes.content") and "ORDER BY notes.id" in statement
+               for statement in statements)
+    # basil and tomatoes tie at three and the remaining terms tie at one.
+    assert full.json() == streamed.json()
+    assert full.json()["common_words"][:3] == [["basil", 3], ["tomatoes", 3], ["buy", 1]]
+
+
+async def measure_healthy_latency(async_client, until=None, samples=10):
+    latencies = []
+    while (until is None and len(latencies) < samples) or (until is not None and not until.done()):
+        start = time.perf_counter()
+        response = await async_client.get("/healthy")
+        await asyncio.sleep(0.01)
+        latencies.append(time.perf_counter() - start - 0.01)
+        assert response.status_code == 200
+    return latencies
+
+
+@pytest.mark.asyncio
+async def test_healthy_latency_stays_flat_during_large_analysis(async_client, clear_notes):
+    words = ["alpha", "beta", "gamma", "delta", "epsilon", "the", "and", "zeta"]
+    content = " ".join(words[index % len(words)] for index in range(15000))
+    async with TestingSession() as db:
+        db.add_all([
+            Note(title=f"Large note {index}", content=content, priority=1, user_id=1)
+            for index in range(200)
+        ])
+        await db.commit()
+
+    baseline = await measure_healthy_latency(async_client)
+    analysis_task = asyncio.create_task(async_client.get("/api/v1/analysis/notes"))
+    during = await measure_healthy_latency(async_client, until=analysis_task)
+    response = await analysis_task
+
+    assert response.status_code == 200
+    assert response.json()["total_word_count"] == 200 * 15000
+    assert len(during) > 5
+    assert max(during) < max(baseline) + 0.1
+
+
+@pytest.mark.asyncio
+async def test_analysis_returns_503_when_executor_saturated(async_client, monkeypatch):
+    monkeypatch.setattr("routers.analysis.analysis_executor.max_pending", 0)
+    response = await async_client.get("/api/v1/analysis/notes")
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+
+
+@pytest.mark.asyncio
+async def test_timed_out_job_keeps_its_slot_until_it_finishes():
+    executor = BoundedExecutor(kind="thread", max_workers=1, max_pending=1, timeout=0.05)
+    release = threading.Event()
+    with pytest.raises(asyncio.TimeoutError):
+        await executor.run(release.wait, 5)
+    assert executor.pending == 1
+    with pytest.raises(ExecutorSaturatedError):
+        await executor.run(time.sleep, 0)
+
+    release.set()
+    await asyncio.sleep(0.05)
+    assert executor.pending == 0
+    await executor.run(time.sleep, 0)
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_reservation_admits_once_with_one_deadline():
+    executor = BoundedExecutor(kind="thread", max_workers=2, max_pending=2, timeout=0.2)
+    async with executor.reserve() as reservation:
+        for _ in range(3):
+            await reservation.run(time.sleep, 0.01)
+            assert executor.pending == 1
+        with pytest.raises(asyncio.TimeoutError):
+            # Each chunk fits in the timeout, but together they exceed it.
+            for _ in range(10):
+                await reservation.run(time.sleep, 0.05)
+    await asyncio.sleep(0.1)
+    assert executor.pending == 0
+    executor.shutdown()
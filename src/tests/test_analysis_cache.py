@@ -0,0 +1,275 @@
+import asyncio
+import os
+import time
+
+import pytest
+import pytest_asyncio
+
+from routers import analysis
+from routers.analysis import analysis_cache
+from utils.cache_backends import (MemoryCacheBackend, RedisCacheBackend, SharedResultCache, SQLiteCacheBackend,
+                                  create_cache_backend)
+from .utils import async_client, clear_notes, create_test_db
+
+
+class FakeRedisServer:
+    # Understands the handful of commands RedisCacheBackend sends.
+    def __init__(self):
+        self.data: dict[bytes, tuple[bytes, float | None]] = {}
+        self.commands: list[bytes] = []
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def lookup(self, key: bytes) -> bytes | None:
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    async def handle(self, reader, writer):
+        try:
+            while True:
+                header = await reader.readline()
+                if not header:
+                    break
+                args = []
+                for _ in range(int(header[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2])
+                writer.write(self.execute(args))
+                await writer.drain()
+        finally:
+            writer.close()
+
+    def execute(self, args: list[bytes]) -> bytes:
+        command = args[0].upper()
+        self.commands.append(command)
+        if command in (b"PING", b"AUTH", b"SELECT"):
+            return b"+OK\r\n"
+        if command == b"GET":
+            value = self.lookup(args[1])
+            return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+        if command == b"SET":
+            options = [arg.upper() for arg in args[3:]]
+            if b"NX" in options and self.lookup(args[1]) is not None:
+                return b"$-1\r\n"
+            expires_at = None
+            if b"PX" in options:
+                expires_at = time.monotonic() + int(args[3 + options.index(b"PX") + 1]) / 1000
+            self.data[args[1]] = (args[2], expires_at)
+            return b"+OK\r\n"
+        if command == b"DEL":
+            removed = sum(self.data.pop(key, None) is not None for key in args[1:])
+            return b":%d\r\n" % removed
+        if command == b"EVAL":
+            # Only the compare-and-delete script is ever sent.
+            key, value = args[3], args[4]
+            if self.lookup(key) != value:
+                return b":0\r\n"
+            del self.data[key]
+            return b":1\r\n"
+        if command == b"SCAN":
+            prefix = args[args.index(b"MATCH") + 1].rstrip(b"*")
+            keys = [key for key in self.data if key.startswith(prefix)]
+            return b"*2\r\n$1\r\n0\r\n*%d\r\n" % len(keys) + b"".join(
+                b"$%d\r\n%s\r\n" % (len(key), key) for key in keys)
+        return b"-ERR unknown command\r\n"
+
+
+@pytest_asyncio.fixture
+async def redis_server():
+    server = FakeRedisServer()
+    port = await server.start()
+    server.url = f"redis://127.0.0.1:{port}/0"
+    yield server
+    await server.stop()
+
+
+@pytest_asyncio.fixture(params=["memory", "sqlite", "redis"])
+async def backend(request, tmp_path, redis_server):
+    if request.param == "memory":
+        backend = MemoryCacheBackend()
+    elif request.param == "sqlite":
+        backend = create_cache_backend(f"sqlite:///{tmp_path / 'cache.db'}")
+    else:
+        backend = create_cache_backend(redis_server.url, prefix="test:")
+    yield backend
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_backend_contract(backend):
+    assert await backend.get("missing") is None
+    await backend.set("key", b"value")
+    assert await backend.get("key") == b"value"
+
+    assert await backend.add("key", b"other") is False
+    assert await backend.add("fresh", b"first", ttl=30) is True
+    assert await backend.get("fresh") == b"first"
+
+    await backend.set("short", b"gone", ttl=0.05)
+    await asyncio.sleep(0.1)
+    assert await backend.get("short") is None
+    assert await backend.add("short", b"again", ttl=30) is True
+
+    await backend.delete("key")
+    assert await backend.get("key") is None
+
+    await backend.delete_if("fresh", b"other")
+    assert await backend.get("fresh") == b"first"
+    await backend.delete_if("fresh", b"first")
+    assert await backend.get("fresh") is None
+    await backend.clear()
+    assert await backend.get("fresh") is None
+
+
+@pytest.mark.asyncio
+async def test_redis_backend_uses_prefix(redis_server):
+    backend = RedisCacheBackend.from_url(redis_server.url, prefix="app:")
+    await backend.set("key", b"value")
+    assert set(redis_server.data) == {b"app:key"}
+    await backend.close()
+
+
+@pytest.mark.asyncio
+async def test_concurrent_misses_compute_once():
+    cache = SharedResultCache(MemoryCacheBackend(), namespace="test")
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.05)
+        return {"answer": 42}
+
+    results = await asyncio.gather(*(cache.get_or_compute("key", compute) for _ in range(10)))
+    assert results == [{"answer": 42}] * 10
+    assert calls == 1
+    assert await cache.get_or_compute("key", compute) == {"answer": 42}
+    assert calls == 1
+
+
+@pytest.mark.asyncio
+async def test_workers_sharing_a_file_compute_once(tmp_path):
+    # Two caches with their own connections stand in for two worker processes.
+    path = tmp_path / "shared.db"
+    workers = [SharedResultCache(SQLiteCacheBackend(str(path)), namespace="test", poll_interval=0.01)
+               for _ in range(2)]
+    calls = 0
+
+    async def compute():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.1)
+        return [1, 2, 3]
+
+    results = await asyncio.gather(*(worker.get_or_compute("key", compute) for worker in workers))
+    assert results == [[1, 2, 3], [1, 2, 3]]
+    assert calls == 1
+    assert sum(worker.waits for worker in workers) >= 1
+    for worker in workers:
+        await worker.backend.close()
+
+
+@pytest.mark.asyncio
+async def test_expired_lock_taken_by_another_worker_is_kept(backend):
+    slow = SharedResultCache(backend, namespace="test", lock_ttl=0.05)
+    lock_key = "test:key:lock"
+
+    async def compute():
+        # Our lock expires and another worker takes it meanwhile.
+        await asyncio.sleep(0.1)
+        assert await backend.add(lock_key, b"other worker", ttl=30)
+        return "value"
+
+    assert await slow.get_or_compute("key", compute) == "value"
+    assert await backend.get(lock_key) == b"other worker"
+
+
+def test_sqlite_backend_connects_per_process(tmp_path):
+    path = tmp_path / "cache.db"
+    backend = SQLiteCacheBackend(str(path))
+    assert not path.exists()
+    asyncio.run(backend.set("parent", b"1"))
+    parent_connection = backend._connection
+    pid = os.fork()
+    if pid == 0:
+        code = 1
+        try:
+            asyncio.run(backend.set("child", b"2"))
+            code = 0 if backend._connection is not parent_connection else 2
+        finally:
+            os._exit(code)
+    _, status = os.waitpid(pid, 0)
+    assert os.waitstatus_to_exitcode(status) == 0
+    assert asyncio.run(backend.get("child")) == b"2"
+    assert backend._connection is parent_connection
+    asyncio.run(backend.close())
+
+
+@pytest.mark.asyncio
+async def test_unreachable_backend_falls_back_to_computing(redis_server):
+    url = redis_server.url
+    await redis_server.stop()
+    cache = SharedResultCache(RedisCacheBackend.from_url(url, timeout=0.5), namespace="test")
+
+    async def compute():
+        return "fresh"
+
+    assert await cache.get_or_compute("key", compute) == "fresh"
+    assert cache.errors >= 1
+
+
+@pytest.mark.asyncio
+async def test_analysis_is_cached_per_corpus_version(async_client, clear_notes, monkeypatch):
+    runs = 0
+    run = analysis.analysis_executor.run
+
+    async def counting_run(*args, **kwargs):
+        nonlocal runs
+        runs += 1
+        return await run(*args, **kwargs)
+
+    monkeypatch.setattr(analysis.analysis_executor, "run", counting_run)
+    note = {"title": "Cached analysis", "content": "Counting words in cached analysis.", "priority": 1}
+    assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+
+    first = (await async_client.get("/api/v1/analysis/notes")).json()
+    assert (await async_client.get("/api/v1/analysis/notes")).json() == first
+    assert (await async_client.get("/api/v1/analysis/notes?mode=stream")).json() == first
+    assert runs == 1
+
+    other = {"title": "Second note", "content": "More words for the analysis.", "priority": 2}
+    assert (await async_client.post("/api/v1/notes/", json=other)).status_code == 201
+    assert (await async_client.get("/api/v1/analysis/notes")).json() != first
+    assert runs == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_result_does_not_depend_on_filling_mode(async_client, clear_notes, monkeypatch):
+    monkeypatch.setattr(analysis, "ANALYSIS_CHUNK_SIZE", 1)
+    notes = [
+        {"title": "Garden", "content": "Plant tomatoes and basil near the garden fence.", "priority": 1},
+        {"title": "Kitchen", "content": "Cook tomatoes with basil and buy bread.", "priority": 2},
+        {"title": "Errands", "content": "Buy stamps and post the parcel today.", "priority": 3},
+    ]
+    for note in notes:
+        assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+
+    results = {}
+    for first in ("full", "stream"):
+        await analysis_cache.backend.clear()
+        filled = await async_client.get(f"/api/v1/analysis/notes?mode={first}")
+        other = "stream" if first == "full" else "full"
+        served = await async_client.get(f"/api/v1/analysis/notes?mode={other}")
+        assert served.json() == filled.json()
+        results[first] = filled.json()
+    assert results["full"] == results["stream"]
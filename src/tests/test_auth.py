@@ -1,11 +1,17 @@
+import time
+from datetime import timedelta
+
 import pytest
 from fastapi.exceptions import HTTPException
-from sqlalchemy import select
+from passlib.context import CryptContext
+from sqlalchemy import select, text
 
+from database import unique_violation_columns
 from models.user_model import User
 from routers.auth import authenticate_user
-from utils.authentication_utils import decode_refresh_token
-from .utils import TestingSession, async_client, create_user,create_test_db
+from utils.authentication_utils import (Principal, bcrypt_context, create_jwt_token, decode_refresh_token,
+                                       get_current_user, verified_tokens)
+from .utils import TestingSession, async_client, count_statements, create_user,create_test_db
 
 USER_DATA = {
     "username": "johndoe1234",
@@ -42,6 +48,17 @@ async def test_register_user(create_user, async_client):
     assert created_user is not None
 
 
+@pytest.mark.asyncio
+async def test_register_user_issues_single_statement(create_user, async_client):
+    user_data = USER_DATA | {"email": "single.statement@gmail.com"}
+    with count_statements() as statements:
+        response = await async_client.post('api/v1/authentication/registration', json=user_data)
+    assert response.status_code == 201
+    assert response.json()["email"] == user_data["email"]
+    assert len(statements) == 1
+    assert statements[0].lstrip().upper().startswith("INSERT")
+
+
 @pytest.mark.asyncio
 async def test_authenticate_user_already_registered(create_user, async_client):
     REGISTERED_USER_DATA = {
@@ -54,6 +71,32 @@ async def test_authenticate_user_already_registered(create_user, async_client):
     assert response.json()["detail"] == 'User with such email already exists'
 
 
+@pytest.mark.asyncio
+async def test_registration_names_the_duplicated_field(create_user, async_client):
+    # Usernames are not unique in the schema yet; the message must still name
+    # the right field once a unique index on them exists.
+    async with TestingSession() as db:
+        await db.execute(text("CREATE UNIQUE INDEX ix_users_username_test ON users (username)"))
+        await db.commit()
+    try:
+        response = await async_client.post('/api/v1/authentication/registration', json={
+            "email": "another.address@gmail.com", "password": "Panel@2004", "username": create_user.username})
+    finally:
+        async with TestingSession() as db:
+            await db.execute(text("DROP INDEX ix_users_username_test"))
+            await db.commit()
+    assert response.status_code == 400
+    assert response.json()["detail"] == "User with such username already exists"
+
+
+def test_unique_violation_columns():
+    assert unique_violation_columns(Exception("UNIQUE constraint failed: users.email")) == {"email"}
+    assert unique_violation_columns(Exception(
+        'duplicate key value violates unique constraint "users_username_key"\n'
+        "DETAIL:  Key (username)=(johndoe) already exists.")) == {"username"}
+    assert unique_violation_columns(Exception("something else")) == set()
+
+
 @pytest.mark.asyncio
 async def test_login_user(create_user, async_client):
     await async_client.post('api/v1/authentication/registration', json=USER_DATA)
@@ -66,3 +109,70 @@ async def test_login_user(create_user, async_client):
 
 
 
+
+
+@pytest.mark.asyncio
+async def test_login_rehashes_deprecated_password_hash(create_user):
+    weak_hash = CryptContext(schemes=["bcrypt"], bcrypt__default_rounds=4).hash("Panel@2004")
+    async with TestingSession() as db:
+        user = await db.get(User, create_user.id)
+        user.hashed_password = weak_hash
+        await db.commit()
+
+    async with TestingSession() as db:
+        await authenticate_user(db=db, email=create_user.email, password="Panel@2004")
+
+    async with TestingSession() as db:
+        user = await db.get(User, create_user.id)
+        assert user.hashed_password != weak_hash
+        assert not bcrypt_context.needs_update(user.hashed_password)
+        assert bcrypt_context.verify("Panel@2004", user.hashed_password)
+
+
+@pytest.mark.asyncio
+async def test_login_returns_503_when_hashing_pool_saturated(create_user, async_client, monkeypatch):
+    monkeypatch.setattr("utils.authentication_utils.password_executor.max_pending", 0)
+    login_data = {"email": create_user.email, "password": "Panel@2004"}
+    response = await async_client.post('api/v1/authentication/login', json=login_data)
+    assert response.status_code == 503
+
+
+@pytest.mark.asyncio
+async def test_slow_password_hashing_returns_504(create_user, async_client, monkeypatch):
+    def slow_verify(password, hashed_password):
+        time.sleep(0.2)
+        return True, None
+
+    monkeypatch.setattr("utils.authentication_utils.password_executor.timeout", 0.05)
+    monkeypatch.setattr("utils.authentication_utils.bcrypt_context.verify_and_update", slow_verify)
+    login_data = {"email": create_user.email, "password": "Panel@2004"}
+    response = await async_client.post('api/v1/authentication/login', json=login_data)
+    assert response.status_code == 504
+
+
+def test_verified_tokens_are_cached_until_expiry(create_user, monkeypatch):
+    decoded = []
+
+    def counting_decode(refresh_token):
+        decoded.append(refresh_token)
+        return decode_refresh_token(refresh_token)
+
+    monkeypatch.setattr("utils.authentication_utils.decode_refresh_token", counting_decode)
+    verified_tokens.clear()
+    token = create_jwt_token(create_user, expires_delta=timedelta(minutes=5))
+
+    first = get_current_user(token)
+    second = get_current_user(token)
+
+    assert isinstance(first, Principal)
+    assert first == second
+    assert first.id == create_user.id
+    assert first.email == create_user.email
+    assert len(decoded) == 1
+
+
+def test_expired_token_is_rejected(create_user):
+    token = create_jwt_token(create_user, expires_delta=timedelta(minutes=-5))
+    with pytest.raises(HTTPException) as exc_info:
+        get_current_user(token)
+    assert exc_info.value.status_code == 401
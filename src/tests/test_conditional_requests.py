@@ -0,0 +1,121 @@
+import pytest
+from sqlalchemy import select
+
+from routers import analysis
+from .utils import Note, TestingSession, async_client, clear_notes, count_statements, create_test_db
+
+NOTE = {"title": "Cached note", "content": "Polling clients keep asking for this.", "priority": 5}
+OTHER_NOTE = {"title": "Another note", "content": "Something else entirely.", "priority": 1}
+
+
+async def revalidate(async_client, url: str, etag: str):
+    return await async_client.get(url, headers={"If-None-Match": etag})
+
+
+async def create_note(async_client, note: dict) -> int:
+    assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+    async with TestingSession() as db:
+        return await db.scalar(select(Note.id).where(Note.title == note["title"]))
+
+
+@pytest.mark.asyncio
+async def test_note_list_revalidation(async_client, clear_notes):
+    note_id = await create_note(async_client, NOTE)
+    first = await async_client.get("/api/v1/notes/")
+    etag = first.headers["etag"]
+    assert first.headers["last-modified"]
+
+    not_modified = await revalidate(async_client, "/api/v1/notes/", etag)
+    assert not_modified.status_code == 304
+    assert not_modified.content == b""
+    assert not_modified.headers["etag"] == etag
+
+    other_id = await create_note(async_client, OTHER_NOTE)
+    created = await revalidate(async_client, "/api/v1/notes/", etag)
+    assert created.status_code == 200
+    assert len(created.json()) == 2
+
+    etag = created.headers["etag"]
+    assert (await async_client.put(f"/api/v1/notes/{note_id}", json=NOTE | {"priority": 9})).status_code == 200
+    updated = await revalidate(async_client, "/api/v1/notes/", etag)
+    assert updated.status_code == 200
+
+    etag = updated.headers["etag"]
+    assert (await async_client.delete(f"/api/v1/notes/{other_id}")).status_code == 204
+    deleted = await revalidate(async_client, "/api/v1/notes/", etag)
+    assert deleted.status_code == 200
+    assert len(deleted.json()) == 1
+
+
+@pytest.mark.asyncio
+async def test_note_list_etag_depends_on_query(async_client, clear_notes):
+    await create_note(async_client, NOTE)
+    full = await async_client.get("/api/v1/notes/")
+    summary = await async_client.get("/api/v1/notes/", params={"view": "summary"})
+    assert full.headers["etag"] != summary.headers["etag"]
+    not_modified = await async_client.get(
+        "/api/v1/notes/", params={"view": "summary"}, headers={"If-None-Match": summary.headers["etag"]})
+    assert not_modified.status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_single_note_revalidation_skips_content(async_client, clear_notes):
+    note_id = await create_note(async_client, NOTE)
+    url = f"/api/v1/notes/{note_id}"
+    etag = (await async_client.get(url)).headers["etag"]
+
+    with count_statements() as statements:
+        response = await revalidate(async_client, url, etag)
+    assert response.status_code == 304
+    assert len(statements) == 1
+    assert "content" not in statements[0]
+
+    edit = NOTE | {"content": "Edited content of the cached note."}
+    assert (await async_client.put(url, json=edit)).status_code == 200
+    edited = await revalidate(async_client, url, etag)
+    assert edited.status_code == 200
+    assert edited.json()["content"] == "Edited content of the cached note."
+    assert (await revalidate(async_client, url, edited.headers["etag"])).status_code == 304
+
+
+@pytest.mark.asyncio
+async def test_single_note_if_modified_since(async_client, clear_notes):
+    note_id = await create_note(async_client, NOTE)
+    response = await async_client.get(f"/api/v1/notes/{note_id}")
+    not_modified = await async_client.get(
+        f"/api/v1/notes/{note_id}", headers={"If-Modified-Since": response.headers["last-modified"]})
+    assert not_modified.status_code == 304
+    stale = await async_client.get(
+        f"/api/v1/notes/{note_id}", headers={"If-Modified-Since": "Mon, 01 Jan 2001 00:00:00 GMT"})
+    assert stale.status_code == 200
+
+
+@pytest.mark.asyncio
+async def test_missing_note_is_not_revalidated(async_client, clear_notes):
+    response = await async_client.get("/api/v1/notes/3213214", headers={"If-None-Match": "*"})
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_analysis_revalidation_skips_analysis(async_client, clear_notes, monkeypatch):
+    note_id = await create_note(async_client, NOTE)
+    first = await async_client.get("/api/v1/analysis/notes")
+    etag = first.headers["etag"]
+
+    async def fail(*args, **kwargs):
+        raise AssertionError("analysis must not run for a 304")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(analysis.analysis_executor, "run", fail)
+        assert (await revalidate(async_client, "/api/v1/analysis/notes", etag)).status_code == 304
+        assert (await revalidate(async_client, "/api/v1/analysis/notes?mode=stream", etag)).status_code == 304
+
+    await create_note(async_client, OTHER_NOTE)
+    assert (await revalidate(async_client, "/api/v1/analysis/notes", etag)).status_code == 200
+    etag = (await async_client.get("/api/v1/analysis/notes")).headers["etag"]
+    edit = NOTE | {"content": "Completely new words appear here."}
+    assert (await async_client.put(f"/api/v1/notes/{note_id}", json=edit)).status_code == 200
+    assert (await revalidate(async_client, "/api/v1/analysis/notes", etag)).status_code == 200
+    etag = (await async_client.get("/api/v1/analysis/notes")).headers["etag"]
+    assert (await async_client.delete(f"/api/v1/notes/{note_id}")).status_code == 204
+    assert (await revalidate(async_client, "/api/v1/analysis/notes", etag)).status_code == 200
@@ -0,0 +1,77 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from external_services.openai_service import SUMMARIZATION_MODEL, make_summarization
+from utils.metrics_utils import Histogram, registry
+from .utils import async_client, clear_notes, create_test_db, fake_openai_client
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def sample_value(text: str, prefix: str) -> float:
+    return float(next(line for line in text.splitlines() if line.startswith(prefix)).rsplit(" ", 1)[1])
+
+
+def test_histogram_renders_cumulative_buckets():
+    histogram = Histogram("demo_seconds", "Demo.", ("route",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.5, 5):
+        histogram.observe(("/notes",), value)
+    assert list(histogram.samples()) == [
+        'demo_seconds_bucket{route="/notes",le="0.1"} 1',
+        'demo_seconds_bucket{route="/notes",le="1"} 2',
+        'demo_seconds_bucket{route="/notes",le="+Inf"} 3',
+        'demo_seconds_sum{route="/notes"} 5.55',
+        'demo_seconds_count{route="/notes"} 3',
+    ]
+
+
+@pytest.mark.asyncio
+async def test_metrics_record_route_latency_and_statements(async_client, clear_notes):
+    registry.clear()
+    note = {"title": "Metrics note", "content": "This is a test note content.", "priority": 1}
+    assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+    assert (await async_client.get("/api/v1/notes/123456789")).status_code == 404
+
+    response = await async_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain")
+    text = response.text
+    assert sample_value(
+        text, 'http_request_duration_seconds_count{method="POST",route="/api/v1/notes/",status="201"}') == 1
+    assert sample_value(
+        text, 'http_request_duration_seconds_count{method="GET",route="/api/v1/notes/{note_id}",status="404"}') == 1
+    assert sample_value(text, 'http_request_db_statements_sum{method="POST",route="/api/v1/notes/"}') == 4
+    assert sample_value(text, 'http_request_db_duration_seconds_sum{method="POST",route="/api/v1/notes/"}') > 0
+
+
+@pytest.mark.asyncio
+async def test_metrics_record_openai_calls(fake_openai_client):
+    registry.clear()
+    await make_summarization("three word note")
+
+    async def failing_create(**kwargs):
+        raise TimeoutError("upstream timed out")
+
+    fake_openai_client.chat.completions.create = failing_create
+    with pytest.raises(TimeoutError):
+        await make_summarization("three word note")
+
+    text = registry.render()
+    model = SUMMARIZATION_MODEL
+    assert sample_value(text, f'openai_request_duration_seconds_count{{model="{model}",outcome="success"}}') == 1
+    assert sample_value(text, f'openai_request_duration_seconds_count{{model="{model}",outcome="error"}}') == 1
+    assert sample_value(text, f'openai_tokens_total{{model="{model}",type="prompt"}}') == 3
+    assert sample_value(text, f'openai_tokens_total{{model="{model}",type="completion"}}') == 2
+    assert sample_value(text, f'openai_errors_total{{model="{model}",error="TimeoutError"}}') == 1
+
+
+def test_metrics_can_be_disabled():
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import main; print(any(getattr(route, 'path', None) == '/metrics' for route in main.app.routes), "
+         "len(main.app.user_middleware))"],
+        cwd=SRC_DIR, env=dict(os.environ, METRICS_ENABLED="False"), capture_output=True, text=True, check=True)
+    assert result.stdout.split() == ["False", "0"]
@@ -0,0 +1,98 @@
+import os
+import sqlite3
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from commands.migrate import prepare_schema
+from database import create_database_engine, get_db, get_session_factory, open_session
+from main import app
+from utils.versioning_utils import note_version_cache
+from .utils import async_client
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def baseline_db(tmp_path):
+    # Built in a separate process by the pre-migration models (see tests/baseline_schema.py).
+    path = tmp_path / "baseline.db"
+    subprocess.run([sys.executable, "-m", "tests.baseline_schema", f"sqlite:///{path}"],
+                   cwd=SRC_DIR, check=True)
+    return path
+
+
+@pytest.mark.asyncio
+async def test_baseline_database_is_stamped_and_upgraded(baseline_db):
+    await prepare_schema(f"sqlite+aiosqlite:///{baseline_db}")
+    with sqlite3.connect(baseline_db) as connection:
+        tables = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        assert {"note_revisions", "summary_cache", "user_terms", "user_corpus_versions"} <= tables
+        assert not {"notes_version", "transaction"} & tables
+        assert connection.execute("SELECT version_num FROM alembic_version").fetchall() == [("0007",)]
+        assert connection.execute(
+            "SELECT count FROM user_terms WHERE user_id = 1 AND term = 'basil'").fetchone() == (1,)
+        assert connection.execute(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'basil'").fetchall() == [(1,)]
+        # The deleted note's id keeps its history, so it is not handed out again.
+        cursor = connection.execute(
+            "INSERT INTO notes (title, content, priority, user_id) VALUES ('New', 'text', 1, 1)")
+        assert cursor.lastrowid == 3
+
+
+@pytest.mark.asyncio
+async def test_converted_history_is_served_by_the_history_endpoint(baseline_db, async_client):
+    url = f"sqlite+aiosqlite:///{baseline_db}"
+    await prepare_schema(url)
+    engine = create_database_engine(url, profile="test")
+    session_factory = async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession)
+
+    async def get_migrated_db():
+        async with open_session(session_factory) as db:
+            yield db
+
+    overrides = {get_db: get_migrated_db, get_session_factory: lambda: session_factory}
+    previous = {dependency: app.dependency_overrides[dependency] for dependency in overrides}
+    app.dependency_overrides.update(overrides)
+    note_version_cache.clear()
+    try:
+        history = (await async_client.get("/api/v1/notes/1/history")).json()
+        assert [(revision["version"], revision["title"], revision["content"], revision["priority"])
+                for revision in history] == [
+            (1, "Groceries", "Buy tomatoes.", 1),
+            (2, "Groceries", "Buy tomatoes and basil.", 1),
+            (3, "Grocery list", "Buy tomatoes and basil.", 3),
+        ]
+        diff = (await async_client.get("/api/v1/notes/1/history/3/diff")).json()
+        assert diff["changed_fields"] == {"title": {"from": "Groceries", "to": "Grocery list"},
+                                          "priority": {"from": 1, "to": 3}}
+        # A deleted note's history is converted too, ending with the delete.
+        assert [revision["version"] for revision in
+                (await async_client.get("/api/v1/notes/2/history")).json()] == [1, 2]
+    finally:
+        app.dependency_overrides.update(previous)
+        note_version_cache.clear()
+        await engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_notes_migration_stops_id_reuse(tmp_path):
+    path = tmp_path / "migrated.db"
+    url = f"sqlite+aiosqlite:///{path}"
+    await prepare_schema(url, revision="0005")
+    with sqlite3.connect(path) as connection:
+        connection.execute("INSERT INTO users (id, username, email, hashed_password) VALUES (1, 'u', 'u@gmail.com', 'x')")
+        connection.execute("INSERT INTO notes (id, title, content, priority, user_id) VALUES (1, 'Kept', 'kept', 1, 1)")
+        # Note 2 was deleted, but its history remains.
+        connection.execute("INSERT INTO note_revisions (note_id, version, user_id, operation_type, title, priority, "
+                           "is_latest, is_snapshot, payload) VALUES (2, 1, 1, 0, 'Gone', 1, 1, 1, x'')")
+
+    await prepare_schema(url)
+    with sqlite3.connect(path) as connection:
+        cursor = connection.execute(
+            "INSERT INTO notes (title, content, priority, user_id) VALUES ('New', 'searchable text', 1, 1)")
+        assert cursor.lastrowid == 3
+        assert connection.execute(
+            "SELECT rowid FROM notes_fts WHERE notes_fts MATCH 'searchable'").fetchall() == [(3,)]
@@ -1,6 +1,15 @@
+import json
+
 import pytest
+from sqlalchemy import select
+from sqlalchemy.orm import make_transient
 
-from .utils import async_client, create_random_note, create_test_db, INITIAL_NOTE_DATA
+from models.note_revision_model import NoteRevision
+from models.notes_model import Note
+from utils.note_import_utils import NoteImporter
+from utils.pagination_utils import encode_cursor
+from utils.versioning_utils import note_version_cache
+from .utils import TestingSession, async_client, clear_notes, count_statements, create_random_note, create_test_db, INITIAL_NOTE_DATA
 
 NOTE_DATA = {
     "title": "Unique Test Note",
@@ -109,3 +118,399 @@ async def test_get_note_history(async_client, create_random_note):
     assert "title" in first_history
     assert "content" in first_history
     assert "priority" in first_history
+
+
+@pytest.mark.asyncio
+async def test_create_note_does_not_load_owner(async_client, clear_notes):
+    with count_statements() as statements:
+        response = await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    assert response.status_code == 201
+    assert not any("FROM users" in statement for statement in statements)
+    assert not any(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert len(statements) == 4
+
+
+@pytest.mark.asyncio
+async def test_create_note_conflict_issues_single_statement(async_client, create_random_note):
+    with count_statements() as statements:
+        response = await async_client.post("/api/v1/notes/", json=NOTE_DATA | {"title": INITIAL_NOTE_DATA["title"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Note already exists"
+    assert len(statements) == 1
+
+
+@pytest.mark.asyncio
+async def test_update_note_issues_no_select(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    note_id = await note_id_by_title(NEW_NOTE["title"])
+    with count_statements() as statements:
+        response = await async_client.put(f"/api/v1/notes/{note_id}", json=UPDATED_NOTE_DATA)
+    assert response.status_code == 200
+    assert response.json()["content"] == UPDATED_NOTE_DATA["content"]
+    assert not any(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert len(statements) == 6
+
+    common_words = (await async_client.get("/api/v1/analysis/notes")).json()["common_words"]
+    assert dict(common_words) == {"content": 1, "note": 1, "test": 1, "updated": 1}
+
+
+@pytest.mark.asyncio
+async def test_update_note_to_existing_title(async_client, create_random_note):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    note_id = await note_id_by_title(NEW_NOTE["title"])
+    response = await async_client.put(
+        f"/api/v1/notes/{note_id}", json=UPDATED_NOTE_DATA | {"title": INITIAL_NOTE_DATA["title"]})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Note already exists"
+
+
+@pytest.mark.asyncio
+async def test_delete_note_issues_no_select(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    note_id = await note_id_by_title(NEW_NOTE["title"])
+    with count_statements() as statements:
+        response = await async_client.delete(f"/api/v1/notes/{note_id}")
+    assert response.status_code == 204
+    assert not any(statement.lstrip().upper().startswith("SELECT") for statement in statements)
+    assert len(statements) == 7
+
+
+@pytest.mark.asyncio
+async def test_get_my_notes_cursor_pagination(async_client, clear_notes):
+    for index in range(5):
+        note = {"title": f"Cursor note {index}", "content": "This is a test note content.", "priority": 1}
+        assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+
+    titles, cursor = [], None
+    for _ in range(3):
+        params = {"per_page": 2, "pagination": "cursor"}
+        if cursor:
+            params["cursor"] = cursor
+        response = await async_client.get("/api/v1/notes/", params=params)
+        assert response.status_code == 200
+        page = response.json()
+        titles.extend(note["title"] for note in page["items"])
+        cursor = page["next_cursor"]
+    assert titles == [f"Cursor note {index}" for index in range(5)]
+    assert cursor is None
+
+
+@pytest.mark.asyncio
+async def test_get_note_history_cursor_pagination(async_client, create_random_note):
+    note_id = create_random_note.id
+    for index in range(3):
+        update_request = {"title": f"History title {index}", "content": "More content", "priority": index}
+        assert (await async_client.put(f"/api/v1/notes/{note_id}", json=update_request)).status_code == 200
+
+    first = (await async_client.get(f"/api/v1/notes/{note_id}/history?pagination=cursor&per_page=3")).json()
+    assert [version["title"] for version in first["items"]] == [
+        "Test Note", "History title 0", "History title 1"]
+    second = (await async_client.get(
+        f"/api/v1/notes/{note_id}/history", params={"cursor": first["next_cursor"], "per_page": 3})).json()
+    assert [version["title"] for version in second["items"]] == ["History title 2"]
+    assert second["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_invalid_cursor_is_rejected(async_client):
+    response = await async_client.get("/api/v1/notes/?cursor=not-a-cursor")
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("url, position", [
+    ("/api/v1/notes/", {"id": "1"}),
+    ("/api/v1/notes/", {"id": [1]}),
+    ("/api/v1/notes/", {"id": True}),
+    ("/api/v1/notes/1/history", {"id": 1, "version": "2"}),
+    ("/api/v1/notes/1/history", {"id": {"a": 1}, "version": 2}),
+])
+async def test_cursor_values_must_have_the_right_type(async_client, url, position):
+    response = await async_client.get(url, params={"cursor": encode_cursor(position)})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+SEARCH_NOTES = [
+    {"title": "Kubernetes upgrade plan", "content": "Drain every node before upgrading the cluster.", "priority": 5},
+    {"title": "Grocery list", "content": "Apples, bread and cluster tomatoes for the weekend.", "priority": 1},
+    {"title": "Cluster capacity", "content": "The cluster needs two more nodes; cluster load is high.", "priority": 3},
+]
+
+
+@pytest.mark.asyncio
+async def test_search_notes_ranks_and_snippets(async_client, clear_notes):
+    for note in SEARCH_NOTES:
+        assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+
+    response = await async_client.get("/api/v1/notes/search", params={"q": "cluster"})
+    assert response.status_code == 200
+    results = response.json()["items"]
+    assert [result["title"] for result in results][0] == "Cluster capacity"
+    assert len(results) == 3
+    assert all("<b>" in result["snippet"] for result in results)
+    assert results[0]["score"] >= results[1]["score"] >= results[2]["score"]
+
+
+@pytest.mark.asyncio
+async def test_search_index_follows_updates_and_deletes(async_client, clear_notes):
+    for note in SEARCH_NOTES:
+        await async_client.post("/api/v1/notes/", json=note)
+    first = (await async_client.get("/api/v1/notes/search", params={"q": "tomatoes"})).json()["items"][0]
+    updated = {"title": "Grocery list", "content": "Pears and cheese only.", "priority": 1}
+    await async_client.put(f"/api/v1/notes/{first['id']}", json=updated)
+
+    assert (await async_client.get("/api/v1/notes/search", params={"q": "tomatoes"})).json()["items"] == []
+    assert len((await async_client.get("/api/v1/notes/search", params={"q": "pears"})).json()["items"]) == 1
+
+    await async_client.delete(f"/api/v1/notes/{first['id']}")
+    assert (await async_client.get("/api/v1/notes/search", params={"q": "pears"})).json()["items"] == []
+
+
+@pytest.mark.asyncio
+async def test_deleted_note_id_is_not_reused(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    first_id = await latest_note_id()
+    assert (await async_client.delete(f"/api/v1/notes/{first_id}")).status_code == 204
+    assert (await async_client.post("/api/v1/notes/", json=NEW_NOTE)).status_code == 201
+    assert await latest_note_id() > first_id
+
+
+@pytest.mark.asyncio
+async def test_create_note_reports_revision_conflict(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    # History of a note whose id is about to be handed out again.
+    async with TestingSession() as db:
+        revision = (await db.execute(
+            select(NoteRevision).where(NoteRevision.note_id == await latest_note_id()))).scalar_one()
+        make_transient(revision)
+        revision.note_id += 1
+        db.add(revision)
+        await db.commit()
+
+    response = await async_client.post("/api/v1/notes/", json=NEW_NOTE | {"title": "Second note"})
+    assert response.status_code == 409
+    assert len((await async_client.get("/api/v1/notes/")).json()) == 1
+
+
+async def latest_note_id() -> int:
+    async with TestingSession() as db:
+        return (await db.execute(select(Note.id).order_by(Note.id.desc()).limit(1))).scalar_one()
+
+
+@pytest.mark.asyncio
+async def test_search_notes_cursor_pagination(async_client, clear_notes):
+    for note in SEARCH_NOTES:
+        await async_client.post("/api/v1/notes/", json=note)
+    seen, cursor = [], None
+    while True:
+        params = {"q": "cluster", "per_page": 1}
+        if cursor:
+            params["cursor"] = cursor
+        page = (await async_client.get("/api/v1/notes/search", params=params)).json()
+        seen.extend(result["id"] for result in page["items"])
+        cursor = page["next_cursor"]
+        if not cursor:
+            break
+    assert len(seen) == len(set(seen)) == 3
+
+
+@pytest.mark.asyncio
+@pytest.mark.parametrize("position", [
+    {"score": [1], "id": 1}, {"score": 1.5, "id": "7"}, {"score": "NaN", "id": 1}, {"score": 1.5}])
+async def test_search_rejects_malformed_cursor(async_client, position):
+    response = await async_client.get(
+        "/api/v1/notes/search", params={"q": "cluster", "cursor": encode_cursor(position)})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Invalid pagination cursor"
+
+
+@pytest.mark.asyncio
+async def test_search_ignores_query_syntax(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=SEARCH_NOTES[0])
+    response = await async_client.get("/api/v1/notes/search", params={"q": 'drain" (node*'})
+    assert response.status_code == 200
+    assert len(response.json()["items"]) == 1
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_reports_errors_per_line(async_client, create_random_note, monkeypatch):
+    monkeypatch.setattr("routers.notes.BULK_BATCH_SIZE", 2)
+    lines = [
+        json.dumps({"title": "Imported note 1", "content": "Imported content number one.", "priority": 1}),
+        "",
+        json.dumps({"title": "Bad", "content": "short"}),
+        "{not json",
+        json.dumps({"title": INITIAL_NOTE_DATA["title"], "content": "Duplicates an existing title."}),
+        json.dumps({"title": "Imported note 1", "content": "Duplicates a title in this file."}),
+        json.dumps({"title": "Imported note 2", "content": "Imported content number two.", "priority": 2}),
+        json.dumps({"title": "Imported note 3", "content": "Imported content number three."}),
+    ]
+
+    async def body():
+        payload = ("\n".join(lines)).encode()
+        for start in range(0, len(payload), 7):
+            yield payload[start:start + 7]
+
+    response = await async_client.post("/api/v1/notes/bulk", content=body())
+    assert response.status_code == 200
+    report = response.json()
+    assert report["inserted"] == 3
+    assert [error["line"] for error in report["errors"]] == [3, 4, 5, 6]
+    assert report["failed"] == 4
+
+    listed = (await async_client.get("/api/v1/notes/?per_page=10")).json()
+    assert {note["title"] for note in listed} == {
+        "Test Note", "Imported note 1", "Imported note 2", "Imported note 3"}
+    imported_id = next(note["id"] for note in listed if note["title"] == "Imported note 2")
+    history = (await async_client.get(f"/api/v1/notes/{imported_id}/history")).json()
+    assert [version["title"] for version in history] == ["Imported note 2"]
+
+
+@pytest.mark.asyncio
+async def test_bulk_import_retries_failed_batch_row_by_row(create_random_note):
+    # The pre-insert title check can miss a title another request inserts
+    # meanwhile; only that line may fail, not the whole batch.
+    rows = [
+        (1, {"title": "Raced note 1", "content": "First valid raced note.", "priority": 1, "user_id": 1}),
+        (2, {"title": INITIAL_NOTE_DATA["title"], "content": "Inserted by someone else.", "priority": 1,
+             "user_id": 1}),
+        (3, {"title": "Raced note 3", "content": "Third valid raced note.", "priority": 1, "user_id": 1}),
+        (4, {"title": "Raced note 4", "content": None, "priority": 1, "user_id": 1}),
+    ]
+    async with TestingSession() as db:
+        importer = NoteImporter(db, user_id=1)
+        await importer.insert_rows(rows)
+    assert importer.inserted == 2
+    assert importer.to_dict()["errors"] == [
+        {"line": 2, "detail": "Note already exists"},
+        {"line": 4, "detail": "Note violates a database constraint"},
+    ]
+    async with TestingSession() as db:
+        titles = set((await db.execute(select(Note.title))).scalars())
+    assert {"Raced note 1", "Raced note 3"} <= titles
+
+
+@pytest.mark.asyncio
+async def test_export_streams_ndjson(async_client, create_random_note):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    response = await async_client.get("/api/v1/notes/export")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    exported = [json.loads(line) for line in response.text.splitlines()]
+    assert [note["title"] for note in exported] == [INITIAL_NOTE_DATA["title"], NEW_NOTE["title"]]
+    assert exported[1]["content"] == NEW_NOTE["content"]
+
+
+@pytest.mark.asyncio
+async def test_export_then_import_round_trip(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    exported = (await async_client.get("/api/v1/notes/export")).text
+    await async_client.delete(f"/api/v1/notes/{json.loads(exported)['id']}")
+
+    report = (await async_client.post("/api/v1/notes/bulk", content=exported.encode())).json()
+    assert report == {"inserted": 1, "failed": 0, "errors": []}
+
+
+
+@pytest.mark.asyncio
+async def test_get_my_notes_summary_view(async_client, clear_notes):
+    long_note = {"title": "Long summary note", "content": "word " * 1000, "priority": 2}
+    assert (await async_client.post("/api/v1/notes/", json=long_note)).status_code == 201
+    with count_statements() as statements:
+        response = await async_client.get("/api/v1/notes/", params={"view": "summary"})
+    assert response.status_code == 200
+    [note] = response.json()
+    assert set(note) == {"id", "title", "priority", "content_length", "preview"}
+    assert note["content_length"] == len(long_note["content"])
+    assert long_note["content"].startswith(note["preview"])
+    assert len(note["preview"]) < note["content_length"]
+    assert "notes.summarization" not in statements[-1]
+
+
+@pytest.mark.asyncio
+async def test_get_my_notes_fields_with_cursor(async_client, clear_notes):
+    for index in range(3):
+        note = {"title": f"Fields note {index}", "content": "This is a test note content.", "priority": index}
+        assert (await async_client.post("/api/v1/notes/", json=note)).status_code == 201
+
+    params = {"fields": "title,priority", "pagination": "cursor", "per_page": 2}
+    first_page = (await async_client.get("/api/v1/notes/", params=params)).json()
+    assert [set(note) for note in first_page["items"]] == [{"id", "title", "priority"}] * 2
+    second_page = (await async_client.get(
+        "/api/v1/notes/", params=params | {"cursor": first_page["next_cursor"]})).json()
+    assert [note["title"] for note in second_page["items"]] == ["Fields note 2"]
+    assert second_page["next_cursor"] is None
+
+
+@pytest.mark.asyncio
+async def test_get_my_notes_unknown_field(async_client):
+    response = await async_client.get("/api/v1/notes/", params={"fields": "title,password"})
+    assert response.status_code == 400
+    assert response.json()["detail"] == "Unknown note fields: password"
+
+
+
+@pytest.mark.asyncio
+async def test_note_history_reconstructs_deltas(async_client, clear_notes, monkeypatch):
+    monkeypatch.setattr("utils.versioning_utils.SNAPSHOT_INTERVAL", 3)
+    sentences = [f"Sentence number {index} of the long note." for index in range(300)]
+    contents = []
+    await async_client.post("/api/v1/notes/", json={"title": "Versioned note", "content": " ".join(sentences),
+                                                    "priority": 1})
+    contents.append(" ".join(sentences))
+    note_id = await note_id_by_title("Versioned note")
+    for edit in range(7):
+        sentences[edit * 40] = f"Edited sentence {edit}."
+        contents.append(" ".join(sentences))
+        response = await async_client.put(f"/api/v1/notes/{note_id}", json={
+            "title": "Versioned note", "content": contents[-1], "priority": edit})
+        assert response.status_code == 200
+
+    async with TestingSession() as db:
+        revisions = (await db.execute(
+            select(NoteRevision.version, NoteRevision.is_snapshot, NoteRevision.is_latest, NoteRevision.payload)
+            .where(NoteRevision.note_id == note_id).order_by(NoteRevision.version))).all()
+    assert [revision.is_snapshot for revision in revisions] == [
+        False, False, True, False, False, True, False, True]
+    assert [revision.is_latest for revision in revisions] == [False] * 7 + [True]
+    assert max(len(revision.payload) for revision in revisions if not revision.is_snapshot) < len(
+        revisions[-1].payload) / 4
+
+    note_version_cache.clear()
+    history = (await async_client.get(f"/api/v1/notes/{note_id}/history", params={"per_page": 20})).json()
+    assert [version["version"] for version in history] == list(range(1, 9))
+    assert [version["content"] for version in history] == contents
+    page = (await async_client.get(f"/api/v1/notes/{note_id}/history",
+                                   params={"pagination": "cursor", "per_page": 2})).json()
+    assert [version["content"] for version in page["items"]] == contents[:2]
+
+
+@pytest.mark.asyncio
+async def test_note_version_diff(async_client, clear_notes):
+    await async_client.post("/api/v1/notes/", json=NEW_NOTE)
+    note_id = await note_id_by_title(NEW_NOTE["title"])
+    await async_client.put(f"/api/v1/notes/{note_id}", json=NEW_NOTE | {
+        "content": "This is a test note content. Second line added.", "priority": 9})
+
+    response = await async_client.get(f"/api/v1/notes/{note_id}/history/2/diff")
+    assert response.status_code == 200
+    diff = response.json()
+    assert diff["previous_version"] == 1
+    assert diff["changed_fields"] == {"priority": {"from": 5, "to": 9}}
+    assert diff["changes"] == [{"operation": "insert", "position": len(NEW_NOTE["content"]),
+                                "removed": "", "added": " Second line added."}]
+
+    first = (await async_client.get(f"/api/v1/notes/{note_id}/history/1/diff")).json()
+    assert first["previous_version"] is None
+    assert first["changes"][0]["added"] == NEW_NOTE["content"]
+
+    missing = await async_client.get(f"/api/v1/notes/{note_id}/history/3/diff")
+    assert missing.status_code == 404
+    assert missing.json()["detail"] == "Note version does not exist"
+
+
+async def note_id_by_title(title):
+    async with TestingSession() as db:
+        return (await db.execute(select(Note.id).where(Note.title == title))).scalar_one()
@@ -0,0 +1,124 @@
+import asyncio
+
+import pytest
+
+from external_services import openai_service
+from external_services.openai_scheduler import (OpenAIScheduler, RequestContext, SchedulerQueueFullError,
+                                                TokenBucket, current_request_context)
+from .utils import async_client, create_random_note, create_test_db, fake_openai_client
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def run_requests(requests: list[tuple[int, int, str]]):
+    # The first request takes the only slot; the rest queue up behind it and
+    # are dispatched in scheduler order once it finishes.
+    async def run(user_id, priority, content):
+        current_request_context.set(RequestContext(user_id=user_id, priority=priority))
+        await openai_service.request_completion("prompt", content)
+
+    tasks = []
+    for request in requests:
+        tasks.append(asyncio.create_task(run(*request)))
+        await asyncio.sleep(0)
+    await asyncio.gather(*tasks)
+
+
+def call_order(client) -> list[str]:
+    return [call["messages"][1]["content"] for call in client.calls]
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    scheduler = OpenAIScheduler(max_in_flight=1)
+    monkeypatch.setattr(openai_service, "openai_scheduler", scheduler)
+    return scheduler
+
+
+@pytest.mark.asyncio
+async def test_requests_run_in_priority_order(scheduler, fake_openai_client):
+    fake_openai_client.delay = 0.01
+    await run_requests([(1, 50, "first"), (1, 10, "low"), (1, 90, "high"), (1, 50, "medium")])
+    assert call_order(fake_openai_client) == ["first", "high", "medium", "low"]
+
+
+@pytest.mark.asyncio
+async def test_users_share_slots_fairly(scheduler, fake_openai_client):
+    fake_openai_client.delay = 0.01
+    bulk = [(1, 90, f"a{index}") for index in range(5)]
+    await run_requests(bulk + [(2, 10, "b0"), (2, 10, "b1")])
+    assert call_order(fake_openai_client) == ["a0", "b0", "a1", "b1", "a2", "a3", "a4"]
+
+
+@pytest.mark.asyncio
+async def test_user_weights_scale_share(scheduler, fake_openai_client):
+    scheduler.user_weights = {1: 2.0}
+    fake_openai_client.delay = 0.01
+    bulk = [(1, 50, f"a{index}") for index in range(5)]
+    await run_requests(bulk + [(2, 50, f"b{index}") for index in range(3)])
+    assert call_order(fake_openai_client)[:6] == ["a0", "b0", "a1", "a2", "b1", "a3"]
+
+
+@pytest.mark.asyncio
+async def test_in_flight_cap(scheduler, fake_openai_client):
+    scheduler.max_in_flight = 3
+    fake_openai_client.delay = 0.01
+    await run_requests([(user_id, 50, f"note {user_id}") for user_id in range(10)])
+    assert fake_openai_client.max_active == 3
+    assert scheduler.stats()["dispatched"] == 10
+
+
+@pytest.mark.asyncio
+async def test_queue_full_is_rejected(scheduler, fake_openai_client):
+    scheduler.max_queue_size = 1
+    fake_openai_client.delay = 0.05
+    running = asyncio.create_task(openai_service.request_completion("prompt", "running"))
+    await asyncio.sleep(0)
+    queued = asyncio.create_task(openai_service.request_completion("prompt", "queued"))
+    await asyncio.sleep(0)
+    with pytest.raises(SchedulerQueueFullError):
+        await openai_service.request_completion("prompt", "rejected")
+    await asyncio.gather(running, queued)
+    assert scheduler.stats()["rejected"] == 1
+
+
+@pytest.mark.asyncio
+async def test_token_budget_delays_dispatch():
+    clock = FakeClock()
+    scheduler = OpenAIScheduler(max_in_flight=10, tokens_per_minute=600, clock=clock)
+    async with scheduler.slot(500):
+        pass
+    waiting = asyncio.create_task(scheduler.acquire(1, 50, 400))
+    await asyncio.sleep(0)
+    assert scheduler.stats()["queued"] == 1
+
+    clock.now += 30
+    scheduler._dispatch()
+    await asyncio.wait_for(waiting, timeout=1)
+    assert scheduler.stats()["in_flight"] == 1
+
+
+def test_token_bucket_refills_and_refunds():
+    clock = FakeClock()
+    bucket = TokenBucket(60, clock)
+    bucket.consume(60)
+    assert bucket.wait_time(30) == pytest.approx(30)
+    clock.now += 10
+    assert bucket.wait_time(30) == pytest.approx(20)
+    bucket.refund(20)
+    assert bucket.wait_time(30) == 0
+    assert TokenBucket(0, clock).wait_time(10 ** 6) == 0
+
+
+@pytest.mark.asyncio
+async def test_summarization_rejected_when_queue_full(async_client, create_random_note, monkeypatch):
+    monkeypatch.setattr("routers.notes.openai_scheduler", OpenAIScheduler(max_queue_size=0))
+    response = await async_client.post(f"/api/v1/notes/{create_random_note.id}/summarization")
+    assert response.status_code == 429
+    assert response.headers["retry-after"]
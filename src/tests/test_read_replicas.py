@@ -0,0 +1,121 @@
+import asyncio
+
+import pytest
+import pytest_asyncio
+from sqlalchemy import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from database import Base, Replica, ReplicaRouter, create_database_engine, get_replica_router
+from external_services.summarization_queue import summarization_queue
+from main import app
+from utils.cache_backends import MemoryCacheBackend, SQLiteCacheBackend
+from .utils import Note, async_client, clear_notes, create_random_note, create_test_db, fake_openai_client
+
+PRIMARY_NOTE = {"title": "Primary note", "content": "Written to the primary database.", "priority": 1}
+REPLICA_NOTE = {"title": "Replica note", "content": "Only present on the replica.", "priority": 2, "user_id": 1}
+
+
+@pytest_asyncio.fixture
+async def replica(tmp_path):
+    # A second SQLite file stands in for a replica that has not caught up.
+    engine = create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'replica.db'}", profile="test")
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+        await conn.execute(insert(Note).values(**REPLICA_NOTE))
+    yield Replica("replica", async_sessionmaker(engine, expire_on_commit=False, class_=AsyncSession))
+    await engine.dispose()
+
+
+@pytest.fixture
+def route_reads():
+    def install(replicas: list[Replica], **options) -> ReplicaRouter:
+        router = ReplicaRouter(replicas, MemoryCacheBackend(), **options)
+        app.dependency_overrides[get_replica_router] = lambda: router
+        return router
+
+    yield install
+    app.dependency_overrides.pop(get_replica_router, None)
+
+
+async def note_titles(async_client) -> list[str]:
+    response = await async_client.get("/api/v1/notes/")
+    assert response.status_code == 200
+    return [note["title"] for note in response.json()]
+
+
+@pytest.mark.asyncio
+async def test_reads_use_replica_until_the_user_writes(async_client, clear_notes, replica, route_reads):
+    router = route_reads([replica], sticky_seconds=0.2)
+    assert await note_titles(async_client) == ["Replica note"]
+    assert (await async_client.get("/api/v1/analysis/notes")).status_code == 200
+    assert replica.reads == 2
+
+    assert (await async_client.post("/api/v1/notes/", json=PRIMARY_NOTE)).status_code == 201
+    assert await note_titles(async_client) == ["Primary note"]
+    assert router.sticky_reads == 1
+
+    await asyncio.sleep(0.3)
+    assert await note_titles(async_client) == ["Replica note"]
+    assert replica.reads == 3
+
+
+@pytest.mark.asyncio
+async def test_unreachable_replica_falls_back_to_primary(async_client, clear_notes, replica, tmp_path, route_reads):
+    broken_engine = create_database_engine(
+        f"sqlite+aiosqlite:///{tmp_path / 'missing' / 'replica.db'}", profile="test")
+    broken = Replica("broken", async_sessionmaker(broken_engine, expire_on_commit=False, class_=AsyncSession))
+    router = route_reads([broken], retry_seconds=60)
+    assert (await async_client.post("/api/v1/notes/", json=PRIMARY_NOTE)).status_code == 201
+    router.sticky_seconds = 0
+
+    assert await note_titles(async_client) == ["Primary note"]
+    assert await note_titles(async_client) == ["Primary note"]
+    assert broken.failures == 1
+    assert router.fallback_reads == 2
+    assert router.stats()["replicas"][0]["healthy"] is False
+
+    # A healthy replica next to the broken one keeps serving reads.
+    router.replicas.append(replica)
+    assert await note_titles(async_client) == ["Replica note"]
+    await broken_engine.dispose()
+
+
+@pytest.mark.asyncio
+async def test_replicas_take_turns(replica):
+    other = Replica("other", replica.session_factory)
+    router = ReplicaRouter([replica, other], MemoryCacheBackend())
+
+    async def read():
+        async with router.read_session(None, user_id=1) as db:
+            return db
+
+    await asyncio.gather(*(read() for _ in range(4)))
+    assert (replica.reads, other.reads) == (2, 2)
+    assert router.primary_reads == 0
+
+
+@pytest.mark.asyncio
+async def test_background_summary_marks_the_user_as_written(
+        async_client, create_random_note, fake_openai_client, replica, route_reads):
+    router = route_reads([replica])
+    note_id = create_random_note.id
+    assert (await async_client.post(f"/api/v1/notes/{note_id}/summarization")).status_code == 202
+    await summarization_queue.join()
+    assert await router.recently_wrote(create_random_note.user_id)
+
+
+@pytest.mark.asyncio
+async def test_streamed_summary_marks_the_user_as_written(
+        async_client, create_random_note, fake_openai_client, replica, route_reads):
+    router = route_reads([replica])
+    response = await async_client.get(f"/api/v1/notes/{create_random_note.id}/summarization/stream")
+    assert response.status_code == 200
+    assert await router.recently_wrote(create_random_note.user_id)
+
+
+def test_several_workers_need_shared_write_markers(replica, tmp_path):
+    ReplicaRouter([replica], MemoryCacheBackend()).check_workers(1)
+    ReplicaRouter([], MemoryCacheBackend()).check_workers(4)
+    ReplicaRouter([replica], SQLiteCacheBackend(str(tmp_path / "sticky.db"))).check_workers(4)
+    with pytest.raises(ValueError, match="DATABASE_REPLICA_STICKY_URL"):
+        ReplicaRouter([replica], MemoryCacheBackend()).check_workers(4)
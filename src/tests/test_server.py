@@ -0,0 +1,84 @@
+import os
+import signal
+import sqlite3
+import subprocess
+import sys
+import time
+
+import httpx
+
+from benchmarks.utils import free_port
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER_DATA = {
+    "username": "serveruser",
+    "email": "server.user@gmail.com",
+    "password": "Panel@2004",
+}
+
+
+def start_server(database_url: str, workers: int, **settings) -> tuple[subprocess.Popen, str]:
+    port = free_port()
+    environment = dict(os.environ, SQLALCHEMY_DATABASE_URI=database_url, DATABASE_ECHO="False", **settings)
+    server = subprocess.Popen(
+        [sys.executable, "server.py", "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers),
+         "--graceful-timeout", "5", "--log-level", "warning"],
+        cwd=SRC_DIR, env=environment, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True)
+    return server, f"http://127.0.0.1:{port}"
+
+
+def wait_until_healthy(server: subprocess.Popen, base_url: str, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        assert server.poll() is None, server.stdout.read()
+        try:
+            if httpx.get(f"{base_url}/healthy", timeout=1.0).status_code == 200:
+                return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise AssertionError(f"{base_url} did not become healthy within {timeout} seconds")
+
+
+def stop_server(server: subprocess.Popen) -> str:
+    server.send_signal(signal.SIGTERM)
+    output, _ = server.communicate(timeout=30)
+    assert server.returncode == 0, output
+    return output
+
+
+def test_workers_share_one_migrated_database(tmp_path):
+    path = tmp_path / "server.db"
+    # Two masters racing on the same file exercise the startup lock as well.
+    servers = [start_server(f"sqlite+aiosqlite:///{path}", workers=2) for _ in range(2)]
+    try:
+        for server, base_url in servers:
+            wait_until_healthy(server, base_url)
+
+        base_url = servers[0][1]
+        assert httpx.post(f"{base_url}/api/v1/authentication/registration", json=USER_DATA).status_code == 201
+        token = httpx.post(f"{base_url}/api/v1/authentication/login", json=USER_DATA).json()["access_token"]
+        headers = {"Authorization": f"Bearer {token}"}
+        note = {"title": "Served note", "content": "Written through a forked worker.", "priority": 1}
+        for server, base_url in servers:
+            assert httpx.post(f"{base_url}/api/v1/notes/", json=note | {"title": base_url},
+                              headers=headers).status_code == 201
+        for _, base_url in servers:
+            for _ in range(4):
+                assert len(httpx.get(f"{base_url}/api/v1/notes/", headers=headers).json()) == 2
+    finally:
+        outputs = [stop_server(server) for server, _ in servers]
+
+    for output in outputs:
+        assert "Traceback" not in output
+    with sqlite3.connect(path) as connection:
+        assert connection.execute("SELECT count(*) FROM alembic_version").fetchone() == (1,)
+
+
+def test_workers_refuse_per_worker_replica_markers(tmp_path):
+    url = f"sqlite+aiosqlite:///{tmp_path / 'server.db'}"
+    server, _ = start_server(url, workers=2, DATABASE_REPLICA_URLS=url,
+                             DATABASE_REPLICA_STICKY_URL="memory://")
+    output, _ = server.communicate(timeout=60)
+    assert server.returncode == 1, output
+    assert "DATABASE_REPLICA_STICKY_URL" in output
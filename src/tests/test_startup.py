@@ -0,0 +1,29 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from database import SchemaNotReadyError, create_database_engine, init_db
+
+SRC_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_importing_app_skips_heavy_modules():
+    result = subprocess.run(
+        [sys.executable, "-c",
+         "import sys, main; print(','.join(m for m in ('pandas', 'numpy', 'nltk') if m in sys.modules))"],
+        cwd=SRC_DIR, capture_output=True, text=True, check=True)
+    assert result.stdout.strip() == ""
+
+
+@pytest.mark.asyncio
+async def test_init_db_checks_schema(tmp_path):
+    engine = create_database_engine(f"sqlite+aiosqlite:///{tmp_path / 'schema.db'}", profile="test")
+    with pytest.raises(SchemaNotReadyError) as exc_info:
+        await init_db(engine, mode="check")
+    assert "notes" in str(exc_info.value)
+
+    await init_db(engine, mode="create")
+    await init_db(engine, mode="check")
+    await engine.dispose()
@@ -1,25 +1,37 @@
+import asyncio
+import json
+
 import pytest
+import pytest_asyncio
 from sqlalchemy import select
 
+from external_services import openai_service
+from external_services.summarization_queue import summarization_queue
+from external_services.summarization_stream import stream_note_summarization
 from models.notes_model import Note
-from .utils import TestingSession, async_client, create_random_note, create_test_db
+from utils.text_utils import estimate_tokens, split_into_chunks
+from .utils import (TestingSession, admin_user, app, async_client, create_random_note, create_test_db,
+                    delete_notes, fake_openai_client)
 
 
 @pytest.mark.asyncio
-async def test_summarize_note_success(async_client, create_random_note, monkeypatch):
-    async def return_random_summary(note_content):
-        return "Random summarization"
-
-    monkeypatch.setattr("routers.notes.make_summarization", return_random_summary)
+async def test_summarize_note_success(async_client, create_random_note, fake_openai_client):
     note = create_random_note
     note_id = note.id
     sum_resp = await async_client.post(f"/api/v1/notes/{note_id}/summarization")
-    assert sum_resp.status_code == 201
+    assert sum_resp.status_code == 202
+    job = sum_resp.json()
+    assert job["status"] in ("pending", "running")
+    await summarization_queue.join()
     async with TestingSession() as db:
         result = await db.execute(select(Note).where(Note.id == note_id))
         updated_note = result.scalar_one_or_none()
         assert updated_note is not None
         assert updated_note.summarization == "Random summarization"
+    status_resp = await async_client.get(sum_resp.headers["location"])
+    assert status_resp.status_code == 200
+    assert status_resp.json()["status"] == "completed"
+    assert status_resp.json()["summarization"] == "Random summarization"
 
 
 @pytest.mark.asyncio
@@ -48,3 +60,293 @@ async def test_summarize_note_not_found(async_client):
     assert response.status_code == 404
     data = response.json()
     assert data["detail"] == "Note with such id does not exist"
+
+
+@pytest.mark.asyncio
+async def test_concurrent_summarizations_are_coalesced(async_client, create_random_note, fake_openai_client):
+    fake_openai_client.delay = 0.05
+    note_id = create_random_note.id
+    responses = await asyncio.gather(*[
+        async_client.post(f"/api/v1/notes/{note_id}/summarization") for _ in range(3)
+    ])
+    assert [response.status_code for response in responses] == [202, 202, 202]
+    assert len({response.json()["job_id"] for response in responses}) == 1
+    await summarization_queue.join()
+    assert len(fake_openai_client.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_batch_summarization(async_client, create_random_note, fake_openai_client):
+    note_id = create_random_note.id
+    response = await async_client.post(
+        "/api/v1/notes/summarization/batch", json={"note_ids": [note_id, 3213214, note_id]})
+    assert response.status_code == 202
+    data = response.json()
+    assert len(data["jobs"]) == 1
+    assert data["missing"] == [3213214]
+    await summarization_queue.join()
+    job_resp = await async_client.get(f"/api/v1/notes/summarization/jobs/{data['jobs'][0]['job_id']}")
+    assert job_resp.json()["status"] == "completed"
+
+
+@pytest.mark.asyncio
+async def test_summarization_job_not_found(async_client):
+    response = await async_client.get("/api/v1/notes/summarization/jobs/unknown")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_identical_content_reuses_cached_summary(async_client, admin_user, create_random_note,
+                                                      fake_openai_client):
+    first_resp = await async_client.post(f"/api/v1/notes/{create_random_note.id}/summarization")
+    await summarization_queue.join()
+    same_content = {"title": "Copied note", "content": "This is a  test note\ncontent. ", "priority": 1}
+    create_resp = await async_client.post("/api/v1/notes/", json=same_content)
+    assert create_resp.status_code == 201
+    async with TestingSession() as db:
+        result = await db.execute(select(Note.id).where(Note.title == "Copied note"))
+        copied_id = result.scalar_one()
+    second_resp = await async_client.post(f"/api/v1/notes/{copied_id}/summarization")
+    await summarization_queue.join()
+
+    assert first_resp.status_code == second_resp.status_code == 202
+    assert len(fake_openai_client.calls) == 1
+    stats = (await async_client.get("/api/v1/admin/summarization-cache")).json()
+    assert stats["misses"] >= 1
+    assert stats["memory_hits"] + stats["persistent_hits"] >= 1
+
+
+@pytest.mark.asyncio
+async def test_edited_note_gets_fresh_summary(async_client, create_random_note, fake_openai_client):
+    note_id = create_random_note.id
+    await async_client.post(f"/api/v1/notes/{note_id}/summarization")
+    await summarization_queue.join()
+
+    fake_openai_client.reply = "Summary of edited content"
+    edited = {"title": "Test Note", "content": "Completely different content now.", "priority": 5}
+    assert (await async_client.put(f"/api/v1/notes/{note_id}", json=edited)).status_code == 200
+    response = await async_client.post(f"/api/v1/notes/{note_id}/summarization")
+    assert response.status_code == 202
+    await summarization_queue.join()
+    response = await async_client.post(f"/api/v1/notes/{note_id}/summarization")
+    assert response.status_code == 200
+    assert response.json()["summarization"] == "Summary of edited content"
+    assert len(fake_openai_client.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_edit_during_summarization_discards_stale_summary(async_client, create_random_note,
+                                                               fake_openai_client, monkeypatch):
+    note_id = create_random_note.id
+    started, release = asyncio.Event(), asyncio.Event()
+    create = fake_openai_client.create
+
+    async def blocked_create(**kwargs):
+        started.set()
+        await release.wait()
+        return await create(**kwargs)
+
+    monkeypatch.setattr(fake_openai_client.chat.completions, "create", blocked_create)
+    stale_job = (await async_client.post(f"/api/v1/notes/{note_id}/summarization")).json()
+    await started.wait()
+
+    edited = {"title": "Test Note", "content": "Edited while the summary was running.", "priority": 5}
+    assert (await async_client.put(f"/api/v1/notes/{note_id}", json=edited)).status_code == 200
+    fresh_job = (await async_client.post(f"/api/v1/notes/{note_id}/summarization")).json()
+    assert fresh_job["job_id"] != stale_job["job_id"]
+
+    fake_openai_client.reply = "Summary of the edited note"
+    release.set()
+    await summarization_queue.join()
+
+    stale = (await async_client.get(f"/api/v1/notes/summarization/jobs/{stale_job['job_id']}")).json()
+    assert stale["status"] == "superseded"
+    async with TestingSession() as db:
+        assert await db.scalar(select(Note.summarization).where(Note.id == note_id)) == "Summary of the edited note"
+
+
+def parse_events(body: str) -> list[tuple[str, object]]:
+    events = []
+    for block in body.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+@pytest.mark.asyncio
+async def test_stream_summarization_forwards_tokens(async_client, create_random_note, fake_openai_client):
+    note_id = create_random_note.id
+    response = await async_client.get(f"/api/v1/notes/{note_id}/summarization/stream")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_events(response.text)
+    assert events[:-1] == [("token", "Random"), ("token", " summarization")]
+    assert events[-1] == ("done", {"summarization": "Random summarization", "cached": False})
+    assert fake_openai_client.streams[0].closed
+    async with TestingSession() as db:
+        summarization = await db.scalar(select(Note.summarization).where(Note.id == note_id))
+    assert summarization == "Random summarization"
+
+
+@pytest.mark.asyncio
+async def test_stream_summarization_replays_cached_summary(async_client, create_random_note, fake_openai_client):
+    note_id = create_random_note.id
+    await async_client.get(f"/api/v1/notes/{note_id}/summarization/stream")
+    response = await async_client.get(f"/api/v1/notes/{note_id}/summarization/stream")
+    assert parse_events(response.text) == [
+        ("summary", "Random summarization"),
+        ("done", {"summarization": "Random summarization", "cached": True}),
+    ]
+    assert len(fake_openai_client.calls) == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_started_before_edit_does_not_save(create_random_note, fake_openai_client):
+    # The stream summarizes the content read before the note was edited.
+    note_id = create_random_note.id
+    events = stream_note_summarization(note_id, 1, "Content the note had before an edit.", TestingSession)
+    body = "".join([event async for event in events])
+    assert parse_events(body)[-1] == (
+        "superseded", {"detail": "Note was edited or deleted while it was being summarized"})
+    async with TestingSession() as db:
+        assert await db.scalar(select(Note.summarization).where(Note.id == note_id)) is None
+
+
+@pytest.mark.asyncio
+async def test_stream_summarization_not_found(async_client):
+    response = await async_client.get("/api/v1/notes/3213214/summarization/stream")
+    assert response.status_code == 404
+
+
+@pytest.mark.asyncio
+async def test_stream_summarization_client_disconnect(create_random_note, fake_openai_client):
+    note_id = create_random_note.id
+    fake_openai_client.reply = "one two three four five six"
+    fake_openai_client.delay = 0.01
+    first_token = asyncio.Event()
+    messages = []
+
+    async def receive():
+        await first_token.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        messages.append(message)
+        if message["type"] == "http.response.body" and message.get("body"):
+            first_token.set()
+
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": f"/api/v1/notes/{note_id}/summarization/stream", "raw_path": b"",
+        "root_path": "", "query_string": b"", "headers": [(b"host", b"test")],
+        "client": ("127.0.0.1", 1234), "server": ("test", 80),
+    }
+    await asyncio.wait_for(app(scope, receive, send), timeout=5)
+
+    stream = fake_openai_client.streams[0]
+    assert stream.closed
+    assert stream.sent < len(stream.tokens)
+    async with TestingSession() as db:
+        summarization = await db.scalar(select(Note.summarization).where(Note.id == note_id))
+    assert summarization is None
+
+
+def long_note_paragraphs(count: int) -> list[str]:
+    return [f"Paragraph {index} talks about topic {index}." + " Details follow here." * 10 for index in range(count)]
+
+
+def short_note_paragraphs(count: int) -> list[str]:
+    return [f"Paragraph {index} covers topic {index}." + " More detail follows here." * 5 for index in range(count)]
+
+
+async def summarize_long_note(async_client, paragraphs: list[str]) -> int:
+    response = await async_client.post("/api/v1/notes/", json={
+        "title": "Long note", "content": "\n\n".join(paragraphs), "priority": 1})
+    assert response.status_code == 201
+    async with TestingSession() as db:
+        note_id = await db.scalar(select(Note.id).where(Note.title == "Long note"))
+    assert (await async_client.post(f"/api/v1/notes/{note_id}/summarization")).status_code == 202
+    await summarization_queue.join()
+    return note_id
+
+
+@pytest_asyncio.fixture
+async def clean_notes():
+    yield
+    await delete_notes()
+
+
+def system_prompts(client) -> list[str]:
+    return [call["messages"][0]["content"] for call in client.calls]
+
+
+def test_split_into_chunks_respects_token_limit():
+    paragraphs = long_note_paragraphs(6)
+    chunks = split_into_chunks("\n\n".join(paragraphs), 120)
+    assert len(chunks) > 1
+    assert all(estimate_tokens(chunk) <= 120 for chunk in chunks)
+    assert "\n\n".join(chunks) == "\n\n".join(paragraphs)
+    words = split_into_chunks(" ".join(["word"] * 50), 10)
+    assert all(estimate_tokens(chunk) <= 10 for chunk in words)
+    assert " ".join(words).split() == ["word"] * 50
+
+
+@pytest.mark.asyncio
+async def test_long_note_is_summarized_with_map_reduce(async_client, clean_notes, fake_openai_client, monkeypatch):
+    monkeypatch.setattr(openai_service, "CHUNK_TOKEN_LIMIT", 60)
+    note_id = await summarize_long_note(async_client, long_note_paragraphs(5))
+
+    prompts = system_prompts(fake_openai_client)
+    assert prompts.count(openai_service.CHUNK_PROMPT) == 5
+    assert prompts[-1] == openai_service.REDUCE_PROMPT
+    assert openai_service.SUMMARIZATION_PROMPT not in prompts
+    async with TestingSession() as db:
+        assert await db.scalar(select(Note.summarization).where(Note.id == note_id)) == "Random summarization"
+
+
+def test_split_into_chunks_keeps_boundaries_around_an_edit():
+    paragraphs = short_note_paragraphs(12)
+    chunks = split_into_chunks("\n\n".join(paragraphs), 300)
+    assert len(chunks) < len(paragraphs) / 2
+    for index in range(len(paragraphs)):
+        edited = list(paragraphs)
+        edited[index] += " It also gained a new sentence with fresh facts."
+        changed = set(chunks) - set(split_into_chunks("\n\n".join(edited), 300))
+        assert len(changed) <= 2
+        assert any(paragraphs[index] in chunk for chunk in changed)
+
+    # A paragraph growing past the limit only disturbs its neighbour's chunk.
+    paragraphs = [f"Paragraph {i} " + " ".join(f"term{j}" for j in range(i, i + 60)) + "." for i in range(12)]
+    chunks = split_into_chunks("\n\n".join(paragraphs), 300)
+    paragraphs[0] += " " + " ".join(f"extra{j}" for j in range(120))
+    assert len(set(chunks) - set(split_into_chunks("\n\n".join(paragraphs), 300))) <= 2
+
+
+@pytest.mark.asyncio
+async def test_editing_one_paragraph_resummarizes_one_chunk(async_client, clean_notes, fake_openai_client, monkeypatch):
+    monkeypatch.setattr(openai_service, "CHUNK_TOKEN_LIMIT", 300)
+    paragraphs = short_note_paragraphs(12)
+    note_id = await summarize_long_note(async_client, paragraphs)
+    fake_openai_client.calls.clear()
+
+    paragraphs[6] += " It also gained a new sentence with fresh facts."
+    edited = {"title": "Long note", "content": "\n\n".join(paragraphs), "priority": 1}
+    assert (await async_client.put(f"/api/v1/notes/{note_id}", json=edited)).status_code == 200
+    assert (await async_client.post(f"/api/v1/notes/{note_id}/summarization")).status_code == 202
+    await summarization_queue.join()
+
+    assert system_prompts(fake_openai_client) == [openai_service.CHUNK_PROMPT, openai_service.REDUCE_PROMPT]
+    resummarized = fake_openai_client.calls[0]["messages"][1]["content"]
+    assert paragraphs[6] in resummarized
+    assert resummarized.count("Paragraph") > 1
+
+
+@pytest.mark.asyncio
+async def test_chunk_summaries_respect_concurrency_limit(async_client, clean_notes, fake_openai_client, monkeypatch):
+    monkeypatch.setattr(openai_service, "CHUNK_TOKEN_LIMIT", 60)
+    monkeypatch.setattr(openai_service, "CHUNK_CONCURRENCY", 2)
+    fake_openai_client.delay = 0.01
+    await summarize_long_note(async_client, long_note_paragraphs(6))
+
+    assert system_prompts(fake_openai_client).count(openai_service.CHUNK_PROMPT) == 6
+    assert fake_openai_client.max_active == 2
@@ -1,14 +1,20 @@
+import asyncio
+from contextlib import contextmanager
+from types import SimpleNamespace
+
 import pytest_asyncio
 from httpx import AsyncClient
-from sqlalchemy import text
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy.pool import StaticPool
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 
-from database import Base, get_db
+from database import Base, create_database_engine, get_db, get_session_factory, open_session
+from external_services.summary_cache import summary_cache
 from main import app
 from models.user_model import User
+from routers.analysis import analysis_cache
 from models.notes_model import Note
-from routers.auth import bcrypt_context, get_current_user
+from utils.authentication_utils import Principal, bcrypt_context, get_current_user
+from utils.versioning_utils import INSERT, note_version_cache, record_note_versions
 
 
 INITIAL_NOTE_DATA = {
@@ -20,12 +26,7 @@ INITIAL_NOTE_DATA = {
 
 SQLALCHEMY_DATABASE_URL = "sqlite+aiosqlite:///./test.db"
 
-engine = create_async_engine(
-    SQLALCHEMY_DATABASE_URL,
-    connect_args={"check_same_thread": False},
-    poolclass=StaticPool,
-    echo=True,
-)
+engine = create_database_engine(SQLALCHEMY_DATABASE_URL, profile="test")
 
 TestingSession = async_sessionmaker(
     engine, expire_on_commit=False, class_=AsyncSession
@@ -33,19 +34,84 @@ TestingSession = async_sessionmaker(
 
 
 async def override_get_db():
-    async with TestingSession() as db:
+    async with open_session(TestingSession) as db:
         yield db
 
 
+def override_get_session_factory():
+    return TestingSession
+
+
 async def override_get_current_user():
-    return {
-        "id": "1",
-        "sub": "test@gmail.com",
-    }
+    return Principal(id=1, email="test@gmail.com")
 
 
 app.dependency_overrides[get_db] = override_get_db
 app.dependency_overrides[get_current_user] = override_get_current_user
+app.dependency_overrides[get_session_factory] = override_get_session_factory
+
+
+@contextmanager
+def count_statements():
+    statements = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine.sync_engine, "before_cursor_execute", record)
+    try:
+        yield statements
+    finally:
+        event.remove(engine.sync_engine, "before_cursor_execute", record)
+
+
+class FakeCompletionStream:
+    def __init__(self, words, delay=0.0):
+        self.tokens = [word if index == 0 else " " + word for index, word in enumerate(words)]
+        self.delay = delay
+        self.sent = 0
+        self.closed = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.closed or self.sent == len(self.tokens):
+            raise StopAsyncIteration
+        await asyncio.sleep(self.delay)
+        token = self.tokens[self.sent]
+        self.sent += 1
+        return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=token))])
+
+    async def close(self):
+        self.closed = True
+
+
+class FakeOpenAIClient:
+    def __init__(self, reply="Random summarization", delay=0.0):
+        self.reply = reply
+        self.delay = delay
+        self.calls = []
+        self.streams = []
+        self.active = 0
+        self.max_active = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        self.calls.append(kwargs)
+        if kwargs.get("stream"):
+            stream = FakeCompletionStream(self.reply.split(" "), self.delay)
+            self.streams.append(stream)
+            return stream
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        message = SimpleNamespace(content=self.reply)
+        usage = SimpleNamespace(prompt_tokens=len(kwargs["messages"][-1]["content"].split()), completion_tokens=2)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
 
 
 @pytest_asyncio.fixture(scope="session", autouse=True)
@@ -65,7 +131,7 @@ async def async_client():
 
 @pytest_asyncio.fixture
 async def create_user():
-    hashed_password = bcrypt_context.encrypt("Panel@2004")
+    hashed_password = bcrypt_context.hash("Panel@2004")
     user = User(
         username="SomeUser2004",
         email="someuser2004@gmail.com",
@@ -87,12 +153,40 @@ async def create_random_note():
     note = Note(**INITIAL_NOTE_DATA)
     async with TestingSession() as db:
         db.add(note)
+        await db.flush()
+        await record_note_versions(db, [INITIAL_NOTE_DATA | {"id": note.id}], INSERT)
         await db.commit()
         await db.refresh(note)
     yield note
+    await delete_notes()
+
+
+@pytest_asyncio.fixture
+async def clear_notes():
+    yield
+    await delete_notes()
+
+
+async def delete_notes():
     async with engine.begin() as conn:
-        await conn.execute(text("DELETE FROM notes"))
-        await conn.commit()
+        for table in ("notes", "note_revisions", "user_terms", "user_corpus_versions"):
+            await conn.execute(text(f"DELETE FROM {table}"))
+    note_version_cache.clear()
+    await analysis_cache.backend.clear()
 
 
+@pytest_asyncio.fixture
+async def fake_openai_client(monkeypatch):
+    client = FakeOpenAIClient()
+    monkeypatch.setattr("external_services.openai_service.client", client)
+    summary_cache.memory.clear()
+    async with engine.begin() as conn:
+        await conn.execute(text("DELETE FROM summary_cache"))
+    yield client
 
+
+@pytest_asyncio.fixture
+async def admin_user(monkeypatch):
+    principal = await override_get_current_user()
+    monkeypatch.setattr("utils.authentication_utils.ADMIN_EMAILS", frozenset({principal.email}))
+    yield principal
@@ -1,47 +1,52 @@
-import re
+import heapq
 from collections import Counter
 
-import nltk
+import numpy as np
 import pandas as pd
-from nltk.corpus import stopwords
 
-nltk.download('stopwords')
+from utils.text_utils import MOST_COMMON_WORD_AMOUNT, STOPWORDS, tokenize
 
-STOPLIST = stopwords.words('english')
+
+def most_common_terms(term_frequencies: Counter, amount: int) -> list[tuple[str, int]]:
+    # Same order as the user_terms store: count descending, then term.
+    return [
+        (word, int(count)) for word, count in heapq.nsmallest(
+            amount, term_frequencies.items(), key=lambda item: (-item[1], item[0]))]
+
+
+def tokenize_contents(contents, collect_terms=True):
+    word_counts = np.zeros(len(contents), dtype=np.int64)
+    term_frequencies = Counter()
+    for index, content in enumerate(contents):
+        words = tokenize(content)
+        word_counts[index] = len(words)
+        if collect_terms:
+            term_frequencies.update(words)
+    for stopword in STOPWORDS & term_frequencies.keys():
+        del term_frequencies[stopword]
+    return word_counts, term_frequencies
 
 
 class Analysis:
-    def __init__(self, dataset):
-        self.dataframe = pd.DataFrame(dataset)
-        self.all_words = []
-        self.most_common_word_amount = 10
-        self.total_word_count, self.average_word_note_length = self.calculate_word_analysis()
-        self.common_words = self.calculate_most_common_words()
+    most_common_word_amount = MOST_COMMON_WORD_AMOUNT
 
-    def count_words(self, text):
-        words = re.findall(r'\b\w+\b', text.lower())
-        return len(words)
+    def __init__(self, dataset, common_words=None):
+        self.dataframe = pd.DataFrame(dataset, columns=["title", "content"])
+        self.word_counts, self.term_frequencies = tokenize_contents(
+            self.dataframe['content'].tolist(), collect_terms=common_words is None)
+        self.total_word_count, self.average_word_note_length = self.calculate_word_analysis()
+        if common_words is None:
+            common_words = self.calculate_most_common_words()
+        self.common_words = common_words
 
     def calculate_word_analysis(self):
-        self.dataframe['word_count'] = self.dataframe['content'].apply(
-            self.count_words)
+        self.dataframe['word_count'] = self.word_counts
         total_word_count = int(self.dataframe['word_count'].sum())
-        average_word_note_length = float(self.dataframe['word_count'].mean())
+        average_word_note_length = float(self.dataframe['word_count'].mean()) if total_word_count else 0.0
         return total_word_count, average_word_note_length
 
     def calculate_most_common_words(self):
-        for content in self.dataframe['content']:
-            words = re.findall(r'\b\w+\b', content.lower())
-            cleaned_words = self.remove_stopwords(words)
-            self.all_words.extend(cleaned_words)
-        word_occurness = Counter(self.all_words)
-        most_common_words = [
-            (word, int(count)) for word, count in word_occurness.most_common(
-                self.most_common_word_amount)]
-        return most_common_words
-
-    def remove_stopwords(self, words):
-        return [word for word in words if not word.lower() in STOPLIST]
+        return most_common_terms(self.term_frequencies, self.most_common_word_amount)
 
     def top_3_longest_notes(self):
         top_3_notes = self.dataframe.nlargest(
@@ -64,3 +69,75 @@ class Analysis:
 
     def __str__(self):
         return str(self.to_dict())
+
+
+class AnalysisAccumulator:
+    ranked_note_amount = 3
+
+    def __init__(self, collect_terms=True):
+        self.collect_terms = collect_terms
+        self.note_count = 0
+        self.total_word_count = 0
+        self.longest_notes = []
+        self.shortest_notes = []
+        self.term_frequencies = Counter()
+
+    def add_chunk(self, rows):
+        titles = [row[0] for row in rows]
+        word_counts, term_frequencies = tokenize_contents(
+            [row[1] for row in rows], collect_terms=self.collect_terms)
+        for title, word_count in zip(titles, word_counts.tolist()):
+            position = self.note_count
+            self.note_count += 1
+            self._keep_ranked(self.longest_notes, (word_count, -position, title))
+            self._keep_ranked(self.shortest_notes, (-word_count, -position, title))
+        self.total_word_count += int(word_counts.sum())
+        self.term_frequencies.update(term_frequencies)
+
+    def merge(self, other):
+        offset = self.note_count
+        for word_count, negative_position, title in other.longest_notes:
+            self._keep_ranked(self.longest_notes, (word_count, negative_position - offset, title))
+        for negative_word_count, negative_position, title in other.shortest_notes:
+            self._keep_ranked(self.shortest_notes, (negative_word_count, negative_position - offset, title))
+        self.note_count += other.note_count
+        self.total_word_count += other.total_word_count
+        self.term_frequencies.update(other.term_frequencies)
+
+    def _keep_ranked(self, heap, item):
+        if len(heap) < self.ranked_note_amount:
+            heapq.heappush(heap, item)
+        else:
+            heapq.heappushpop(heap, item)
+
+    def top_3_longest_notes(self):
+        return [
+            {"title": title, "word_count": word_count}
+            for word_count, _, title in sorted(self.longest_notes, reverse=True)]
+
+    def top_3_shortest_notes(self):
+        return [
+            {"title": title, "word_count": -word_count}
+            for word_count, _, title in sorted(self.shortest_notes, reverse=True)]
+
+    def to_dict(self, common_words=None):
+        if common_words is None:
+            common_words = most_common_terms(self.term_frequencies, Analysis.most_common_word_amount)
+        average_word_note_length = self.total_word_count / self.note_count if self.note_count else 0.0
+        return {
+            "total_word_count": self.total_word_count,
+            "average_word_note_length": float(average_word_note_length),
+            "common_words": common_words,
+            "top_3_longest_notes": self.top_3_longest_notes(),
+            "top_3_shortest_notes": self.top_3_shortest_notes()
+        }
+
+
+def build_analysis(dataset, common_words=None):
+    return Analysis(dataset=dataset, common_words=common_words).to_dict()
+
+
+def analyse_chunk(rows, collect_terms=True):
+    accumulator = AnalysisAccumulator(collect_terms=collect_terms)
+    accumulator.add_chunk(rows)
+    return accumulator
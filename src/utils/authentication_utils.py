@@ -1,7 +1,11 @@
+import asyncio
+import hashlib
+import time
+from dataclasses import dataclass
 from datetime import timedelta, datetime
 from typing import Annotated
 
-from decouple import config
+from decouple import Csv, config
 from fastapi import HTTPException, Depends
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
@@ -11,12 +15,57 @@ from sqlalchemy import select
 from starlette import status
 
 from models.user_model import User
+from utils.cache_utils import LRUCache
+from utils.executor_utils import BoundedExecutor, ExecutorSaturatedError
 
 oauth2_bearer = OAuth2PasswordBearer(tokenUrl="/api/v1/authentication/login")
 
-bcrypt_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = config('BCRYPT_ROUNDS', default=12, cast=int)
+bcrypt_context = CryptContext(
+    schemes=["bcrypt"],
+    deprecated="auto",
+    bcrypt__default_rounds=BCRYPT_ROUNDS,
+    bcrypt__min_rounds=BCRYPT_ROUNDS)
+password_executor = BoundedExecutor(
+    kind=config('PASSWORD_HASH_EXECUTOR', default='thread'),
+    max_workers=config('PASSWORD_HASH_WORKERS', default=4, cast=int),
+    max_pending=config('PASSWORD_HASH_QUEUE_SIZE', default=64, cast=int),
+    timeout=config('PASSWORD_HASH_TIMEOUT_SECONDS', default=10.0, cast=float),
+)
 SECRET_KEY = config('SECRET_KEY')
 ALGORITHM = "HS256"
+verified_tokens = LRUCache(maxsize=config('TOKEN_CACHE_SIZE', default=10000, cast=int))
+# Accounts allowed to read /api/v1/admin; nobody is an admin by default.
+ADMIN_EMAILS = frozenset(config('ADMIN_EMAILS', default='', cast=Csv()))
+
+
+@dataclass(frozen=True)
+class Principal:
+    id: int
+    email: str
+    expires_at: float | None = None
+
+
+async def run_password_job(function, *args):
+    try:
+        return await password_executor.run(function, *args)
+    except ExecutorSaturatedError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Too many authentication requests, try again later",
+            headers={"Retry-After": "1"})
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Authentication took too long to complete")
+
+
+async def hash_password(password: str) -> str:
+    return await run_password_job(bcrypt_context.hash, password)
+
+
+async def verify_password(password: str, hashed_password: str) -> tuple[bool, str | None]:
+    return await run_password_job(bcrypt_context.verify_and_update, password, hashed_password)
 
 
 async def authenticate_user(db, email: str, password) -> User | bool:
@@ -26,10 +75,14 @@ async def authenticate_user(db, email: str, password) -> User | bool:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found")
-    if not bcrypt_context.verify(password, user.hashed_password):
+    verified, new_hash = await verify_password(password, user.hashed_password)
+    if not verified:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Incorrect password provided")
+    if new_hash:
+        user.hashed_password = new_hash
+        await db.commit()
     return user
 
 
@@ -44,13 +97,32 @@ def create_jwt_token(user: User, expires_delta: timedelta) -> str:
 
 
 def get_current_user(
-        refresh_token: Annotated[str, Depends(oauth2_bearer)]) -> dict:
+        refresh_token: Annotated[str, Depends(oauth2_bearer)]) -> Principal:
+    token_digest = hashlib.sha256(refresh_token.encode()).digest()
+    principal = verified_tokens.get(token_digest)
+    if principal is not None:
+        return principal
     payload = decode_refresh_token(refresh_token=refresh_token)
-    if not (payload.get("sub") or not payload.get("id")):
+    if not payload.get("sub") or not payload.get("id"):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Invalid payload")
-    return payload
+    expires_at = payload.get("exp")
+    principal = Principal(
+        id=int(payload["id"]),
+        email=payload["sub"],
+        expires_at=float(expires_at) if expires_at is not None else None)
+    if principal.expires_at is not None and principal.expires_at > time.time():
+        verified_tokens.set(token_digest, principal, ttl=principal.expires_at - time.time())
+    return principal
+
+
+def require_admin(user: Annotated[Principal, Depends(get_current_user)]) -> Principal:
+    if user.email not in ADMIN_EMAILS:
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin access required")
+    return user
 
 
 def decode_refresh_token(refresh_token: str) -> dict:
@@ -0,0 +1,407 @@
+import asyncio
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from urllib.parse import unquote, urlparse
+
+from utils.cache_utils import LRUCache
+
+logger = logging.getLogger(__name__)
+
+
+class CacheError(Exception):
+    pass
+
+
+class CacheBackend:
+    # Values are bytes; ttl is in seconds and None means no expiry.
+    async def get(self, key: str) -> bytes | None:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        raise NotImplementedError
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # Stores the value only if the key is absent; returns whether it did.
+        raise NotImplementedError
+
+    async def delete(self, key: str):
+        raise NotImplementedError
+
+    async def delete_if(self, key: str, value: bytes):
+        # Deletes the key only while it still holds this value.
+        raise NotImplementedError
+
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+class MemoryCacheBackend(CacheBackend):
+    def __init__(self, maxsize: int = 1024):
+        self.entries = LRUCache(maxsize=maxsize)
+
+    async def get(self, key: str) -> bytes | None:
+        return self.entries.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        self.entries.set(key, value, ttl)
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        if key in self.entries:
+            return False
+        self.entries.set(key, value, ttl)
+        return True
+
+    async def delete(self, key: str):
+        self.entries.pop(key)
+
+    async def delete_if(self, key: str, value: bytes):
+        if self.entries.get(key) == value:
+            self.entries.pop(key)
+
+    async def clear(self):
+        self.entries.clear()
+
+
+class SQLiteCacheBackend(CacheBackend):
+    # A WAL-mode file shared by every worker on the host. Expiry uses wall
+    # clock time because monotonic clocks are not comparable across processes.
+    def __init__(self, path: str, timeout: float = 5.0):
+        self.path = path
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._connection: sqlite3.Connection | None = None
+        self._pid: int | None = None
+
+    def _connect(self) -> sqlite3.Connection:
+        # Opened on first use in each process: backends are created at import
+        # time, before server.py forks, and a connection must not cross a fork.
+        if self._pid != os.getpid():
+            self._connection = sqlite3.connect(
+                self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            self._pid = os.getpid()
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS cache_entries "
+                "(key TEXT PRIMARY KEY, value BLOB NOT NULL, expires_at REAL)")
+            self._connection.execute(
+                "CREATE INDEX IF NOT EXISTS ix_cache_entries_expires_at ON cache_entries (expires_at)")
+        return self._connection
+
+    def _run(self, statement: str, parameters: tuple = ()):
+        try:
+            with self._lock:
+                return self._connect().execute(statement, parameters)
+        except sqlite3.Error as error:
+            raise CacheError(str(error)) from error
+
+    async def _execute(self, statement: str, parameters: tuple = ()):
+        return await asyncio.to_thread(self._run, statement, parameters)
+
+    @staticmethod
+    def _expires_at(ttl: float | None) -> float | None:
+        return time.time() + ttl if ttl is not None else None
+
+    async def get(self, key: str) -> bytes | None:
+        def read():
+            row = self._run(
+                "SELECT value FROM cache_entries WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+                (key, time.time())).fetchone()
+            return row[0] if row else None
+        return await asyncio.to_thread(read)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        await self._execute("DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),))
+        await self._execute(
+            "INSERT OR REPLACE INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?)",
+            (key, value, self._expires_at(ttl)))
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        # Expired rows are taken over with an upsert, so the check and the
+        # write are a single atomic statement.
+        cursor = await self._execute(
+            "INSERT INTO cache_entries (key, value, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT (key) DO UPDATE SET value = excluded.value, expires_at = excluded.expires_at "
+            "WHERE cache_entries.expires_at <= ?",
+            (key, value, self._expires_at(ttl), time.time()))
+        return cursor.rowcount == 1
+
+    async def delete(self, key: str):
+        await self._execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+
+    async def delete_if(self, key: str, value: bytes):
+        await self._execute("DELETE FROM cache_entries WHERE key = ? AND value = ?", (key, value))
+
+    async def clear(self):
+        await self._execute("DELETE FROM cache_entries")
+
+    async def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                self._connection.close()
+            self._connection = self._pid = None
+
+
+DELETE_IF_SCRIPT = (
+    "if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) else return 0 end")
+
+
+class RedisCacheBackend(CacheBackend):
+    # Speaks just enough RESP for GET/SET/DEL/SCAN over one connection per
+    # event loop, so no Redis client library is needed.
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0, password: str | None = None,
+                 prefix: str = "", timeout: float = 2.0):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.prefix = prefix
+        self.timeout = timeout
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._lock: asyncio.Lock | None = None
+        self._reader: asyncio.StreamReader | None = None
+        self._writer: asyncio.StreamWriter | None = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisCacheBackend":
+        parsed = urlparse(url)
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=unquote(parsed.password) if parsed.password else None,
+            **kwargs)
+
+    @staticmethod
+    def encode_command(*args) -> bytes:
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    async def read_reply(self):
+        line = await self._reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("connection closed by server")
+        kind, payload = line[:1], line[1:-2]
+        if kind == b"+":
+            return payload.decode()
+        if kind == b"-":
+            raise CacheError(payload.decode())
+        if kind == b":":
+            return int(payload)
+        if kind == b"$":
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self._reader.readexactly(length + 2)
+            return data[:-2]
+        if kind == b"*":
+            length = int(payload)
+            return None if length < 0 else [await self.read_reply() for _ in range(length)]
+        raise CacheError(f"unexpected reply: {line!r}")
+
+    async def _connect(self):
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._call("AUTH", self.password)
+        if self.db:
+            await self._call("SELECT", self.db)
+
+    async def _call(self, *args):
+        self._writer.write(self.encode_command(*args))
+        await self._writer.drain()
+        return await self.read_reply()
+
+    async def execute(self, *args):
+        loop = asyncio.get_running_loop()
+        if loop is not self._loop:
+            self._loop, self._lock = loop, asyncio.Lock()
+            self._reader = self._writer = None
+        async with self._lock:
+            try:
+                if self._writer is None:
+                    await asyncio.wait_for(self._connect(), self.timeout)
+                return await asyncio.wait_for(self._call(*args), self.timeout)
+            except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as error:
+                self._close_connection()
+                raise CacheError(f"redis command {args[0]} failed: {error!r}") from error
+            except CacheError:
+                raise
+            except BaseException:
+                # A cancelled call may leave a reply unread; start over next time.
+                self._close_connection()
+                raise
+
+    def _close_connection(self):
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key: str) -> bytes | None:
+        return await self.execute("GET", self.prefix + key)
+
+    async def set(self, key: str, value: bytes, ttl: float | None = None):
+        if ttl is None:
+            await self.execute("SET", self.prefix + key, value)
+        else:
+            await self.execute("SET", self.prefix + key, value, "PX", max(1, int(ttl * 1000)))
+
+    async def add(self, key: str, value: bytes, ttl: float | None = None) -> bool:
+        arguments = ("PX", max(1, int(ttl * 1000))) if ttl is not None else ()
+        return await self.execute("SET", self.prefix + key, value, *arguments, "NX") == "OK"
+
+    async def delete(self, key: str):
+        await self.execute("DEL", self.prefix + key)
+
+    async def delete_if(self, key: str, value: bytes):
+        await self.execute("EVAL", DELETE_IF_SCRIPT, 1, self.prefix + key, value)
+
+    async def clear(self):
+        cursor = b"0"
+        while True:
+            cursor, keys = await self.execute("SCAN", cursor, "MATCH", self.prefix + "*", "COUNT", 500)
+            if keys:
+                await self.execute("DEL", *keys)
+            if cursor in (b"0", "0", 0):
+                return
+
+    async def close(self):
+        self._close_connection()
+
+
+def create_cache_backend(url: str, prefix: str = "") -> CacheBackend:
+    # memory://?maxsize=N, sqlite:///path/to/cache.db or redis://[:password@]host:port/db
+    parsed = urlparse(url)
+    if parsed.scheme == "memory":
+        maxsize = dict(part.split("=", 1) for part in parsed.query.split("&") if "=" in part).get("maxsize", 1024)
+        return MemoryCacheBackend(maxsize=int(maxsize))
+    if parsed.scheme == "sqlite":
+        return SQLiteCacheBackend(unquote(parsed.path[1:] if parsed.path.startswith("//") else parsed.path))
+    if parsed.scheme == "redis":
+        return RedisCacheBackend.from_url(url, prefix=prefix)
+    raise ValueError(f"unsupported cache backend: {url}")
+
+
+class SharedResultCache:
+    # JSON results in a CacheBackend with stampede protection: concurrent
+    # misses in one process share a future, and across processes a short-lived
+    # lock key lets one worker compute while the others poll for its result.
+    # Backend failures are logged and the result is computed directly.
+    def __init__(self, backend: CacheBackend, namespace: str, ttl: float | None = 3600.0,
+                 lock_ttl: float = 30.0, poll_interval: float = 0.05):
+        self.backend = backend
+        self.namespace = namespace
+        self.ttl = ttl
+        self.lock_ttl = lock_ttl
+        self.poll_interval = poll_interval
+        self.hits = 0
+        self.misses = 0
+        self.waits = 0
+        self.errors = 0
+        self._inflight: dict[str, asyncio.Future] = {}
+
+    async def get_or_compute(self, key: str, compute):
+        key = f"{self.namespace}:{key}"
+        cached = await self._get(key)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        inflight = self._inflight.get(key)
+        if inflight is not None and inflight.get_loop() is asyncio.get_running_loop():
+            self.waits += 1
+            return await asyncio.shield(inflight)
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await self._compute_once(key, compute)
+            future.set_result(value)
+            return value
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as error:
+            future.set_exception(error)
+            future.exception()
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _compute_once(self, key: str, compute):
+        lock_key = f"{key}:lock"
+        deadline = time.monotonic() + self.lock_ttl
+        token = uuid.uuid4().hex.encode()
+        while True:
+            if await self._add(lock_key, token):
+                try:
+                    # Another worker may have stored the result since our miss.
+                    cached = await self._get(key)
+                    if cached is not None:
+                        self.hits += 1
+                        return cached
+                    self.misses += 1
+                    value = await compute()
+                    await self._set(key, value)
+                    return value
+                finally:
+                    # Once lock_ttl has passed another worker may hold the lock.
+                    await self._release(lock_key, token)
+            self.waits += 1
+            await asyncio.sleep(self.poll_interval)
+            cached = await self._get(key)
+            if cached is not None:
+                self.hits += 1
+                return cached
+            if time.monotonic() >= deadline:
+                # The lock holder died or is too slow; stop waiting for it.
+                self.misses += 1
+                return await compute()
+
+    def _backend_failed(self, operation: str, error: CacheError):
+        self.errors += 1
+        logger.warning("%s cache %s failed: %s", self.namespace, operation, error)
+
+    async def _get(self, key: str):
+        try:
+            payload = await self.backend.get(key)
+        except CacheError as error:
+            self._backend_failed("get", error)
+            return None
+        return None if payload is None else json.loads(payload)
+
+    async def _set(self, key: str, value):
+        try:
+            await self.backend.set(key, json.dumps(value, separators=(",", ":")).encode(), self.ttl)
+        except CacheError as error:
+            self._backend_failed("set", error)
+
+    async def _add(self, key: str, value: bytes) -> bool:
+        try:
+            return await self.backend.add(key, value, self.lock_ttl)
+        except CacheError as error:
+            self._backend_failed("lock", error)
+            return True
+
+    async def _release(self, key: str, token: bytes):
+        try:
+            await self.backend.delete_if(key, token)
+        except CacheError as error:
+            self._backend_failed("unlock", error)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "misses": self.misses,
+            "waits": self.waits,
+            "errors": self.errors,
+        }
@@ -0,0 +1,102 @@
+import hashlib
+import json
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+
+from fastapi import HTTPException, Request, Response, status
+from sqlalchemy import func, select
+
+from models.note_revision_model import NoteRevision
+from models.notes_model import Note
+
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    digest = hashlib.sha256(json.dumps(parts, default=str, separators=(",", ":")).encode()).hexdigest()
+    return f'"{digest[:32]}"'
+
+
+def query_fingerprint(request: Request) -> list:
+    return sorted(request.query_params.multi_items())
+
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match uses weak comparison, so W/ prefixes are ignored.
+    candidates = (candidate.strip().removeprefix("W/") for candidate in if_none_match.split(","))
+    return etag in candidates
+
+
+def as_utc(moment: datetime) -> datetime:
+    # Timestamps are stored without a time zone and written by the database clock in UTC.
+    return moment.replace(tzinfo=timezone.utc) if moment.tzinfo is None else moment
+
+
+def has_preconditions(request: Request) -> bool:
+    return "if-none-match" in request.headers or "if-modified-since" in request.headers
+
+
+def is_not_modified(request: Request, etag: str, last_modified: datetime | None) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        return etag_matches(if_none_match, etag)
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        return as_utc(last_modified).replace(microsecond=0) <= as_utc(since)
+    return False
+
+
+def validator_headers(etag: str, last_modified: datetime | None) -> dict:
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if last_modified is not None:
+        headers["Last-Modified"] = format_datetime(as_utc(last_modified), usegmt=True)
+    return headers
+
+
+def check_conditional(request: Request, response: Response, etag: str, last_modified: datetime | None):
+    # Raises 304 when the client's copy is current; otherwise stamps the
+    # validators on the response that the endpoint is about to build.
+    headers = validator_headers(etag, last_modified)
+    if is_not_modified(request, etag, last_modified):
+        raise HTTPException(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    response.headers.update(headers)
+
+
+def with_validators(response: Response, source: Response) -> Response:
+    # Endpoints that return a Response directly bypass the injected one.
+    for name in ("ETag", "Last-Modified", "Cache-Control"):
+        if name in source.headers:
+            response.headers[name] = source.headers[name]
+    return response
+
+
+async def note_collection_validators(db, user_id: int) -> tuple[tuple, datetime | None]:
+    # A user's notes change only by insert (max id and count move), update
+    # (max updated_at moves) or delete (count drops), so these aggregates
+    # identify a state without reading any content.
+    result = await db.execute(
+        select(func.count(Note.id), func.max(Note.updated_at), func.max(Note.id))
+        .where(Note.user_id == user_id)
+    )
+    count, last_modified, max_id = result.one()
+    return (count, last_modified, max_id), last_modified
+
+
+def latest_note_version():
+    # Served by the (note_id, version) primary key; tells apart edits that land
+    # within the same updated_at tick.
+    return (
+        select(func.max(NoteRevision.version))
+        .where(NoteRevision.note_id == Note.id)
+        .scalar_subquery()
+    )
+
+
+def note_etag(note_id: int, updated_at: datetime | None, version: int | None) -> str:
+    return make_etag("note", note_id, updated_at, version)
@@ -0,0 +1,21 @@
+from sqlalchemy import select
+from sqlalchemy.sql import func
+
+from database import dialect_insert
+from models.corpus_version_model import UserCorpusVersion
+
+
+async def bump_corpus_version(db, user_id: int):
+    # Called in the same transaction as every note write, so a committed
+    # version always matches the notes it describes.
+    statement = dialect_insert(db, UserCorpusVersion).values(user_id=user_id, version=1)
+    await db.execute(statement.on_conflict_do_update(
+        index_elements=[UserCorpusVersion.user_id],
+        set_={"version": UserCorpusVersion.version + 1, "updated_at": func.now()}))
+
+
+async def get_corpus_version(db, user_id: int):
+    result = await db.execute(
+        select(UserCorpusVersion.version, UserCorpusVersion.updated_at)
+        .where(UserCorpusVersion.user_id == user_id))
+    return result.one_or_none() or (0, None)
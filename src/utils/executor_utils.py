@@ -0,0 +1,99 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import asynccontextmanager
+
+EXECUTOR_KINDS = ("process", "thread")
+
+
+class ExecutorSaturatedError(Exception):
+    pass
+
+
+class BoundedExecutor:
+    def __init__(self, kind: str = "process", max_workers: int = 2,
+                 max_pending: int = 8, timeout: float | None = 30.0):
+        if kind not in EXECUTOR_KINDS:
+            raise ValueError(f"Unknown executor kind {kind!r}, expected one of {EXECUTOR_KINDS}")
+        self.kind = kind
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.timeout = timeout
+        self.pending = 0
+        self._pending_lock = threading.Lock()
+        self._pool: Executor | None = None
+
+    def _get_pool(self) -> Executor:
+        if self._pool is None:
+            if self.kind == "process":
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            else:
+                self._pool = ThreadPoolExecutor(max_workers=self.max_workers)
+        return self._pool
+
+    def _admit(self):
+        with self._pending_lock:
+            if self.pending >= self.max_pending:
+                raise ExecutorSaturatedError(
+                    f"{self.pending} jobs already pending (limit {self.max_pending})")
+            self.pending += 1
+
+    def _release(self, job: Future | None = None):
+        # Also called from the pool's threads as a job's done-callback.
+        with self._pending_lock:
+            self.pending -= 1
+
+    def _release_after(self, job: Future | None):
+        # A timeout only stops the wait; a job that already started keeps its
+        # worker busy, so its slot is freed when it actually finishes.
+        if job is None:
+            self._release()
+        else:
+            job.add_done_callback(self._release)
+
+    async def _wait(self, job: Future, timeout: float | None):
+        if timeout is not None and timeout <= 0:
+            job.cancel()
+            raise asyncio.TimeoutError()
+        # Cancelling the wrapper cancels the job too if it has not started yet.
+        return await asyncio.wait_for(asyncio.wrap_future(job), timeout)
+
+    async def run(self, function, *args):
+        self._admit()
+        job = None
+        try:
+            job = self._get_pool().submit(function, *args)
+        finally:
+            self._release_after(job)
+        return await self._wait(job, self.timeout)
+
+    @asynccontextmanager
+    async def reserve(self):
+        # For requests that run several jobs one after another: admitted once,
+        # holding one slot, with one deadline across all of the jobs.
+        self._admit()
+        reservation = ExecutorReservation(self)
+        try:
+            yield reservation
+        finally:
+            self._release_after(reservation.job)
+
+    def shutdown(self, wait: bool = True):
+        if self._pool is not None:
+            self._pool.shutdown(wait=wait, cancel_futures=True)
+            self._pool = None
+
+
+class ExecutorReservation:
+    def __init__(self, executor: BoundedExecutor):
+        self.executor = executor
+        self.deadline = None if executor.timeout is None else time.monotonic() + executor.timeout
+        self.job: Future | None = None
+
+    async def run(self, function, *args):
+        if self.job is not None and not self.job.done():
+            raise RuntimeError("A reservation runs one job at a time")
+        self.job = self.executor._get_pool().submit(function, *args)
+        remaining = None if self.deadline is None else self.deadline - time.monotonic()
+        return await self.executor._wait(self.job, remaining)
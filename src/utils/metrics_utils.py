@@ -0,0 +1,198 @@
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from decouple import config
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+METRICS_ENABLED = config('METRICS_ENABLED', default=True, cast=bool)
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STATEMENT_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55)
+OPENAI_LATENCY_BUCKETS = (0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0)
+
+
+def format_labels(labelnames, labels, extra: str = "") -> str:
+    pairs = [f'{name}="{escape_label(value)}"' for name, value in zip(labelnames, labels)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def format_value(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.values: dict[tuple, float] = {}
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{format_labels(self.labelnames, labels)} {format_value(value)}"
+
+    def clear(self):
+        self.values.clear()
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: tuple[str, ...] = (),
+                 buckets: tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = labelnames
+        self.buckets = buckets
+        # labels -> [per-bucket counts (last one is +Inf), sum]
+        self.values: dict[tuple, list] = {}
+
+    def observe(self, labels: tuple, value: float):
+        entry = self.values.get(labels)
+        if entry is None:
+            entry = self.values[labels] = [[0] * (len(self.buckets) + 1), 0.0]
+        entry[0][bisect_left(self.buckets, value)] += 1
+        entry[1] += value
+
+    def samples(self):
+        for labels, (counts, total) in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = "+Inf" if bound == float("inf") else format_value(bound)
+                bucket_labels = format_labels(self.labelnames, labels, 'le="' + le + '"')
+                yield f"{self.name}_bucket{bucket_labels} {cumulative}"
+            yield f"{self.name}_sum{format_labels(self.labelnames, labels)} {format_value(total)}"
+            yield f"{self.name}_count{format_labels(self.labelnames, labels)} {cumulative}"
+
+    def clear(self):
+        self.values.clear()
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = []
+
+    def register(self, metric):
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+    def clear(self):
+        for metric in self.metrics:
+            metric.clear()
+
+
+registry = MetricsRegistry()
+request_duration = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route.", ("method", "route", "status")))
+request_statements = registry.register(Histogram(
+    "http_request_db_statements", "SQL statements executed per HTTP request.", ("method", "route"),
+    buckets=STATEMENT_COUNT_BUCKETS))
+request_statement_duration = registry.register(Histogram(
+    "http_request_db_duration_seconds", "Time spent executing SQL per HTTP request.", ("method", "route")))
+openai_duration = registry.register(Histogram(
+    "openai_request_duration_seconds", "OpenAI API call latency.", ("model", "outcome"),
+    buckets=OPENAI_LATENCY_BUCKETS))
+openai_tokens = registry.register(Counter(
+    "openai_tokens_total", "Tokens reported by the OpenAI API.", ("model", "type")))
+openai_errors = registry.register(Counter(
+    "openai_errors_total", "Failed OpenAI API calls.", ("model", "error")))
+
+
+class RequestStats:
+    __slots__ = ("statements", "statement_duration")
+
+    def __init__(self):
+        self.statements = 0
+        self.statement_duration = 0.0
+
+
+current_request_stats: ContextVar[RequestStats | None] = ContextVar("current_request_stats", default=None)
+
+
+def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if current_request_stats.get() is not None:
+        conn.info.setdefault("metrics_started", []).append(time.perf_counter())
+
+
+def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = current_request_stats.get()
+    started = conn.info.get("metrics_started")
+    if stats is not None and started:
+        stats.statements += 1
+        stats.statement_duration += time.perf_counter() - started.pop()
+
+
+def instrument_engines():
+    if not event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.listen(Engine, "before_cursor_execute", before_cursor_execute)
+        event.listen(Engine, "after_cursor_execute", after_cursor_execute)
+
+
+def uninstrument_engines():
+    if event.contains(Engine, "before_cursor_execute", before_cursor_execute):
+        event.remove(Engine, "before_cursor_execute", before_cursor_execute)
+        event.remove(Engine, "after_cursor_execute", after_cursor_execute)
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        stats = RequestStats()
+        token = current_request_stats.set(stats)
+        status_code = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - started
+            current_request_stats.reset(token)
+            route = scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            method = scope["method"]
+            request_duration.observe((method, route_path, status_code), elapsed)
+            request_statements.observe((method, route_path), stats.statements)
+            request_statement_duration.observe((method, route_path), stats.statement_duration)
+
+
+def record_openai_call(model: str, elapsed: float, usage=None, error: BaseException | None = None):
+    if not METRICS_ENABLED:
+        return
+    openai_duration.observe((model, "error" if error else "success"), elapsed)
+    if error is not None:
+        openai_errors.inc((model, type(error).__name__))
+    if usage is not None:
+        openai_tokens.inc((model, "prompt"), getattr(usage, "prompt_tokens", 0) or 0)
+        openai_tokens.inc((model, "completion"), getattr(usage, "completion_tokens", 0) or 0)
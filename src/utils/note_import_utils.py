@@ -0,0 +1,143 @@
+import json
+from collections import Counter
+from datetime import datetime
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+
+from database import is_unique_violation
+from models.notes_model import Note
+from schemas.note_schema import NoteSchema
+from utils.corpus_version_utils import bump_corpus_version
+from utils.term_frequency_utils import apply_term_delta, count_terms
+from utils.versioning_utils import INSERT, record_note_versions
+
+MAX_LINE_BYTES = 1024 * 1024
+MAX_REPORTED_ERRORS = 1000
+EXPORTED_COLUMNS = (Note.id, Note.title, Note.content, Note.priority,
+                    Note.summarization, Note.created_at, Note.updated_at)
+
+
+async def iter_ndjson_lines(byte_chunks):
+    buffer = b""
+    line_number = 0
+    oversized = False
+    async for chunk in byte_chunks:
+        buffer += chunk
+        *lines, buffer = buffer.split(b"\n")
+        for line in lines:
+            line_number += 1
+            yield line_number, None if oversized else line
+            oversized = False
+        if len(buffer) > MAX_LINE_BYTES:
+            oversized = True
+            buffer = b""
+    if buffer or oversized:
+        yield line_number + 1, None if oversized else buffer
+
+
+class NoteImporter:
+    def __init__(self, db, user_id: int, batch_size: int = 500):
+        self.db = db
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []
+        self._seen_titles = set()
+        self._batch = []
+
+    def report_error(self, line_number: int, detail):
+        self.failed += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append({"line": line_number, "detail": detail})
+
+    async def add_line(self, line_number: int, line: bytes | None):
+        if line is None:
+            self.report_error(line_number, f"Line is longer than {MAX_LINE_BYTES} bytes")
+            return
+        if not line.strip():
+            return
+        try:
+            note = NoteSchema.model_validate_json(line)
+        except ValidationError as error:
+            self.report_error(line_number, json.loads(error.json(include_url=False)))
+            return
+        if note.title in self._seen_titles:
+            self.report_error(line_number, "Note already exists")
+            return
+        self._seen_titles.add(note.title)
+        self._batch.append((line_number, note))
+        if len(self._batch) >= self.batch_size:
+            await self.flush()
+
+    async def flush(self):
+        batch, self._batch = self._batch, []
+        if not batch:
+            return
+        existing_result = await self.db.execute(
+            select(Note.title).where(Note.title.in_([note.title for _, note in batch])))
+        existing_titles = set(existing_result.scalars().all())
+        rows = []
+        for line_number, note in batch:
+            if note.title in existing_titles:
+                self.report_error(line_number, "Note already exists")
+            else:
+                rows.append((line_number, note.model_dump() | {"user_id": self.user_id}))
+        if rows:
+            await self.insert_rows(rows)
+
+    async def insert_rows(self, rows: list[tuple[int, dict]]):
+        try:
+            result = await self.db.execute(
+                insert(Note).returning(*EXPORTED_COLUMNS, Note.user_id, sort_by_parameter_order=True),
+                [row for _, row in rows])
+            inserted_notes = [dict(note._mapping) for note in result.all()]
+            await record_note_versions(self.db, inserted_notes, INSERT)
+            terms = Counter()
+            for note in inserted_notes:
+                terms.update(count_terms(note["content"]))
+            await apply_term_delta(self.db, self.user_id, terms)
+            await bump_corpus_version(self.db, self.user_id)
+            await self.db.commit()
+        except IntegrityError as error:
+            await self.db.rollback()
+            if len(rows) > 1:
+                # Another writer got in between the title check and the
+                # insert; retry row by row so only the offending lines fail.
+                for row in rows:
+                    await self.insert_rows([row])
+                return
+            if is_unique_violation(error):
+                self.report_error(rows[0][0], "Note already exists")
+            else:
+                self.report_error(rows[0][0], "Note violates a database constraint")
+            return
+        self.inserted += len(inserted_notes)
+
+    def to_dict(self) -> dict:
+        errors = sorted(self.errors, key=lambda error: error["line"])
+        return {"inserted": self.inserted, "failed": self.failed, "errors": errors}
+
+
+async def import_notes(db, user_id: int, byte_chunks, batch_size: int = 500) -> dict:
+    importer = NoteImporter(db, user_id, batch_size=batch_size)
+    async for line_number, line in iter_ndjson_lines(byte_chunks):
+        await importer.add_line(line_number, line)
+    await importer.flush()
+    return importer.to_dict()
+
+
+async def export_notes(session_factory, user_id: int, chunk_size: int = 500):
+    async with session_factory() as db:
+        result = await db.stream(
+            select(*EXPORTED_COLUMNS)
+            .where(Note.user_id == user_id)
+            .order_by(Note.id)
+            .execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions():
+            yield "".join(
+                json.dumps(dict(row._mapping), default=datetime.isoformat, ensure_ascii=False) + "\n"
+                for row in rows)
@@ -0,0 +1,33 @@
+import base64
+import json
+import math
+
+from fastapi import HTTPException, status
+
+
+def encode_cursor(position: dict) -> str:
+    payload = json.dumps(position, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(payload).decode().rstrip("=")
+
+
+def cursor_value(value, kind: type):
+    # bool is an int subclass, and a float cursor must be a finite number.
+    if isinstance(value, bool) or not isinstance(value, (int, float) if kind is float else kind):
+        raise TypeError(value)
+    if kind is float and not math.isfinite(value):
+        raise ValueError(value)
+    return kind(value)
+
+
+def decode_cursor(cursor: str, **kinds: type) -> dict:
+    # kinds maps each required key to the type its value must have, e.g. id=int.
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        position = json.loads(base64.urlsafe_b64decode(padded.encode()))
+        if not isinstance(position, dict) or any(key not in position for key in kinds):
+            raise ValueError(cursor)
+        return {key: cursor_value(position[key], kind) for key, kind in kinds.items()}
+    except (TypeError, ValueError):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Invalid pagination cursor")
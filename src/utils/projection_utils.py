@@ -0,0 +1,38 @@
+from decouple import config
+from fastapi import HTTPException, status
+from sqlalchemy import func
+
+from models.notes_model import Note
+
+PREVIEW_LENGTH = config('NOTES_PREVIEW_LENGTH', default=200, cast=int)
+
+NOTE_FIELDS = {
+    "id": Note.id,
+    "title": Note.title,
+    "priority": Note.priority,
+    "content": Note.content,
+    "summarization": Note.summarization,
+    "created_at": Note.created_at,
+    "updated_at": Note.updated_at,
+    "content_length": func.length(Note.content).label("content_length"),
+    "preview": func.substr(Note.content, 1, PREVIEW_LENGTH).label("preview"),
+}
+
+SUMMARY_FIELDS = ("id", "title", "priority", "content_length", "preview")
+
+
+def resolve_note_fields(view: str, fields: str | None) -> tuple[str, ...] | None:
+    if fields is None:
+        return SUMMARY_FIELDS if view == "summary" else None
+    requested = tuple(dict.fromkeys(field.strip() for field in fields.split(",") if field.strip()))
+    unknown = [field for field in requested if field not in NOTE_FIELDS]
+    if unknown or not requested:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Unknown note fields: {', '.join(unknown) or fields}")
+    # id is always selected because cursor pagination is keyed on it
+    return ("id",) + tuple(field for field in requested if field != "id")
+
+
+def note_columns(projection: tuple[str, ...]):
+    return [NOTE_FIELDS[field] for field in projection]
@@ -0,0 +1,67 @@
+import re
+
+from sqlalchemy import Float, Integer, String, bindparam, text
+
+SEARCH_PARAMETERS = (
+    bindparam("query", type_=String),
+    bindparam("user_id", type_=Integer),
+    bindparam("after_score", type_=Float),
+    bindparam("after_id", type_=Integer),
+    bindparam("limit", type_=Integer),
+)
+
+POSTGRES_SEARCH_QUERY = text("""
+    SELECT ranked.id, ranked.title, ranked.priority, ranked.score,
+           ts_headline('english', notes.content, ranked.query,
+                       'StartSel=<b>, StopSel=</b>, MaxWords=30, MinWords=10, MaxFragments=2') AS snippet
+    FROM (
+        SELECT notes.id, notes.title, notes.priority, query,
+               ts_rank(notes.search_vector, query)::float8 AS score
+        FROM notes, websearch_to_tsquery('english', :query) AS query
+        WHERE notes.user_id = :user_id AND notes.search_vector @@ query
+    ) AS ranked
+    JOIN notes ON notes.id = ranked.id
+    WHERE :after_score IS NULL OR ranked.score < :after_score
+          OR (ranked.score = :after_score AND ranked.id > :after_id)
+    ORDER BY ranked.score DESC, ranked.id
+    LIMIT :limit
+""").bindparams(*SEARCH_PARAMETERS)
+
+SQLITE_SEARCH_QUERY = text("""
+    SELECT id, title, priority, score, snippet
+    FROM (
+        SELECT notes.id, notes.title, notes.priority,
+               -bm25(notes_fts, 10.0, 1.0) AS score,
+               snippet(notes_fts, 1, '<b>', '</b>', '...', 24) AS snippet
+        FROM notes_fts
+        JOIN notes ON notes.id = notes_fts.rowid
+        WHERE notes_fts MATCH :query AND notes.user_id = :user_id
+    ) AS ranked
+    WHERE :after_score IS NULL OR score < :after_score
+          OR (score = :after_score AND id > :after_id)
+    ORDER BY score DESC, id
+    LIMIT :limit
+""").bindparams(*SEARCH_PARAMETERS)
+
+
+def build_sqlite_match_query(query: str) -> str:
+    return " ".join(f'"{term}"' for term in re.findall(r'\w+', query))
+
+
+async def search_notes(db, user_id: int, query: str, limit: int,
+                       after_score: float | None = None, after_id: int | None = None) -> list:
+    if db.get_bind().dialect.name == 'postgresql':
+        statement = POSTGRES_SEARCH_QUERY
+    else:
+        statement = SQLITE_SEARCH_QUERY
+        query = build_sqlite_match_query(query)
+        if not query:
+            return []
+    result = await db.execute(statement, {
+        "query": query,
+        "user_id": user_id,
+        "after_score": after_score,
+        "after_id": after_id,
+        "limit": limit,
+    })
+    return result.all()
@@ -0,0 +1,59 @@
+from collections import Counter
+
+from sqlalchemy import select, delete
+
+from database import dialect_insert
+from models.notes_model import Note
+from models.term_frequency_model import UserTerm
+from utils.text_utils import extract_terms
+
+
+def count_terms(content: str | None) -> Counter:
+    if not content:
+        return Counter()
+    return Counter(extract_terms(content))
+
+
+def _upsert_statement(db):
+    statement = dialect_insert(db, UserTerm)
+    return statement.on_conflict_do_update(
+        index_elements=[UserTerm.user_id, UserTerm.term],
+        set_={"count": UserTerm.count + statement.excluded.count})
+
+
+async def apply_term_delta(db, user_id: int, delta: Counter):
+    changes = [
+        {"user_id": user_id, "term": term, "count": count}
+        for term, count in delta.items() if count
+    ]
+    if not changes:
+        return
+    await db.execute(_upsert_statement(db), changes)
+    if any(change["count"] < 0 for change in changes):
+        await db.execute(
+            delete(UserTerm).where(UserTerm.user_id == user_id, UserTerm.count <= 0))
+
+
+async def update_user_terms(db, user_id: int, old_content: str | None, new_content: str | None):
+    delta = count_terms(new_content)
+    delta.subtract(count_terms(old_content))
+    await apply_term_delta(db, user_id, delta)
+
+
+async def get_most_common_terms(db, user_id: int, limit: int) -> list[tuple[str, int]]:
+    result = await db.execute(
+        select(UserTerm.term, UserTerm.count)
+        .where(UserTerm.user_id == user_id)
+        .order_by(UserTerm.count.desc(), UserTerm.term)
+        .limit(limit)
+    )
+    return [(term, int(count)) for term, count in result.all()]
+
+
+async def rebuild_user_terms(db, user_id: int):
+    await db.execute(delete(UserTerm).where(UserTerm.user_id == user_id))
+    terms = Counter()
+    contents = await db.stream_scalars(select(Note.content).where(Note.user_id == user_id))
+    async for content in contents:
+        terms.update(extract_terms(content))
+    await apply_term_delta(db, user_id, terms)
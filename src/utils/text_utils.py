@@ -0,0 +1,80 @@
+import hashlib
+import re
+from pathlib import Path
+
+# NLTK's English stopword list, vendored so workers never download corpora.
+STOPWORDS_PATH = Path(__file__).resolve().parent.parent / "resources" / "stopwords" / "english"
+
+WORD_PATTERN = re.compile(r'\b\w+\b')
+STOPWORDS = frozenset(STOPWORDS_PATH.read_text().split())
+MOST_COMMON_WORD_AMOUNT = 10
+
+
+def tokenize(text):
+    return WORD_PATTERN.findall(text.lower())
+
+
+def extract_terms(text):
+    return [word for word in tokenize(text) if word not in STOPWORDS]
+
+
+PARAGRAPH_PATTERN = re.compile(r'\n\s*\n')
+SENTENCE_PATTERN = re.compile(r'(?<=[.!?])\s+')
+CHARACTERS_PER_TOKEN = 4
+ANCHOR_WORDS = 8
+
+
+def estimate_tokens(text: str) -> int:
+    # Roughly what GPT tokenizers produce for English prose: about four
+    # characters per token, but never fewer tokens than words.
+    return max(len(text) // CHARACTERS_PER_TOKEN, len(text.split()))
+
+
+def is_chunk_anchor(piece: str, target_tokens: int) -> bool:
+    # Whether a chunk ends after this piece depends on the piece alone: its
+    # opening words pick a stable point in [0, 1) and longer pieces are more
+    # likely to end a chunk. Edits therefore keep the boundaries around them.
+    opening = " ".join(piece.split()[:ANCHOR_WORDS])
+    point = int.from_bytes(hashlib.blake2b(opening.encode(), digest_size=8).digest(), "big") / 2 ** 64
+    return point < estimate_tokens(piece) / target_tokens
+
+
+def split_into_chunks(text: str, max_tokens: int) -> list[str]:
+    # Splits at paragraphs, falling back to sentences and then words for
+    # paragraphs that do not fit on their own. Chunks end after anchor pieces
+    # (content-defined, averaging about half of `max_tokens`) or when the next
+    # piece would not fit, so an edit only changes the chunks around it.
+    pieces = []
+    for paragraph in PARAGRAPH_PATTERN.split(text.strip()):
+        if estimate_tokens(paragraph) <= max_tokens:
+            pieces.append((paragraph, "\n\n"))
+            continue
+        for sentence in SENTENCE_PATTERN.split(paragraph):
+            if estimate_tokens(sentence) <= max_tokens:
+                pieces.append((sentence, " "))
+            else:
+                pieces.extend((word, " ") for word in sentence.split())
+        pieces[-1] = (pieces[-1][0], "\n\n")
+
+    target_tokens = max(max_tokens // 2, 1)
+    chunks, parts = [], []
+    characters = words = 0
+    for piece, separator in pieces:
+        if not piece:
+            continue
+        # Track the estimate's inputs so the check matches estimate_tokens(chunk).
+        joined_characters = characters + len(piece) + (len(parts[-1]) if parts else 0)
+        joined_words = words + len(piece.split())
+        if parts and max(joined_characters // CHARACTERS_PER_TOKEN, joined_words) > max_tokens:
+            chunks.append("".join(parts[:-1]))
+            parts = []
+            joined_characters, joined_words = len(piece), len(piece.split())
+        parts.extend((piece, separator))
+        characters, words = joined_characters, joined_words
+        if is_chunk_anchor(piece, target_tokens):
+            chunks.append("".join(parts[:-1]))
+            parts = []
+            characters = words = 0
+    if parts:
+        chunks.append("".join(parts[:-1]))
+    return chunks
@@ -0,0 +1,177 @@
+import difflib
+import json
+import re
+import zlib
+
+from decouple import config
+from sqlalchemy import func, insert, select, update
+
+from models.note_revision_model import NoteRevision
+from utils.cache_utils import LRUCache
+
+INSERT = 0
+UPDATE = 1
+DELETE = 2
+
+SNAPSHOT_INTERVAL = config('NOTE_SNAPSHOT_INTERVAL', default=20, cast=int)
+
+SENTENCE_PATTERN = re.compile(r'[^.!?\n]*(?:[.!?]+\s*|\n\s*|$)')
+WORD_PATTERN = re.compile(r'\S+\s*|\s+')
+MAX_SENTENCE_LENGTH = 500
+AUTOJUNK_THRESHOLD = 2000
+
+note_version_cache = LRUCache(maxsize=config('NOTE_VERSION_CACHE_SIZE', default=128, cast=int))
+
+
+def split_content(text: str) -> list[str]:
+    tokens = []
+    for sentence in SENTENCE_PATTERN.findall(text):
+        if len(sentence) > MAX_SENTENCE_LENGTH:
+            tokens.extend(WORD_PATTERN.findall(sentence))
+        elif sentence:
+            tokens.append(sentence)
+    return tokens
+
+
+def content_opcodes(source: str, target: str) -> list[tuple[str, int, int, int, int]]:
+    # Opcodes in character offsets turning source into target. The shared prefix
+    # and suffix are trimmed first so typical local edits skip the matcher.
+    limit = min(len(source), len(target))
+    prefix = 0
+    while prefix < limit and source[prefix] == target[prefix]:
+        prefix += 1
+    suffix = 0
+    while suffix < limit - prefix and source[-1 - suffix] == target[-1 - suffix]:
+        suffix += 1
+    source_tokens = split_content(source[prefix:len(source) - suffix])
+    target_tokens = split_content(target[prefix:len(target) - suffix])
+    source_offsets, target_offsets = [prefix], [prefix]
+    for token in source_tokens:
+        source_offsets.append(source_offsets[-1] + len(token))
+    for token in target_tokens:
+        target_offsets.append(target_offsets[-1] + len(token))
+
+    opcodes = [("equal", 0, prefix, 0, prefix)] if prefix else []
+    matcher = difflib.SequenceMatcher(
+        None, source_tokens, target_tokens, autojunk=len(source_tokens) > AUTOJUNK_THRESHOLD)
+    for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+        opcodes.append((tag, source_offsets[i1], source_offsets[i2], target_offsets[j1], target_offsets[j2]))
+    if suffix:
+        opcodes.append(("equal", len(source) - suffix, len(source), len(target) - suffix, len(target)))
+    return opcodes
+
+
+def encode_snapshot(content: str) -> bytes:
+    return zlib.compress(content.encode())
+
+
+def read_snapshot(payload: bytes) -> str:
+    return zlib.decompress(payload).decode()
+
+
+def encode_delta(source: str, target: str) -> bytes:
+    operations = []
+    for tag, i1, i2, j1, j2 in content_opcodes(source, target):
+        if tag == "equal":
+            operations.append([i1, i2])
+        elif j2 > j1:
+            operations.append(target[j1:j2])
+    return zlib.compress(json.dumps(operations, separators=(",", ":")).encode())
+
+
+def apply_delta(source: str, payload: bytes) -> str:
+    operations = json.loads(zlib.decompress(payload))
+    return "".join(
+        source[operation[0]:operation[1]] if isinstance(operation, list) else operation
+        for operation in operations)
+
+
+def diff_contents(old: str, new: str) -> list[dict]:
+    return [
+        {"operation": tag, "position": i1, "removed": old[i1:i2], "added": new[j1:j2]}
+        for tag, i1, i2, j1, j2 in content_opcodes(old, new) if tag != "equal"
+    ]
+
+
+async def record_note_versions(db, notes: list[dict], operation_type: int) -> dict[int, str]:
+    # Closes the latest revision of each note, turning it into a reverse delta
+    # against the new content, and appends the new content as a snapshot.
+    # Returns the content each note had before this write, keyed by note id.
+    if not notes:
+        return {}
+    previous = {}
+    if operation_type != INSERT:
+        closed_revisions = await db.execute(
+            update(NoteRevision)
+            .where(NoteRevision.note_id.in_([note["id"] for note in notes]),
+                   NoteRevision.is_latest.is_(True))
+            .values(is_latest=False)
+            .returning(NoteRevision.note_id, NoteRevision.version, NoteRevision.payload)
+        )
+        previous = {
+            revision.note_id: (revision.version, read_snapshot(revision.payload))
+            for revision in closed_revisions
+        }
+    deltas, revisions = [], []
+    for note in notes:
+        version, previous_content = previous.get(note["id"], (0, None))
+        if previous_content is not None and version % SNAPSHOT_INTERVAL:
+            deltas.append({
+                "note_id": note["id"],
+                "version": version,
+                "is_snapshot": False,
+                "payload": encode_delta(note["content"], previous_content),
+            })
+        revisions.append({
+            "note_id": note["id"],
+            "version": version + 1,
+            "user_id": note["user_id"],
+            "operation_type": operation_type,
+            "title": note["title"],
+            "priority": note["priority"],
+            "is_latest": True,
+            "is_snapshot": True,
+            "payload": encode_snapshot(note["content"]),
+        })
+    if deltas:
+        await db.execute(update(NoteRevision), deltas)
+    await db.execute(insert(NoteRevision), revisions)
+    return {note_id: content for note_id, (_, content) in previous.items()}
+
+
+async def rebuild_note_contents(db, note_id: int, revisions) -> dict[int, str]:
+    # `revisions` is a contiguous run of (version, is_snapshot, payload) rows.
+    # Walks down from the nearest snapshot at or above the newest one requested.
+    if not revisions:
+        return {}
+    chain = sorted(revisions, key=lambda revision: revision.version, reverse=True)
+    newest = chain[0]
+    if not newest.is_snapshot and note_version_cache.get((note_id, newest.version)) is None:
+        next_snapshot = (
+            select(func.min(NoteRevision.version))
+            .where(NoteRevision.note_id == note_id,
+                   NoteRevision.version > newest.version,
+                   NoteRevision.is_snapshot.is_(True))
+            .scalar_subquery()
+        )
+        newer_revisions = await db.execute(
+            select(NoteRevision.version, NoteRevision.is_snapshot, NoteRevision.payload)
+            .where(NoteRevision.note_id == note_id,
+                   NoteRevision.version > newest.version,
+                   NoteRevision.version <= next_snapshot)
+            .order_by(NoteRevision.version.desc())
+        )
+        chain = newer_revisions.all() + chain
+    contents = {}
+    content = None
+    for revision in chain:
+        key = (note_id, revision.version)
+        cached = note_version_cache.get(key)
+        if cached is not None:
+            content = cached
+        else:
+            content = read_snapshot(revision.payload) if revision.is_snapshot else apply_delta(
+                content, revision.payload)
+            note_version_cache.set(key, content)
+        contents[revision.version] = content
+    return contents